@@ -121,11 +121,14 @@ This is how the artifact_path is returned. This hook can be removed, by running
 ``unregister_hook_callback`` with the name of the hook callback.
 
 """
+import base64
+import errno
 import logging
 import os
 import re
 import sys
 import traceback
+import uuid
 
 from py.path import local
 from riggerlib import Rigger, RiggerBasePlugin, RiggerClient
@@ -180,7 +183,54 @@ class Artifactor(Rigger):
 
 
 class ArtifactorClient(RiggerClient):
-    pass
+    """A sub from RiggerClient
+
+    Contents of ``filedump`` hooks of at least ``spool_threshold`` bytes are written to a file in
+    ``spool_dir``, and only the name of the file is sent to Artifactor, which moves the file to
+    the artifacts. Big screenshots and dumps then don't have to be encoded in the JSON of the
+    hook (and decoded from base64) by Artifactor. The spool dir has to be reachable by Artifactor
+    on the same path, and should be on the filesystem of the artifacts, so that moving the files
+    is cheap.
+
+    Args:
+        address: The address of the Artifactor server
+        port: The port of the Artifactor server
+        spool_dir: Directory to spool the contents in, ``None`` to always send them in the hook
+        spool_threshold: Size of the contents in bytes to spool them from
+    """
+    def __init__(self, address, port, spool_dir=None, spool_threshold=64 * 1024):
+        super(ArtifactorClient, self).__init__(address, port)
+        self.spool_dir = spool_dir
+        self.spool_threshold = spool_threshold
+
+    def fire_hook(self, hook_name, grab_result=False, **kwargs):
+        if hook_name == 'filedump' and self.spool_dir and not kwargs.get('dont_write', False):
+            kwargs = self.spool_contents(kwargs)
+        return super(ArtifactorClient, self).fire_hook(hook_name, grab_result, **kwargs)
+
+    def spool_contents(self, kwargs):
+        """Writes the contents of a ``filedump`` hook to the spool dir, if they're big enough
+
+        Returns: The arguments of the hook, with the name of the spooled file instead of the
+            contents
+        """
+        contents = kwargs.get('contents', None)
+        if not isinstance(contents, basestring) or len(contents) < self.spool_threshold:
+            return kwargs
+        if kwargs.get('contents_base64', False):
+            contents = base64.b64decode(contents)
+        elif isinstance(contents, unicode):
+            contents = contents.encode('utf-8')
+        try:
+            os.makedirs(self.spool_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        contents_filename = os.path.join(self.spool_dir, 'filedump-{}'.format(uuid.uuid4().hex))
+        with open(contents_filename, 'wb') as f:
+            f.write(contents)
+        return dict(
+            kwargs, contents=None, contents_base64=False, contents_filename=contents_filename)
 
 
 class ArtifactorBasePlugin(RiggerBasePlugin):
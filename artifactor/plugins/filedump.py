@@ -15,6 +15,7 @@ from artifactor import ArtifactorBasePlugin
 import base64
 import os
 import re
+import shutil
 
 from utils import normalize_text, safe_string
 
@@ -47,7 +48,7 @@ class Filedump(ArtifactorBasePlugin):
     def filedump(self, description, contents, slaveid=None, mode="w", contents_base64=False,
                  display_type="primary", display_glyph=None, file_type=None,
                  dont_write=False, os_filename=None, group_id=None, test_name=None,
-                 test_location=None):
+                 test_location=None, contents_filename=None):
         if slaveid is not None:
             if not slaveid:
                 slaveid = "Master"
@@ -82,10 +83,14 @@ class Filedump(ArtifactorBasePlugin):
         if not dont_write:
             if os.path.isfile(os_filename):
                 os.remove(os_filename)
-            with open(os_filename, mode) as f:
-                if contents_base64:
-                    contents = base64.b64decode(contents)
-                f.write(contents)
+            if contents_filename is not None:
+                # Spooled by the client, see ArtifactorClient
+                shutil.move(contents_filename, os_filename)
+            else:
+                with open(os_filename, mode) as f:
+                    if contents_base64:
+                        contents = base64.b64decode(contents)
+                    f.write(contents)
 
         return None, {'artifacts': {test_ident: {'files': artifacts}}}
 
@@ -29,6 +29,7 @@ class Logger(ArtifactorBasePlugin):
         self.register_plugin_hook('start_test', self.start_test)
         self.register_plugin_hook('finish_test', self.finish_test)
         self.register_plugin_hook('log_message', self.log_message)
+        self.register_plugin_hook('log_messages', self.log_messages)
 
     def configure(self):
         self.configured = True
@@ -75,3 +76,8 @@ class Logger(ArtifactorBasePlugin):
             if self.store[slaveid].logger:
                 fn = getattr(self.store[slaveid].logger, log_record['level'])
                 fn(log_record['message'], extra=log_record['extra'])
+
+    @ArtifactorBasePlugin.check_configured
+    def log_messages(self, log_records, slaveid):
+        for log_record in log_records:
+            self.log_message(log_record=log_record, slaveid=slaveid)
@@ -10,6 +10,8 @@ artifactor:
             enabled: False
             plugin: merkyl
             port: 8192
+            workers: 4 #Logs to fetch at once at the end of a test
+            compress: True #Have merkyl gzip the logs, saves bandwidth but costs CPU
             log_files:
                 - /var/www/miq/vmdb/log/evm.log
                 - /var/www/miq/vmdb/log/production.log
@@ -17,9 +19,13 @@ artifactor:
 """
 
 from artifactor import ArtifactorBasePlugin
+from multiprocessing.pool import ThreadPool
 import os.path
 import requests
 
+# Size of the chunks the logs are written to the artifacts in
+CHUNK_SIZE = 64 * 1024
+
 
 class Merkyl(ArtifactorBasePlugin):
 
@@ -42,9 +48,31 @@ class Merkyl(ArtifactorBasePlugin):
     def configure(self):
         self.files = self.data.get('log_files', [])
         self.port = self.data.get('port', '8192')
+        self.workers = self.data.get('workers', 4)
         self.tests = {}
+        # One session, so the connections to merkyl are kept alive between the requests
+        self.session = requests.Session()
+        if not self.data.get('compress', True):
+            self.session.headers['Accept-Encoding'] = 'identity'
         self.configured = True
 
+    def _get(self, ip, path, **kwargs):
+        return self.session.get("http://{}:{}/{}".format(ip, self.port, path), timeout=15,
+                                **kwargs)
+
+    def _fetch(self, ip, tail, artifact_path):
+        """Streams a log from merkyl to a file in the artifacts of the test
+
+        Requests asks for gzip transfer (unless ``compress`` is off) and decompresses the chunks
+        as they come, so the log is never held in memory whole.
+        """
+        os_filename = os.path.join(artifact_path, "{}-{}".format(self.ident, tail))
+        doc = self._get(ip, "get/{}".format(tail), stream=True)
+        with open(os_filename, "wb") as f:
+            for chunk in doc.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+        return tail, os_filename
+
     @ArtifactorBasePlugin.check_configured
     def start_test(self, test_name, test_location, ip):
         test_ident = "{}/{}".format(test_location, test_name)
@@ -54,8 +82,7 @@ class Merkyl(ArtifactorBasePlugin):
                 return None
         else:
             self.tests[test_ident] = self.Test(test_ident, ip, self.port)
-        url = "http://{}:{}/resetall".format(ip, self.port)
-        requests.get(url, timeout=15)
+        self._get(ip, "resetall")
 
         self.tests[test_ident].in_progress = True
 
@@ -65,8 +92,7 @@ class Merkyl(ArtifactorBasePlugin):
         ip = self.tests[test_ident].ip
 
         base, tail = os.path.split(filename)
-        url = "http://{}:{}/get/{}".format(ip, self.port, tail)
-        doc = requests.get(url, timeout=15)
+        doc = self._get(ip, "get/{}".format(tail))
         content = doc.content
         return {'merkyl_content': content}, None
 
@@ -78,47 +104,43 @@ class Merkyl(ArtifactorBasePlugin):
         if filename not in self.files:
             if filename not in self.tests[test_ident].extra_files:
                 self.tests[test_ident].extra_files.add(filename)
-                url = "http://{}:{}/setup{}".format(ip, self.port, filename)
-                requests.get(url, timeout=15)
+                self._get(ip, "setup{}".format(filename))
 
     @ArtifactorBasePlugin.check_configured
     def finish_test(self, artifact_path, test_name, test_location, ip, slaveid):
         test_ident = "{}/{}".format(test_location, test_name)
-        artifacts = []
-        for filename in self.files:
-            _, tail = os.path.split(filename)
-            url = "http://{}:{}/get/{}".format(ip, self.port, tail)
-            doc = requests.get(url, timeout=15)
-            artifacts.append((tail, doc.content))
-
-        for filename in self.tests[test_ident].extra_files:
-            _, tail = os.path.split(filename)
-            url = "http://{}:{}/get/{}".format(ip, self.port, tail)
-            doc = requests.get(url, timeout=15)
-            artifacts.append((tail, doc.content))
-
-            url = "http://{}:{}/delete/{}".format(ip, self.port, tail)
-            requests.get(url, timeout=15)
+        tails = [os.path.split(filename)[1] for filename in self.files]
+        extra_tails = [
+            os.path.split(filename)[1] for filename in self.tests[test_ident].extra_files]
+        pool = ThreadPool(max(1, min(self.workers, len(tails) + len(extra_tails))))
+        try:
+            artifacts = pool.map(
+                lambda tail: self._fetch(ip, tail, artifact_path), tails + extra_tails)
+        finally:
+            pool.close()
+            pool.join()
+
+        for tail in extra_tails:
+            self._get(ip, "delete/{}".format(tail))
 
         del self.tests[test_ident]
-        for filename, contents in artifacts:
+        for filename, os_filename in artifacts:
             self.fire_hook('filedump', test_location=test_location, test_name=test_name,
                 description="Merkyl: {}".format(filename), slaveid=slaveid,
-                contents=contents, file_type="log", display_type="danger",
-                display_glyph="align-justify", group_id="merkyl")
+                contents=None, file_type="log", display_type="danger",
+                display_glyph="align-justify", group_id="merkyl", dont_write=True,
+                os_filename=os_filename)
         return None, None
 
     @ArtifactorBasePlugin.check_configured
     def start_session(self, ip):
         """Session started"""
         for file_name in self.files:
-            url = "http://{}:{}/setup{}".format(ip, self.port, file_name)
-            requests.get(url, timeout=15)
+            self._get(ip, "setup{}".format(file_name))
 
     @ArtifactorBasePlugin.check_configured
     def finish_session(self, ip):
         """Session finished"""
         for filename in self.files:
             base, tail = os.path.split(filename)
-            url = "http://{}:{}/delete/{}".format(ip, self.port, tail)
-            requests.get(url, timeout=15)
+            self._get(ip, "delete/{}".format(tail))
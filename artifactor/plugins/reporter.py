@@ -11,16 +11,21 @@ artifactor:
             enabled: True
             plugin: reporter
             only_failed: False #Only show faled tests in the report
+            render_processes: 1 #Processes to render the provider reports with
+            incremental: False #Only render the tests that changed when building the report
+            report_interval: 0 #Minimum seconds between the reports built during the run
 """
 import csv
 import datetime
-import difflib
 import math
+import multiprocessing
 import os
 import re
 import shutil
 import time
+from collections import OrderedDict
 from copy import deepcopy
+from threading import Lock
 
 from jinja2 import Environment, FileSystemLoader
 from py.path import local
@@ -28,6 +33,7 @@ from py.path import local
 from utils import process_pytest_path
 from utils.conf import cfme_data  # Only for the provider specific reports
 from utils.path import template_path
+from utils.tb_clusters import cluster_tracebacks
 from artifactor import ArtifactorBasePlugin
 
 _tests_tpl = {
@@ -48,6 +54,56 @@ _tests_tpl = {
 URL = re.compile(r"https?://[^/\s]+(?:/[^/\s?]+)*/?(?:\?(?:[^&\s=]+(?:=[^&\s]+)?&?)*)?")
 
 
+# Label colors of the outcomes in the HTML tree
+_tree_colors = {
+    'passed': 'success',
+    'failed': 'warning',
+    'error': 'danger',
+    'skipped': 'primary',
+    'xpassed': 'danger',
+    'xfailed': 'success'}
+
+_template_env = None
+
+
+def template_env():
+    """Returns the jinja environment of the report templates, so they're only compiled once"""
+    global _template_env
+    if _template_env is None:
+        _template_env = Environment(loader=FileSystemLoader(template_path.strpath))
+    return _template_env
+
+
+def render_provider_report(args):
+    """Builds the data of a provider report from the test index and renders it
+
+    A module level function, so that it can be run in a :py:class:`multiprocessing.Pool`.
+    """
+    index, tests, filename, log_dir = args
+    reporter = ReporterBase()
+    reporter.write_report(
+        reporter.report_data(index, tests), filename, log_dir, 'test_report_provider.html')
+
+
+def artifact_state(test):
+    """Returns the parts of the artifacts of a test that its entry in the report is made from
+
+    The entry only has to be made again when the state changes. Returns ``None`` for tests
+    without statuses, which aren't in the report.
+    """
+    if not test.get('statuses', None):
+        return None
+    # The overall status is added when the test is processed
+    statuses = sorted(
+        (when, tuple(status)) for when, status in test['statuses'].iteritems()
+        if when != 'overall')
+    return (
+        statuses, test.get('slaveid', None), test.get('old', False), test.get('start_time', None),
+        test.get('finish_time', None), repr(test.get('skipped', None)),
+        repr(test.get('composite', None)),
+        [file_dict['os_filename'] for file_dict in test.get('files', [])])
+
+
 def overall_test_status(statuses):
     # Handle some logic for when to count certain tests as which state
     for when, status in statuses.iteritems():
@@ -65,8 +121,31 @@ def overall_test_status(statuses):
 
 
 class ReporterBase(object):
-    def _run_report(self, old_artifacts, artifact_dir, version=None):
-        template_data = self.process_data(old_artifacts, artifact_dir, version)
+    def _run_reports(self, old_artifacts, artifact_dir, version=None):
+        """Runs the main and the provider reports, processing the tests only once"""
+        index = self.index_tests(old_artifacts, artifact_dir, version)
+        self._run_report(old_artifacts, artifact_dir, version, index=index)
+        self._run_provider_report(old_artifacts, artifact_dir, version, index=index)
+
+    def _run_report(self, old_artifacts, artifact_dir, version=None, index=None):
+        if index is None:
+            index = self.index_tests(old_artifacts, artifact_dir, version)
+        template_data = self.report_data(index, index['tests'])
+
+        if hasattr(self, 'only_failed') and self.only_failed:
+            template_data['tests'] = [x for x in template_data['tests']
+                                  if x['outcomes']['overall'] not in ['passed']]
+
+        self.render_report(template_data, 'report', artifact_dir, 'test_report.html')
+
+    def _run_incremental_report(self, old_artifacts, artifact_dir, version=None):
+        """Runs the main report, rendering again only the tests that changed since the last one
+
+        See :py:class:`IncrementalReport`.
+        """
+        if getattr(self, 'incremental_report', None) is None:
+            self.incremental_report = IncrementalReport(self)
+        template_data = self.incremental_report.report_data(old_artifacts, artifact_dir, version)
 
         if hasattr(self, 'only_failed') and self.only_failed:
             template_data['tests'] = [x for x in template_data['tests']
@@ -74,28 +153,78 @@ class ReporterBase(object):
 
         self.render_report(template_data, 'report', artifact_dir, 'test_report.html')
 
-    def _run_provider_report(self, old_artifacts, artifact_dir, version=None):
-        for mgmt in cfme_data['management_systems'].keys():
-            template_data = self.process_data(old_artifacts, artifact_dir, version,
-                name_filter=mgmt)
+    def _run_provider_report(self, old_artifacts, artifact_dir, version=None, index=None):
+        if index is None:
+            index = self.index_tests(old_artifacts, artifact_dir, version)
+        partitions = self.partition_tests(
+            index['tests'], cfme_data['management_systems'].keys())
+        # The tests of every report are passed separately, not with all the tests of the index
+        shared_index = dict(index, tests=None)
+        reports = [
+            (shared_index, tests, "report_{}".format(mgmt), artifact_dir)
+            for mgmt, tests in partitions.iteritems()]
+        processes = getattr(self, 'render_processes', 1)
+        if processes > 1 and len(reports) > 1:
+            pool = multiprocessing.Pool(processes)
+            try:
+                pool.map(render_provider_report, reports)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            map(render_provider_report, reports)
+        self.copy_assets(artifact_dir)
 
-            self.render_report(template_data, "report_{}".format(mgmt), artifact_dir,
-                'test_report_provider.html')
+    def partition_tests(self, tests, providers):
+        """Splits the tests by the providers in their names, in one pass over the tests
+
+        Returns: An :py:class:`OrderedDict` of the tests of each provider, in the order the
+            providers were passed. A test can belong to more than one provider.
+        """
+        patterns = [
+            (provider, re.compile(r'{}[-\]]+'.format(provider))) for provider in providers]
+        partitions = OrderedDict((provider, []) for provider in providers)
+        for test in tests:
+            for provider, pattern in patterns:
+                if pattern.search(test['name']):
+                    partitions[provider].append(test)
+        return partitions
 
     def render_report(self, report, filename, log_dir, template):
-        template_env = Environment(
-            loader=FileSystemLoader(template_path.strpath)
-        )
-        data = template_env.get_template(template).render(**report)
+        self.write_report(report, filename, log_dir, template)
+        self.copy_assets(log_dir)
+
+    def write_report(self, report, filename, log_dir, template):
+        data = template_env().get_template(template).render(**report)
 
-        with open(os.path.join(log_dir, '{}.html'.format(filename)), "w") as f:
+        # Written next to the report and renamed over it, so a half written report is never seen
+        path = os.path.join(log_dir, '{}.html'.format(filename))
+        with open('{}.tmp'.format(path), "w") as f:
             f.write(data)
+        os.rename('{}.tmp'.format(path), path)
+
+    def copy_assets(self, log_dir):
+        """Copies the static files of the report, unless they're already there"""
+        dist_dir = os.path.join(log_dir, 'dist')
+        if os.path.isdir(dist_dir):
+            return
         try:
-            shutil.copytree(template_path.join('dist').strpath, os.path.join(log_dir, 'dist'))
+            shutil.copytree(template_path.join('dist').strpath, dist_dir)
         except OSError:
             pass
 
     def process_data(self, artifacts, log_dir, version, name_filter=None):
+        index = self.index_tests(artifacts, log_dir, version)
+        tests = index['tests']
+        if name_filter:
+            tests = self.partition_tests(tests, [name_filter])[name_filter]
+        return self.report_data(index, tests)
+
+    def index_tests(self, artifacts, log_dir, version):
+        """Processes the artifacts of all the tests, reading their files
+
+        The result is shared by all the reports, see :py:meth:`report_data`.
+        """
         tb_errors = []
         blocker_skip_count = 0
         provider_skip_count = 0
@@ -116,107 +245,141 @@ class ReporterBase(object):
             'error': 0,
             'xfailed': 0,
             'xpassed': 0}
-        colors = {
-            'passed': 'success',
-            'failed': 'warning',
-            'error': 'danger',
-            'xpassed': 'danger',
-            'xfailed': 'success',
-            'skipped': 'info'}
         # Iterate through the tests and process the counts and durations
         for test_name, test in artifacts.iteritems():
-            if not test.get('statuses', None):
+            test_data = self.process_test(test_name, test, log_dir)
+            if test_data is None:
                 continue
-            overall_status = overall_test_status(test['statuses'])
+            overall_status = test_data['outcomes']['overall']
             counts[overall_status] += 1
             if not test.get('old', False):
                 current_counts[overall_status] += 1
-            color = colors[overall_status]
-            # This was removed previously but is needed as the overall is not generated
-            # until the test finishes. So this is here as a shim.
-            test['statuses']['overall'] = overall_status
-            test_data = {'name': test_name, 'outcomes': test['statuses'],
-                         'slaveid': test.get('slaveid', "Unknown"), 'color': color}
-            if 'composite' in test:
-                test_data['composite'] = test['composite']
-
-            if 'skipped' in test:
-                if test['skipped'].get('type', None) == 'provider':
-                    provider_skip_count += 1
-                    test_data['skip_provider'] = test['skipped'].get('reason', None)
-                if test['skipped'].get('type', None) == 'blocker':
-                    blocker_skip_count += 1
-                    test_data['skip_blocker'] = test['skipped'].get('reason', None)
-
+            if 'skip_provider' in test_data:
+                provider_skip_count += 1
             if 'skip_blocker' in test_data:
-                # Fix the inconveniently long list of repeated blockers until we sort out sets
-                # in riggerlib somehow.
-                test_data['skip_blocker'] = sorted(set(test_data['skip_blocker']))
-
-            if test.get('old', False):
-                test_data['old'] = True
-
-            if test.get('start_time', None):
-                if test.get('finish_time', None):
-                    test_data['in_progress'] = False
-                    test_data['duration'] = test['finish_time'] - test['start_time']
-                else:
-                    test_data['duration'] = time.time() - test['start_time']
-                    test_data['in_progress'] = True
-
-            # Set up destinations for the files
-            test_data["file_groups"] = []
-            test_data['qa_contact'] = []
-            processed_groups = {}
-            order = 0
-            for file_dict in test.get('files', []):
-                group = file_dict["group_id"]
-                if group not in processed_groups:
-                    processed_groups[group] = (order, [])
-                    order += 1
-                processed_groups[group][-1].append(file_dict)
-            # Current structure:
-            # {groupid: (group_order, [{filedict1}, {filedict2}])}
-            # Sorting by group_order
-            processed_groups = sorted(processed_groups.iteritems(), key=lambda kv: kv[1][0])
-            # And now make it [(groupid, [{filedict1}, {filedict2}, ...])]
-            processed_groups = [(group_name, files) for group_name, (_, files) in processed_groups]
-            for group_name, file_dicts in processed_groups:
-                group_file_list = []
-                for file_dict in file_dicts:
-                    if file_dict["file_type"] == "qa_contact":
-                        with open(file_dict["os_filename"], 'rb') as qafile:
-                            qareader = csv.reader(qafile, delimiter=',', quotechar='"')
-                            for qacontact in qareader:
-                                test_data['qa_contact'].append(qacontact)
-                                if qacontact[0] not in template_data['qa']:
-                                    template_data['qa'].append(qacontact[0])
-                        continue  # Do not store, handled a different way :)
-                    elif file_dict["file_type"] == "short_tb":
-                        with open(file_dict["os_filename"], 'r') as short_tb:
-                            test_data["short_tb"] = short_tb.read()
-                        continue
-                    file_dict["filename"] = file_dict["os_filename"].replace(log_dir, "")
-                    group_file_list.append(file_dict)
-
-                test_data["file_groups"].append((group_name, group_file_list))
-            # Snd remove groups that are left empty because of eg. traceback or qa contact
-            test_data["file_groups"] = filter(
-                lambda group: len(group[1]) > 0, test_data["file_groups"])
-            if "short_tb" in test_data and test_data["short_tb"]:
-                urls = [url for url in URL.findall(test_data["short_tb"])]
-                if urls:
-                    test_data["urls"] = urls
+                blocker_skip_count += 1
+            if overall_status in {'failed', 'error'} and test_data.get('short_tb', None):
+                tb_errors.append((test_data['short_tb'], test_name))
+            for qacontact in test_data['qa_contact']:
+                if qacontact[0] not in template_data['qa']:
+                    template_data['qa'].append(qacontact[0])
             template_data['tests'].append(test_data)
         template_data['top10'] = self.top10(tb_errors)
         template_data['counts'] = counts
         template_data['current_counts'] = current_counts
         template_data['blocker_skip_count'] = blocker_skip_count
         template_data['provider_skip_count'] = provider_skip_count
+        return template_data
 
-        if name_filter:
-            template_data['tests'] = [x for x in template_data['tests']
-                                      if re.findall('{}[-\]]+'.format(name_filter), x['name'])]
+    def process_test(self, test_name, test, log_dir):
+        """Processes the artifacts of one test, reading its files
+
+        ``log_dir`` has to end with a slash, the file names in the report are relative to it.
+
+        Returns: The data of the test for the report templates, or ``None`` if it has no
+            statuses yet
+        """
+        if not test.get('statuses', None):
+            return None
+        colors = {
+            'passed': 'success',
+            'failed': 'warning',
+            'error': 'danger',
+            'xpassed': 'danger',
+            'xfailed': 'success',
+            'skipped': 'info'}
+        overall_status = overall_test_status(test['statuses'])
+        color = colors[overall_status]
+        # This was removed previously but is needed as the overall is not generated
+        # until the test finishes. So this is here as a shim.
+        test['statuses']['overall'] = overall_status
+        # A copy, the statuses of the artifacts are updated in place as the test goes on, and the
+        # incremental report needs the ones the test was counted with
+        test_data = {'name': test_name, 'outcomes': dict(test['statuses']),
+                     'slaveid': test.get('slaveid', "Unknown"), 'color': color}
+        if 'composite' in test:
+            test_data['composite'] = test['composite']
+
+        if 'skipped' in test:
+            if test['skipped'].get('type', None) == 'provider':
+                test_data['skip_provider'] = test['skipped'].get('reason', None)
+            if test['skipped'].get('type', None) == 'blocker':
+                test_data['skip_blocker'] = test['skipped'].get('reason', None)
+
+        if 'skip_blocker' in test_data:
+            # Fix the inconveniently long list of repeated blockers until we sort out sets
+            # in riggerlib somehow.
+            test_data['skip_blocker'] = sorted(set(test_data['skip_blocker']))
+
+        if test.get('old', False):
+            test_data['old'] = True
+
+        if test.get('start_time', None):
+            if test.get('finish_time', None):
+                test_data['in_progress'] = False
+                test_data['duration'] = test['finish_time'] - test['start_time']
+            else:
+                test_data['duration'] = time.time() - test['start_time']
+                test_data['in_progress'] = True
+
+        # Set up destinations for the files
+        test_data["file_groups"] = []
+        test_data['qa_contact'] = []
+        processed_groups = {}
+        order = 0
+        for file_dict in test.get('files', []):
+            group = file_dict["group_id"]
+            if group not in processed_groups:
+                processed_groups[group] = (order, [])
+                order += 1
+            processed_groups[group][-1].append(file_dict)
+        # Current structure:
+        # {groupid: (group_order, [{filedict1}, {filedict2}])}
+        # Sorting by group_order
+        processed_groups = sorted(processed_groups.iteritems(), key=lambda kv: kv[1][0])
+        # And now make it [(groupid, [{filedict1}, {filedict2}, ...])]
+        processed_groups = [(group_name, files) for group_name, (_, files) in processed_groups]
+        for group_name, file_dicts in processed_groups:
+            group_file_list = []
+            for file_dict in file_dicts:
+                if file_dict["file_type"] == "qa_contact":
+                    with open(file_dict["os_filename"], 'rb') as qafile:
+                        qareader = csv.reader(qafile, delimiter=',', quotechar='"')
+                        for qacontact in qareader:
+                            test_data['qa_contact'].append(qacontact)
+                    continue  # Do not store, handled a different way :)
+                elif file_dict["file_type"] == "short_tb":
+                    with open(file_dict["os_filename"], 'r') as short_tb:
+                        test_data["short_tb"] = short_tb.read()
+                    continue
+                file_dict["filename"] = file_dict["os_filename"].replace(log_dir, "")
+                group_file_list.append(file_dict)
+
+            test_data["file_groups"].append((group_name, group_file_list))
+        # Snd remove groups that are left empty because of eg. traceback or qa contact
+        test_data["file_groups"] = filter(
+            lambda group: len(group[1]) > 0, test_data["file_groups"])
+        if "short_tb" in test_data and test_data["short_tb"]:
+            urls = [url for url in URL.findall(test_data["short_tb"])]
+            if urls:
+                test_data["urls"] = urls
+        return test_data
+
+    def format_test(self, test_data):
+        """Returns a copy of the data of a test, formatted for the report templates"""
+        test_data = dict(test_data)
+        if test_data.get('duration', None):
+            test_data['duration'] = str(datetime.timedelta(
+                seconds=math.ceil(test_data['duration'])))
+        return test_data
+
+    def report_data(self, index, tests):
+        """Returns the template data of a report of some of the tests of the index
+
+        The tests of the index aren't modified, so the index can be used for more reports.
+        """
+        template_data = dict(index)
+        template_data['tests'] = tests
 
         # Create the tree dict that is used for js tree
         # Note template_data['tests'] != tests
@@ -228,26 +391,13 @@ class ReporterBase(object):
 
         template_data['ndata'] = self.build_li(tests)
 
-        for test in template_data['tests']:
-            if test.get('duration', None):
-                test['duration'] = str(datetime.timedelta(
-                    seconds=math.ceil(test['duration'])))
+        template_data['tests'] = map(self.format_test, template_data['tests'])
 
         return template_data
 
     def top10(self, tb_errors):
-        sets = []
-        for entry in tb_errors:
-            for tset in sets:
-                if difflib.SequenceMatcher(a=entry[0][:10], b=tset[0][0][:10]).ratio() > .8:
-                    if difflib.SequenceMatcher(a=entry[0][:20], b=tset[0][0][:20]).ratio() > .75:
-                        if difflib.SequenceMatcher(a=entry[0][:30], b=tset[0][0][:30]).ratio() > .7:
-                            tset.append(entry)
-                            break
-            else:
-                sets.append([entry])
-
-        return sorted(sets, lambda p, q: cmp(len(p), len(q)), reverse=True)[:10]
+        """Returns the 10 largest clusters of similar ``(short traceback, test name)`` entries"""
+        return cluster_tracebacks(tb_errors)[:10]
 
     def build_dict(self, path, container, contents):
         """
@@ -281,67 +431,196 @@ class ReporterBase(object):
         """
         Build up the actual HTML tree from the dict from build_dict
         """
-        bimdict = {'passed': 'success',
-                   'failed': 'warning',
-                   'error': 'danger',
-                   'skipped': 'primary',
-                   'xpassed': 'danger',
-                   'xfailed': 'success'}
         list_string = '<ul>\n'
-        for k, v in lev['_sub'].iteritems():
+        # Sorted, so the tree doesn't depend on the order the tests were added in
+        for k, v in sorted(lev['_sub'].iteritems()):
 
             # If 'name' is an attribute then we are looking at a test (leaf).
             if 'name' in v:
-                pretty_time = str(datetime.timedelta(seconds=math.ceil(v['duration'])))
-                teststring = '<span name="mod_lev" class="label label-primary">T</span>'
-                label = '<span class="label label-{}">{}</span>'.format(
-                    bimdict[v['outcomes']['overall']], v['outcomes']['overall'].upper())
-                proc_name = process_pytest_path(v['name'])[-1]
-                link = (
-                    '<a href="#{}">{} {} {} <span style="color:#888888"><em>[{}]</em></span></a>'
-                    .format(v['name'], proc_name, teststring, label, pretty_time))
-                # Do we really need the os.path.split (now process_pytest_path) here?
-                # For me it seems the name is always the leaf
-                list_string += '<li>{}</li>\n'.format(link)
+                list_string += self.test_li(v)
 
             # If there is a '_sub' attribute then we know we have other modules to go.
             elif '_sub' in v:
-                percenstring = ""
-                bmax = 0
-                for _, val in v['_stats'].iteritems():
-                    bmax += val
-                # If there were any NON skipped tests, we now calculate the percentage which
-                # passed.
-                if bmax:
-                    percen = "{:.2f}".format((float(v['_stats']['passed']) +
-                                              float(v['_stats']['skipped']) +
-                                              float(v['_stats']['xfailed'])) / float(bmax) * 100)
-                    if float(percen) == 100.0:
-                        level = 'passed'
-                    elif float(percen) > 80.0:
-                        level = 'failed'
-                    else:
-                        level = 'error'
-                    percenstring = '<span name="blab" class="label label-{}">{}%</span>'.format(
-                        bimdict[level], percen)
-                modstring = '<span name="mod_lev" class="label label-primary">M</span>'
-                pretty_time = str(datetime.timedelta(seconds=math.ceil(v['_duration'])))
-                list_string += ('<li>{} {}<span>&nbsp;</span>'
-                                '{}{}<span style="color:#888888">&nbsp;<em>[{}]'
-                                '</em></span></li>\n').format(k,
-                                                              modstring,
-                                                              str(percenstring),
-                                                              self.build_li(v),
-                                                              pretty_time)
+                list_string += self.module_li(k, v, self.build_li(v))
         list_string += '</ul>\n'
         return list_string
 
+    def test_li(self, test):
+        """Returns the item of a test in the HTML tree"""
+        pretty_time = str(datetime.timedelta(seconds=math.ceil(test['duration'])))
+        teststring = '<span name="mod_lev" class="label label-primary">T</span>'
+        label = '<span class="label label-{}">{}</span>'.format(
+            _tree_colors[test['outcomes']['overall']], test['outcomes']['overall'].upper())
+        proc_name = process_pytest_path(test['name'])[-1]
+        link = (
+            '<a href="#{}">{} {} {} <span style="color:#888888"><em>[{}]</em></span></a>'
+            .format(test['name'], proc_name, teststring, label, pretty_time))
+        # Do we really need the os.path.split (now process_pytest_path) here?
+        # For me it seems the name is always the leaf
+        return '<li>{}</li>\n'.format(link)
+
+    def module_li(self, name, module, sub_list):
+        """Returns the item of a module in the HTML tree, ``sub_list`` being the list of its
+        contents"""
+        percenstring = ""
+        bmax = 0
+        for _, val in module['_stats'].iteritems():
+            bmax += val
+        # If there were any NON skipped tests, we now calculate the percentage which
+        # passed.
+        if bmax:
+            percen = "{:.2f}".format((float(module['_stats']['passed']) +
+                                      float(module['_stats']['skipped']) +
+                                      float(module['_stats']['xfailed'])) / float(bmax) * 100)
+            if float(percen) == 100.0:
+                level = 'passed'
+            elif float(percen) > 80.0:
+                level = 'failed'
+            else:
+                level = 'error'
+            percenstring = '<span name="blab" class="label label-{}">{}%</span>'.format(
+                _tree_colors[level], percen)
+        modstring = '<span name="mod_lev" class="label label-primary">M</span>'
+        pretty_time = str(datetime.timedelta(seconds=math.ceil(module['_duration'])))
+        return ('<li>{} {}<span>&nbsp;</span>'
+                '{}{}<span style="color:#888888">&nbsp;<em>[{}]'
+                '</em></span></li>\n').format(name,
+                                              modstring,
+                                              str(percenstring),
+                                              sub_list,
+                                              pretty_time)
+
+
+class IncrementalReport(object):
+    """The data of the main report, kept up to date by processing only the tests that changed
+
+    The processed data of every test is cached with its rendered panel and tree item, along with
+    the state of the artifacts it was made from (see :py:func:`artifact_state`). The module tree
+    keeps the stats of every module and the rendered list of its contents, and only the modules
+    on the path of a changed test are updated and rendered again. Tests in progress are always
+    processed again, as their duration keeps growing.
+
+    Args:
+        reporter: The :py:class:`ReporterBase` processing and rendering the tests
+    """
+    def __init__(self, reporter):
+        self.reporter = reporter
+        # {test_name: (state, test_data, report test_data with the html of the panel, tree item)}
+        self.tests = {}
+        self.tree = deepcopy(_tests_tpl)
+        self.tree['_sub']['tests'] = deepcopy(_tests_tpl)
+        self.lock = Lock()
+
+    def report_data(self, artifacts, log_dir, version):
+        """Updates the cache from the artifacts and returns the template data of the report"""
+        with self.lock:
+            log_dir = local(log_dir).strpath + "/"
+            for test_name in set(self.tests) - set(artifacts):
+                self.remove_test(test_name, prune=True)
+            for test_name, test in artifacts.iteritems():
+                cached = self.tests.get(test_name, None)
+                state = artifact_state(test)
+                if cached is not None:
+                    if cached[0] == state and not cached[1].get('in_progress', False):
+                        continue
+                    self.remove_test(test_name)
+                if state is not None:
+                    self.add_test(test_name, state, self.reporter.process_test(
+                        test_name, test, log_dir))
+            return self.template_data(artifacts, version)
+
+    def template_data(self, artifacts, version):
+        counts = dict.fromkeys(_tests_tpl['_stats'], 0)
+        current_counts = dict.fromkeys(_tests_tpl['_stats'], 0)
+        template_data = {
+            'tests': [], 'qa': [], 'version': version, 'counts': counts,
+            'current_counts': current_counts, 'blocker_skip_count': 0, 'provider_skip_count': 0}
+        tb_errors = []
+        for test_name in artifacts:
+            if test_name not in self.tests:
+                continue
+            _, test_data, report_test, _ = self.tests[test_name]
+            overall_status = test_data['outcomes']['overall']
+            counts[overall_status] += 1
+            if not test_data.get('old', False):
+                current_counts[overall_status] += 1
+            if 'skip_provider' in test_data:
+                template_data['provider_skip_count'] += 1
+            if 'skip_blocker' in test_data:
+                template_data['blocker_skip_count'] += 1
+            if overall_status in {'failed', 'error'} and test_data.get('short_tb', None):
+                tb_errors.append((test_data['short_tb'], test_name))
+            for qacontact in test_data['qa_contact']:
+                if qacontact[0] not in template_data['qa']:
+                    template_data['qa'].append(qacontact[0])
+            template_data['tests'].append(report_test)
+        template_data['top10'] = self.reporter.top10(tb_errors)
+        template_data['ndata'] = self.tree_list(self.tree)
+        return template_data
+
+    def tree_path(self, test_name):
+        """Returns the modules from the root of the tree to a test, and the keys of the modules
+        and the test below the root"""
+        segs = process_pytest_path(test_name.replace('cfme/', ''))
+        path = [self.tree]
+        for seg in segs[:-1]:
+            if seg not in path[-1]['_sub']:
+                path[-1]['_sub'][seg] = deepcopy(_tests_tpl)
+            path.append(path[-1]['_sub'][seg])
+        return path, segs
+
+    def add_test(self, test_name, state, test_data):
+        report_test = self.reporter.format_test(test_data)
+        report_test['html'] = template_env().get_template('test_report_test.html').render(
+            test=report_test)
+        self.tests[test_name] = (state, test_data, report_test, self.reporter.test_li(test_data))
+        path, segs = self.tree_path(test_name)
+        path[-1]['_sub'][segs[-1]] = test_data
+        for module in path:
+            module['_stats'][test_data['outcomes']['overall']] += 1
+            module['_duration'] += test_data['duration']
+            module.pop('_list', None)
+
+    def remove_test(self, test_name, prune=False):
+        """Removes a test from the cache and the tree
+
+        Args:
+            prune: Whether to remove the modules left empty, keep them when the test is going to
+                be added again
+        """
+        _, test_data, _, _ = self.tests.pop(test_name)
+        path, segs = self.tree_path(test_name)
+        del path[-1]['_sub'][segs[-1]]
+        for module in path:
+            module['_stats'][test_data['outcomes']['overall']] -= 1
+            module['_duration'] -= test_data['duration']
+            module.pop('_list', None)
+        if prune:
+            # The root and its first module are always there
+            for i in range(len(path) - 1, 1, -1):
+                if path[i]['_sub']:
+                    break
+                del path[i - 1]['_sub'][segs[i - 1]]
+
+    def tree_list(self, module):
+        """Returns the HTML list of the contents of a module, see :py:meth:`ReporterBase.build_li`
+        """
+        if '_list' not in module:
+            list_string = '<ul>\n'
+            for k, v in sorted(module['_sub'].iteritems()):
+                if 'name' in v:
+                    list_string += self.tests[v['name']][3]
+                elif '_sub' in v:
+                    list_string += self.reporter.module_li(k, v, self.tree_list(v))
+            list_string += '</ul>\n'
+            module['_list'] = list_string
+        return module['_list']
+
 
 class Reporter(ArtifactorBasePlugin, ReporterBase):
     def plugin_initialize(self):
         self.register_plugin_hook('report_test', self.report_test)
-        self.register_plugin_hook('finish_session', self.run_report)
-        self.register_plugin_hook('finish_session', self.run_provider_report)
+        self.register_plugin_hook('finish_session', self.run_reports)
         self.register_plugin_hook('build_report', self.run_report)
         self.register_plugin_hook('start_test', self.start_test)
         self.register_plugin_hook('skip_test', self.skip_test)
@@ -351,6 +630,10 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
 
     def configure(self):
         self.only_failed = self.data.get('only_failed', False)
+        self.render_processes = self.data.get('render_processes', 1)
+        self.incremental = self.data.get('incremental', False)
+        self.report_interval = self.data.get('report_interval', 0)
+        self.last_report = None
         self.configured = True
 
     @ArtifactorBasePlugin.check_configured
@@ -386,9 +669,20 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
     def session_info(self, version=None, build=None, stream=None):
         return None, {'build': build, 'stream': stream, 'version': version}
 
+    @ArtifactorBasePlugin.check_configured
+    def run_reports(self, old_artifacts, artifact_dir, version=None):
+        self._run_reports(old_artifacts, artifact_dir, version)
+
     @ArtifactorBasePlugin.check_configured
     def run_report(self, old_artifacts, artifact_dir, version=None):
-        self._run_report(old_artifacts, artifact_dir, version)
+        # The report of the whole session is built when it finishes anyway
+        if self.last_report and time.time() - self.last_report < self.report_interval:
+            return
+        if self.incremental:
+            self._run_incremental_report(old_artifacts, artifact_dir, version)
+        else:
+            self._run_report(old_artifacts, artifact_dir, version)
+        self.last_report = time.time()
 
     @ArtifactorBasePlugin.check_configured
     def run_provider_report(self, old_artifacts, artifact_dir, version=None):
@@ -6,7 +6,7 @@ from cfme.configure.configuration import candu
 from utils.conf import perf_tests
 from utils.log import logger
 from utils.path import log_path
-from utils.perf import collect_log
+from utils.perf import collect_log, collect_log_segments
 from utils.perf_message_stats import perf_process_evm
 import os
 import os.path
@@ -27,8 +27,7 @@ def enable_candu():
 
 @pytest.mark.usefixtures("setup_infrastructure_providers")
 def test_queue_infrastructure(request, ssh_client, enable_candu):
-    local_evm_gz = str(log_path.join('evm.perf.log.gz'))
-    local_evm = str(log_path.join('evm.perf.log'))
+    local_evm_dir = log_path.join('evm_segments')
     local_top_gz = str(log_path.join('top_output.perf.log.gz'))
     local_top = str(log_path.join('top_output.perf.log'))
 
@@ -38,22 +37,20 @@ def test_queue_infrastructure(request, ssh_client, enable_candu):
             if os.path.exists(clean_file):
                 logger.info('Removing: {}'.format(clean_file))
                 os.remove(clean_file)
-    request.addfinalizer(lambda: clean_up_log_files([local_evm, local_evm_gz, local_top,
-        local_top_gz]))
+    local_evm_dir.ensure(dir=True)
+    request.addfinalizer(lambda: local_evm_dir.remove(ignore_errors=True))
+    request.addfinalizer(lambda: clean_up_log_files([local_top, local_top_gz]))
 
     sleep_time = perf_tests['test_queue']['infra_time']
 
     logger.info('Waiting: {}'.format(sleep_time))
     time.sleep(sleep_time)
 
-    collect_log(ssh_client, 'evm', local_evm_gz)
+    evm_segments = collect_log_segments(ssh_client, 'evm', str(local_evm_dir))
     collect_log(ssh_client, 'top_output', local_top_gz, strip_whitespace=True)
 
-    logger.info('Calling gunzip {}'.format(local_evm_gz))
-    subprocess.call(['gunzip', local_evm_gz])
-
     logger.info('Calling gunzip {}'.format(local_top_gz))
     subprocess.call(['gunzip', local_top_gz])
 
     # Post process evm log and top_output log for charts and csvs
-    perf_process_evm(local_evm, local_top)
+    perf_process_evm(evm_segments, local_top, perf_tests['test_queue'].get('parse_workers'))
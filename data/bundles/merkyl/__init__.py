@@ -1,10 +1,13 @@
-from bottle import request, route, run, template
+from bottle import request, response, route, run, template
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer
 import os
 import subprocess
 import tempfile
 import sys
 import cgi
 import signal
+import zlib
 
 try:
     with open(sys.argv[2], "r") as f:
@@ -15,6 +18,7 @@ except IOError:
 allowed_files = [path.strip("\n") for path in allowed_files]
 
 template_dir = os.path.dirname(__file__)
+chunk_size = 64 * 1024
 
 
 class Log(object):
@@ -46,6 +50,14 @@ class Log(object):
         with open(self.f.name, "rb") as infile:
             return infile.read()
 
+    def chunks(self):
+        with open(self.f.name, "rb") as infile:
+            while True:
+                chunk = infile.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
     def size(self):
         if self.running:
             return os.path.getsize(self.f.name)
@@ -124,9 +136,24 @@ def lister():
     return template("merkyl", logs=get_data(), file_data=False, template_lookup=[template_dir])
 
 
+def gzip_chunks(chunks):
+    # Fastest compression, the logs compress well anyway
+    compressor = zlib.compressobj(1, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 @route('/get/<name>')
 def get(name):
-    return Loggers[name].get()
+    # Streamed, the logs can be too big to be read in memory at once
+    chunks = Loggers[name].chunks()
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_header('Content-Encoding', 'gzip')
+        return gzip_chunks(chunks)
+    return chunks
 
 
 @route('/reset/<name>')
@@ -171,8 +198,13 @@ def quit():
     sys.stderr.close()
 
 
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """Serves the requests in threads, so the logs can be fetched concurrently"""
+    daemon_threads = True
+
+
 def main():
-    run(host='0.0.0.0', port=sys.argv[1])
+    run(host='0.0.0.0', port=sys.argv[1], server_class=ThreadingWSGIServer)
 
 
 if __name__ == "__main__":
@@ -9,6 +9,7 @@
         server_address: 127.0.0.1
         server_port: 21212
         server_enabled: True
+        spool_threshold: 65536
         plugins:
 
 ``log_dir`` is the destination for all artifacts
@@ -17,8 +18,13 @@
 
 ``reuse_dir`` if this is False and Artifactor comes across a dir that has
 already been used, it will die
+
+``spool_threshold`` is the size in bytes from which the contents of file dumps (eg. screenshots)
+are written to ``spool_dir`` (``log_dir``/artifactor_spool by default) and moved to the artifacts
+by Artifactor, instead of being sent to it; set it to null to always send them
 """
 import atexit
+import os
 from urlparse import urlparse
 
 import diaper
@@ -27,8 +33,9 @@ import pytest
 from artifactor import ArtifactorClient
 from fixtures.pytest_store import write_line, store
 from utils.conf import env, credentials
+from utils.log import logger
 from utils.net import random_port, net_check
-from utils.path import project_path
+from utils.path import log_path, project_path
 from utils.wait import wait_for
 from utils import version
 
@@ -68,7 +75,12 @@ if art_config:
     if 'server_port' not in art_config:
         port = random_port()
         art_config['server_port'] = port
-    art_client = ArtifactorClient(art_config['server_address'], art_config['server_port'])
+    spool_threshold = art_config.get('spool_threshold', 64 * 1024)
+    spool_dir = art_config.get('spool_dir', os.path.join(
+        art_config.get('log_dir', log_path.strpath), 'artifactor_spool'))
+    art_client = ArtifactorClient(art_config['server_address'], art_config['server_port'],
+        spool_dir=spool_dir if spool_threshold is not None else None,
+        spool_threshold=spool_threshold)
 else:
     art_client = DummyClient()
 
@@ -127,6 +139,8 @@ def pytest_runtest_protocol(item):
     # This pre_start_test hook is needed so that filedump is able to make get the test
     # object set up before the logger starts logging. As the logger fires a nested hook
     # to the filedumper, and we can't specify order inriggerlib.
+    # Records logged since the last test finished belong to the previous test's log
+    logger.flush_art_log()
     art_client.fire_hook('pre_start_test', test_location=location, test_name=name,
                          slaveid=SLAVEID, ip=appliance_ip_address)
     art_client.fire_hook('start_test', test_location=location, test_name=name,
@@ -136,6 +150,7 @@ def pytest_runtest_protocol(item):
 
 def pytest_runtest_teardown(item, nextitem):
     name, location = get_test_idents(item)
+    logger.flush_art_log()
     art_client.fire_hook('finish_test', test_location=location, test_name=name,
                          slaveid=SLAVEID, ip=appliance_ip_address, grab_result=True)
     art_client.fire_hook('sanitize', test_location=location, test_name=name, words=words)
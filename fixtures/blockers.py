@@ -12,6 +12,8 @@ import pytest
 
 from fixtures.pytest_store import store
 from utils.blockers import Blocker, BZ, GH
+from utils.conf import cfme_data
+from utils.log import logger
 
 
 @pytest.fixture(scope="function")
@@ -61,8 +63,48 @@ def pytest_addoption(parser):
                     help='Specify to list the blockers (takes some time though).')
 
 
+def bugzilla_blocker_ids(items):
+    """Returns the ids of all the bugzilla bugs in the blockers of the items"""
+    ids = set([])
+    for item in items:
+        for blocker in getattr(item, "_metadata", {}).get("blockers", []):
+            if isinstance(blocker, int):
+                ids.add(blocker)
+                continue
+            try:
+                blocker = Blocker.parse(blocker)
+            except ValueError:
+                # reported when the blocker is resolved
+                continue
+            if isinstance(blocker, BZ):
+                ids.add(blocker.bug_id)
+    return ids
+
+
+def prefetch_bugzilla_blockers(items):
+    """Fetches all of the bugzilla blockers and their variants at once
+
+    The bugs are written to the bugzilla cache file, so the slaves don't have to fetch them again.
+    """
+    if not cfme_data.get("bugzilla", {}).get("url"):
+        return
+    ids = bugzilla_blocker_ids(items)
+    if not ids:
+        return
+    try:
+        BZ.bugzilla.prefetch_variants(ids)
+        BZ.bugzilla.save_cache()
+    except Exception as e:
+        # The blockers are fetched one at a time when they're resolved instead
+        logger.warning("Unable to prefetch the bugzilla blockers: {}".format(e))
+    else:
+        logger.info("Prefetched {} bugzilla blockers ({} bugs with variants)".format(
+            len(ids), BZ.bugzilla.bug_count))
+
+
 @pytest.mark.trylast
 def pytest_collection_modifyitems(session, config, items):
+    prefetch_bugzilla_blockers(items)
     if not config.getvalue("list_blockers"):
         return
     store.terminalreporter.write("Loading blockers ...\n", bold=True)
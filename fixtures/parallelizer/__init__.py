@@ -26,6 +26,12 @@ The Workflow
   - If more tests are received, they are run
   - If no tests are received, the slave will shut down after running its final test
 
+- Test groups are sent longest first, based on test durations recorded in
+  ``log/test_durations.json`` by previous runs
+- When no groups are left, a slave asking for tests waits until another slave starts a test;
+  that slave is then told to skip the tail of its unstarted tests, which are sent to the waiting
+  slave instead (as long as the provider affinity rules allow it)
+
 - After all slaves are shut down, the master will do its end-of-session reporting as usual, and
   shut down
 
@@ -51,12 +57,14 @@ from functools32 import wraps
 
 from fixtures import terminalreporter
 from fixtures.parallelizer import remote
+from fixtures.parallelizer.scheduler import (
+    DispatchStats, DurationStore, ProviderGroupIndex, steal_tail)
 from fixtures.pytest_store import store
 from utils import at_exit, conf
 from utils.appliance import IPAppliance
 from utils.log import create_sublogger
 from utils.net import random_port
-from utils.path import conf_path, project_path
+from utils.path import conf_path, log_path, project_path
 from utils.sprout import SproutClient, SproutException
 from utils.wait import wait_for
 
@@ -179,6 +187,9 @@ class SlaveDict(dict):
 
 
 class ParallelSession(object):
+    # how many providers a slave's appliance may have before it gets cleansed
+    appliance_num_limit = 2
+
     def __init__(self, config):
         self.config = config
         self.session = None
@@ -194,10 +205,16 @@ class ParallelSession(object):
         self.slaves = SlaveDict()
         self.slave_urls = SlaveDict()
         self.slave_tests = defaultdict(set)
+        # tests sent to each slave that it hasn't started yet, in the order it will run them
+        self.slave_queues = defaultdict(deque)
+        # slaves waiting to take over some other slave's tests
+        self.idle_slaves = deque()
+        self.durations = DurationStore(log_path.join('test_durations.json'))
         self.test_groups = self._test_item_generator()
 
-        self._pool = []
+        self._pool = None
         self.pool_lock = Lock()
+        self.dispatch_stats = DispatchStats()
         from utils.conf import cfme_data
         self.provs = sorted(set(cfme_data['management_systems'].keys()),
                             key=len, reverse=True)
@@ -245,10 +262,9 @@ class ParallelSession(object):
                 self.sprout_client.destroy_pool(pool_id)
                 raise
             else:
-                pool = self.sprout_client.request_check(self.sprout_pool)
-                dump_pool_info(lambda x: self.terminal.write("{}\n".format(x)), pool)
+                request = self.sprout_client.request_check(self.sprout_pool)
+                dump_pool_info(lambda x: self.terminal.write("{}\n".format(x)), request)
             self.terminal.write("Provisioning took {0:.1f} seconds\n".format(result.duration))
-            request = self.sprout_client.request_check(self.sprout_pool)
             self.appliances = []
             # Push an appliance to the stack to have proper reference for test collection
             IPAppliance(address=request["appliances"][0]["ip_address"]).push()
@@ -319,6 +335,7 @@ class ParallelSession(object):
             returncode = slave.poll()
             if returncode:
                 del(self.slaves[slaveid])
+                self.slave_queues.pop(slaveid, None)
                 if returncode == -9:
                     msg = '{} killed due to error, respawning'.format(slaveid)
                 else:
@@ -498,7 +515,13 @@ class ParallelSession(object):
             self.monitor_shutdown(slaveid, **kwargs)
 
     def send_tests(self, slaveid):
-        """Send a slave a group of tests"""
+        """Send a slave a group of tests
+
+        If there are no more groups to send, but other slaves have tests they haven't
+        started yet, the slave is left waiting for some of them instead (see
+        :py:meth:`steal_tests`).
+
+        """
         try:
             with SlaveDict.lock:
                 tests = list(self.failed_slave_test_groups.popleft())
@@ -511,8 +534,17 @@ class ParallelSession(object):
             except StopIteration:
                 tests = []
 
+        if not tests and self._stealable_slaves(slaveid):
+            self.log.info('{} waiting to take over tests from another slave'.format(slaveid))
+            self.idle_slaves.append(slaveid)
+            return tests
+
+        return self._send_tests(slaveid, tests)
+
+    def _send_tests(self, slaveid, tests):
         self.send(slaveid, tests)
         self.slave_tests[slaveid] |= set(tests)
+        self.slave_queues[slaveid].extend(tests)
         collect_len = len(self.collection)
         tests_len = len(tests)
         self.sent_tests += tests_len
@@ -523,6 +555,70 @@ class ParallelSession(object):
             ))
         return tests
 
+    def _stealable_slaves(self, thief):
+        # slaves with tests that could be taken over; their next test is never taken,
+        # since the slave has already set it up as the next item of its running test
+        return [slaveid for slaveid, queue in self.slave_queues.items()
+            if slaveid != thief and slaveid in self.slaves and len(queue) > 1]
+
+    def _can_allocate(self, slaveid, prov):
+        allocation = self.slave_allocation.get(slaveid, [])
+        return prov is None or prov in allocation or len(allocation) < self.appliance_num_limit
+
+    def test_started(self, slaveid, nodeid):
+        """Track a test starting on a slave, dropping it from the slave's unstarted tests"""
+        queue = self.slave_queues[slaveid]
+        if nodeid in queue:
+            while queue.popleft() != nodeid:
+                pass
+
+    def steal_tests(self, victim):
+        """Hand the tail of a slave's unstarted tests over to a waiting idle slave
+
+        Called when ``victim`` reports a test start, so it can be told which tests were taken
+        before it gets to them. Only tests parametrized with one provider (or none) are taken at
+        once, and only if the idle slave's appliance may take on that provider.
+
+        Returns: The tests taken from ``victim``, which it must not run
+
+        """
+        if not self.idle_slaves or self._pool is None:
+            return []
+        queue = self.slave_queues[victim]
+        candidates = list(queue)
+        if len(candidates) < 2:
+            return []
+        tail_prov = self._pool.provider_for(candidates[-1])
+        for thief in list(self.idle_slaves):
+            if thief not in self.slaves or not self._can_allocate(thief, tail_prov):
+                continue
+            stolen = steal_tail(candidates, self.durations.estimate,
+                lambda test: self._pool.provider_for(test) == tail_prov)
+            if not stolen:
+                continue
+            self.idle_slaves.remove(thief)
+            for __ in stolen:
+                queue.pop()
+            self.slave_tests[victim] -= set(stolen)
+            self.sent_tests -= len(stolen)
+            if tail_prov is not None and tail_prov not in self.slave_allocation[thief]:
+                self.slave_allocation[thief].append(tail_prov)
+            self.print_message('{} taking over {} tests from {}'.format(
+                thief, len(stolen), victim), yellow=True)
+            self._send_tests(thief, stolen)
+            return stolen
+        return []
+
+    def _release_idle_slaves(self):
+        # idle slaves get redistributed tests of dead slaves first, and are sent an empty
+        # group (shutting them down) when there's nothing left that they could take over
+        for thief in list(self.idle_slaves):
+            if thief not in self.slaves:
+                self.idle_slaves.remove(thief)
+            elif self.failed_slave_test_groups or not self._stealable_slaves(thief):
+                self.idle_slaves.remove(thief)
+                self.send_tests(thief)
+
     def pytest_sessionstart(self, session):
         """pytest sessionstart hook
 
@@ -570,6 +666,7 @@ class ParallelSession(object):
             while True:
                 # spawn/kill/replace slaves if needed
                 self._slave_audit()
+                self._release_idle_slaves()
 
                 if not self.slaves:
                     # All slaves are killed or errored, we're done with tests
@@ -599,12 +696,18 @@ class ParallelSession(object):
                     self.send_tests(slaveid)
                     self.log.info('starting master test distribution')
                 elif event_name == 'runtest_logstart':
-                    self.ack(slaveid, event_name)
+                    self.test_started(slaveid, event_data['nodeid'])
+                    stolen = self.steal_tests(slaveid)
+                    if stolen:
+                        self.send(slaveid, {'revoke': stolen})
+                    else:
+                        self.ack(slaveid, event_name)
                     self.trdist.runtest_logstart(slaveid,
                         event_data['nodeid'], event_data['location'])
                 elif event_name == 'runtest_logreport':
                     self.ack(slaveid, event_name)
                     report = unserialize_report(event_data['report'])
+                    self.durations.add(report.nodeid, report.duration)
                     if (report.when in ('call', 'teardown')
                             and report.nodeid in self.slave_tests[slaveid]):
                         self.slave_tests[slaveid].remove(report.nodeid)
@@ -632,6 +735,8 @@ class ParallelSession(object):
             raise
         finally:
             terminalreporter.enable()
+            self.log.info('test group dispatch: {}'.format(self.dispatch_stats))
+            self.durations.save()
 
         # Suppress other runtestloop calls
         return True
@@ -699,110 +804,52 @@ class ParallelSession(object):
 
     def get(self, slave):
         with self.pool_lock:
-            if not self._pool:
-                for test_group in self.test_groups:
-                    self._pool.append(test_group)
-                    for test in test_group:
-                        if '[' in test:
-                            found_prov = []
-                            for pv in self.provs:
-                                if pv in test:
-                                    found_prov.append(pv)
-                                    break
-                            provs = list(set(found_prov).intersection(self.provs))
-                            if provs:
-                                self.used_prov = self.used_prov.union(set(provs))
-                if self.used_prov:
-                    self.ratio = float(len(self.slaves)) / float(len(self.used_prov))
-                else:
-                    self.ratio = 0.0
-            if not self._pool:
-                raise StopIteration
-            current_allocate = self.slave_allocation.get(slave, None)
-            # num_provs_list = [len(v) for k, v in self.slave_allocation.iteritems()]
-            # average_num_provs = sum(num_provs_list) / float(len(self.slaves))
-            appliance_num_limit = 2
-            for test_group in self._pool:
-                for test in test_group:
-                    # If the test is parametrized...
-                    if '[' in test:
-                        found_prov = []
-                        for pv in self.provs:
-                            if pv in test:
-                                found_prov.append(pv)
-                                break
-                        # The line below can probably be removed now, since we compare
-                        # providers in the loop above with self.provs, which is a list
-                        # of all providers.
-                        provs = list(set(found_prov).intersection(self.provs))
-                        # If the parametrization contains a provider...
-                        if provs:
-                            prov = provs[0]
-                            # num_slave_with_prov = len([sl for sl, provs_list
-                            #    in self.slave_allocation.iteritems()
-                            #    if prov in provs_list])
-                            # If this slave/appliance already has providers then...
-                            if current_allocate:
-                                # If the slave has _our_ provider
-                                if prov in current_allocate:
-                                    # provider is already with the slave, so just return the tests
-                                    self._pool.remove(test_group)
-                                    return test_group
-                                # If the slave doesn't have _our_ provider
-                                else:
-                                    # Check to see how many slaves there are with this provider
-                                    if len(self.slave_allocation[slave]) >= appliance_num_limit:
-                                        continue
-                                    else:
-                                        # Adding provider to slave since there are not too many
-                                        self.slave_allocation[slave].append(prov)
-                                        self._pool.remove(test_group)
-                                        return test_group
-                            # If this slave doesn't have any providers...
-                            else:
-                                # Adding provider to slave
-                                self.slave_allocation[slave].append(prov)
-                                self._pool.remove(test_group)
-                                return test_group
-                        else:
-                            # No providers - ie, not a provider parametrized test
-                            self._pool.remove(test_group)
-                            return test_group
-                    else:
-                        # No params, so no need to think about providers
-                        self._pool.remove(test_group)
-                        return test_group
-                # Here means no tests were able to be sent
-            for test_group in self._pool:
-                for test in test_group:
-                    # If the test is parametrized...
-                    if '[' in test:
-                        found_prov = []
-                        for pv in self.provs:
-                            if pv in test:
-                                found_prov.append(pv)
-                                break
-                        # The line below can probably be removed now, since we compare
-                        # providers in the loop above with self.provs, which is a list
-                        # of all providers.
-                        provs = list(set(found_prov).intersection(self.provs))
-                        # If the parametrization contains a provider...
-                        if provs:
-                            # Already too many slaves with provider
-                            app_url = self.slave_urls[slave]
-                            app_ip = urlparse(app_url).netloc
-                            app = IPAppliance(app_ip)
-                            self.print_message('cleansing appliance', slave,
-                                purple=True)
-                            try:
-                                app.delete_all_providers()
-                            except:
-                                self.print_message('cloud not cleanse', slave,
-                                red=True)
-                            self.slave_allocation[slave] = [prov]
-                            self._pool.remove(test_group)
-                            return test_group
-            return []
+            start_time = time()
+            try:
+                return self._get(slave)
+            finally:
+                self.dispatch_stats.record(time() - start_time)
+
+    def _get(self, slave):
+        if self._pool is None:
+            self._pool = ProviderGroupIndex(self.provs)
+            # longest groups first, so the run doesn't end waiting on one long group
+            for test_group in self.durations.longest_first(self.test_groups):
+                self._pool.add(test_group)
+            self.used_prov = self._pool.used_providers
+            if self.used_prov:
+                self.ratio = float(len(self.slaves)) / float(len(self.used_prov))
+            else:
+                self.ratio = 0.0
+        if not self._pool:
+            raise StopIteration
+        current_allocate = self.slave_allocation.get(slave, [])
+        if len(current_allocate) < self.appliance_num_limit:
+            # This slave can take on another provider, so just take the next group
+            test_group = self._pool.first()
+        else:
+            # Only groups without providers, or with providers the slave already has
+            test_group = self._pool.first(providers=[None] + current_allocate)
+        if test_group is not None:
+            prov = test_group.provider
+            if prov is not None and prov not in current_allocate:
+                # Adding provider to slave since there are not too many
+                self.slave_allocation[slave].append(prov)
+            return self._pool.take(test_group)
+
+        # Here means no tests were able to be sent; only groups with other providers are left
+        test_group = self._pool.first()
+        # Already too many slaves with provider
+        app_url = self.slave_urls[slave]
+        app_ip = urlparse(app_url).netloc
+        app = IPAppliance(app_ip)
+        self.print_message('cleansing appliance', slave, purple=True)
+        try:
+            app.delete_all_providers()
+        except:
+            self.print_message('cloud not cleanse', slave, red=True)
+        self.slave_allocation[slave] = [test_group.provider]
+        return self._pool.take(test_group)
 
 
 def report_collection_diff(slaveid, from_collection, to_collection):
@@ -29,6 +29,8 @@ class SlaveManager(object):
         self.sock.connect(zmq_endpoint)
 
         self.messages = {}
+        # tests received from the master and not yet started
+        self.tests = deque()
 
         self.quit_signaled = False
 
@@ -65,9 +67,16 @@ class SlaveManager(object):
         """pytest runtest logstart hook
 
         - sends logstart notice to the master
+        - drops any tests the master has handed over to another slave
 
         """
-        self.send_event("runtest_logstart", nodeid=nodeid, location=location)
+        recv = self.send_event("runtest_logstart", nodeid=nodeid, location=location)
+        if isinstance(recv, dict) and recv.get('revoke'):
+            revoked = set(recv['revoke'])
+            self.log.info('master handed {} tests over to another slave'.format(len(revoked)))
+            remaining = [test_id for test_id in self.tests if test_id not in revoked]
+            self.tests.clear()
+            self.tests.extend(remaining)
 
     def pytest_runtest_logreport(self, report):
         """pytest runtest logreport hook
@@ -121,7 +130,8 @@ class SlaveManager(object):
 
     def _test_generator(self):
         # Pull the first batch of tests, stash in a deque
-        tests = self._get_tests()
+        tests = self.tests
+        tests.extend(self._get_tests())
         while True:
             # pop the first test, try to get the next
             try:
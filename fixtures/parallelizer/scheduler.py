@@ -0,0 +1,206 @@
+"""Test group scheduling for the parallelizer
+
+The master hands out groups of tests to slaves, preferring to keep tests parametrized with the
+same provider on the same appliance. :py:class:`ProviderGroupIndex` works out the provider of
+each group once, when the group is added, so that picking the next group for a slave doesn't
+have to rescan the remaining groups.
+
+Test durations from previous runs are kept in a :py:class:`DurationStore`; the master hands out
+the longest groups first, and when a slave runs out of work it can take over the tail of another
+slave's unstarted tests (see :py:func:`steal_tail`), so the run doesn't end waiting for one slave.
+
+"""
+import json
+from collections import defaultdict, deque
+from itertools import count
+
+
+class _TestGroup(object):
+    __slots__ = ('seq', 'tests', 'provider', 'taken')
+
+    def __init__(self, seq, tests, provider):
+        self.seq = seq
+        self.tests = tests
+        self.provider = provider
+        self.taken = False
+
+
+class ProviderGroupIndex(object):
+    """Test groups indexed by the provider they're parametrized with
+
+    Groups are kept in the order they were added, both in one queue of all groups and in one
+    queue per provider. Taking a group only marks it, and taken groups are dropped from the
+    front of the queues as they're found, so every lookup is (amortized) constant time.
+
+    Groups that aren't parametrized with a provider are indexed under ``None``.
+
+    Args:
+        providers: Provider keys to look for in the test ids
+
+    """
+    def __init__(self, providers):
+        # longest first, so a provider key containing another key is matched first
+        self.providers = sorted(set(providers), key=len, reverse=True)
+        self._seq = count()
+        self._all = deque()
+        self._by_provider = {}
+        self._remaining = 0
+
+    def provider_for(self, test_id):
+        """Return the provider a test id is parametrized with, or ``None``"""
+        if '[' in test_id:
+            for provider in self.providers:
+                if provider in test_id:
+                    return provider
+        return None
+
+    def add(self, tests):
+        """Add a group of tests, classified by the provider of its first test"""
+        group = _TestGroup(next(self._seq), tests, self.provider_for(tests[0]))
+        self._all.append(group)
+        self._by_provider.setdefault(group.provider, deque()).append(group)
+        self._remaining += 1
+        return group
+
+    @property
+    def used_providers(self):
+        """Providers that any of the added groups are parametrized with"""
+        return set(provider for provider in self._by_provider if provider is not None)
+
+    def first(self, providers=None):
+        """Return the first remaining group, without taking it
+
+        Args:
+            providers: If given, only consider groups parametrized with one of these providers;
+                include ``None`` to also consider groups without a provider
+
+        Returns: The first matching group in the order they were added, or ``None``
+
+        """
+        if providers is None:
+            return self._head(self._all)
+        heads = [self._head(self._by_provider[provider])
+            for provider in set(providers) if provider in self._by_provider]
+        heads = [group for group in heads if group is not None]
+        if heads:
+            return min(heads, key=lambda group: group.seq)
+        return None
+
+    def take(self, group):
+        """Remove a group from the index, returning its tests"""
+        if not group.taken:
+            group.taken = True
+            self._remaining -= 1
+        return group.tests
+
+    def _head(self, queue):
+        while queue and queue[0].taken:
+            queue.popleft()
+        return queue[0] if queue else None
+
+    def __len__(self):
+        return self._remaining
+
+    def __nonzero__(self):
+        return self._remaining > 0
+
+
+class DispatchStats(object):
+    """Counts test group dispatches and the time spent picking the groups"""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0.
+
+    def __str__(self):
+        return '{} dispatches, {:.3f}ms average, {:.3f}ms max'.format(
+            self.count, self.average * 1000, self.max * 1000)
+
+
+class DurationStore(object):
+    """Test durations by node id, persisted between runs as json
+
+    Durations recorded during this run replace the stored durations when :py:meth:`save` is
+    called. Tests without a stored duration are estimated at the average stored duration.
+
+    Args:
+        path: :py:class:`py.path.local` of the json file
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.stored = {}
+        self.current = defaultdict(float)
+        if path.check():
+            try:
+                with path.open() as f:
+                    stored = json.load(f)
+                self.stored = {nodeid: float(seconds) for nodeid, seconds in stored.iteritems()}
+            except (AttributeError, TypeError, ValueError):
+                # corrupted file, start over
+                self.stored = {}
+        if self.stored:
+            self.default = sum(self.stored.itervalues()) / len(self.stored)
+        else:
+            self.default = 1.
+
+    def add(self, nodeid, seconds):
+        """Add the duration of one of a test's phases (setup, call, teardown)"""
+        self.current[nodeid] += seconds
+
+    def estimate(self, nodeid):
+        return self.stored.get(nodeid, self.default)
+
+    def estimate_group(self, tests):
+        return sum(map(self.estimate, tests))
+
+    def longest_first(self, groups):
+        """Return the test groups sorted by their estimated duration, longest first
+
+        Groups with the same estimate keep their order.
+        """
+        return sorted(groups, key=self.estimate_group, reverse=True)
+
+    def save(self):
+        durations = dict(self.stored)
+        durations.update(self.current)
+        self.path.dirpath().ensure(dir=True)
+        with self.path.open('w') as f:
+            json.dump(durations, f)
+
+
+def steal_tail(tests, estimate, can_take, fraction=.5):
+    """Pick tests to take over from the end of another slave's unstarted tests
+
+    The first of the tests is never taken, since the slave has already set it up as the next
+    item of its running test.
+
+    Args:
+        tests: The other slave's unstarted tests, in the order it would run them
+        estimate: Callable returning the estimated duration of a test
+        can_take: Callable returning whether a test may be taken
+        fraction: Stop stealing once this fraction of the estimated remaining time is taken
+
+    Returns: The stolen tests, in the order they should be run
+
+    """
+    tests = tests[1:]
+    total = sum(map(estimate, tests))
+    stolen = []
+    stolen_time = 0.
+    for test in reversed(tests):
+        if stolen_time >= total * fraction or not can_take(test):
+            break
+        stolen.append(test)
+        stolen_time += estimate(test)
+    stolen.reverse()
+    return stolen
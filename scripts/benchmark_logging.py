@@ -0,0 +1,98 @@
+#!/usr/bin/env python2
+"""Micro-benchmark for the cost of messages sent through :py:data:`utils.log.logger`
+
+Measures the per-message cost of suppressed messages (below every configured level) and of
+emitted messages (written to the log file and buffered for the artifactor), for both the
+current :py:class:`utils.log.ArtifactorLoggerAdapter` and the previous implementation, which
+inspected the stack and fired a hook for every message before checking the level.
+
+The artifactor itself is replaced with a client that discards hooks, so only the cost on the
+test side is measured.
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import timeit
+
+from utils import log
+
+
+class NullArtifactorClient(object):
+    def __init__(self):
+        self.hooks_fired = 0
+
+    def fire_hook(self, *args, **kwargs):
+        self.hooks_fired += 1
+
+    def __nonzero__(self):
+        return True
+
+
+class PreviousLoggerAdapter(log.ArtifactorLoggerAdapter):
+    """The adapter as it was before the level check and record buffering were introduced"""
+    def art_log(self, level_name, message, kwargs):
+        art_log_record = {
+            'level': level_name,
+            'message': log.safe_string(message),
+            'extra': kwargs.get('extra', '')
+        }
+        self.artifactor.fire_hook('log_message', log_record=art_log_record, slaveid=self.slaveid)
+
+    def trace(self, msg, *args, **kwargs):
+        msg, kwargs = self.process(msg, kwargs)
+        self.art_log('trace', msg, kwargs)
+        return self.logger.trace(msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        msg, kwargs = self.process(msg, kwargs)
+        self.art_log('info', msg, kwargs)
+        return self.logger.info(msg, *args, **kwargs)
+
+    def process(self, msg, kwargs):
+        frameinfo = log.nth_frame_info(3)
+        extra = kwargs.get('extra', {})
+        if not extra.get('source_file'):
+            extra['source_file'] = log.get_rel_path(frameinfo.filename)
+            extra['source_lineno'] = frameinfo.lineno
+        kwargs['extra'] = extra
+        return msg, kwargs
+
+
+def make_adapter(adapter_class, logfile):
+    logger = log.create_logger('benchmark', filename=logfile)
+    logger.setLevel(logging.INFO)
+    adapter = adapter_class(logger, {})
+    adapter.artifactor = NullArtifactorClient()
+    adapter.slaveid = ''
+    adapter.art_level = logging.DEBUG
+    return adapter
+
+
+def per_message(func, number):
+    # best of three, in microseconds per message
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--number', type=int, default=10000,
+        help='number of messages to log per measurement')
+    args = parser.parse_args()
+
+    logfile = tempfile.NamedTemporaryFile(suffix='.log')
+    print '{:<10} {:>16} {:>16}'.format('adapter', 'suppressed (us)', 'emitted (us)')
+    for name, adapter_class in [('previous', PreviousLoggerAdapter),
+                                ('current', log.ArtifactorLoggerAdapter)]:
+        adapter = make_adapter(adapter_class, logfile.name)
+        suppressed = per_message(lambda: adapter.trace('suppressed %s', 'message'), args.number)
+        emitted = per_message(lambda: adapter.info('emitted %s', 'message'), args.number)
+        if hasattr(adapter, 'flush_art_log'):
+            adapter.flush_art_log()
+        print '{:<10} {:>16.2f} {:>16.2f}'.format(name, suppressed, emitted)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
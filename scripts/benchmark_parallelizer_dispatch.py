@@ -0,0 +1,142 @@
+#!/usr/bin/env python2
+"""Scale benchmark for the parallelizer's test group dispatch
+
+Builds a synthetic collection of provider-parametrized test ids, splits it into groups the
+same way the parallelizer does, and then hands every group out to a number of simulated slaves,
+once with :py:class:`ProviderGroupIndex <fixtures.parallelizer.scheduler.ProviderGroupIndex>`
+and once with the previous implementation, which rescanned the remaining groups (checking
+every provider against every test) for each dispatch.
+"""
+import argparse
+import sys
+from collections import OrderedDict, defaultdict
+from itertools import cycle
+from time import time
+
+from fixtures.parallelizer.scheduler import DispatchStats, ProviderGroupIndex
+
+APPLIANCE_NUM_LIMIT = 2
+
+
+def synthetic_groups(num_tests, num_providers, num_modules, num_params):
+    providers = ['provider{:02d}'.format(i) for i in range(num_providers)]
+    groups = OrderedDict()
+    tests_per_group = max(1, num_tests // (num_modules * num_providers * num_params))
+    for module in range(num_modules):
+        for provider in providers:
+            for param in range(num_params):
+                param_id = '{}-param{}'.format(provider, param)
+                groups[(module, param_id)] = [
+                    'cfme/tests/test_module{}.py::test_{}[{}]'.format(module, test, param_id)
+                    for test in range(tests_per_group)]
+    return providers, groups.values()
+
+
+def previous_provider(provs, test):
+    if '[' in test:
+        for pv in provs:
+            if pv in test:
+                return pv
+    return None
+
+
+def previous_get(pool, provs, slave_allocation, slave):
+    # the dispatch logic of ParallelSession.get before groups were indexed by provider
+    current_allocate = slave_allocation.get(slave, None)
+    for test_group in pool:
+        for test in test_group:
+            prov = previous_provider(provs, test)
+            if prov is None or not current_allocate or prov in current_allocate:
+                if prov is not None and not current_allocate:
+                    slave_allocation[slave].append(prov)
+                pool.remove(test_group)
+                return test_group
+            elif len(slave_allocation[slave]) >= APPLIANCE_NUM_LIMIT:
+                continue
+            else:
+                slave_allocation[slave].append(prov)
+                pool.remove(test_group)
+                return test_group
+    for test_group in pool:
+        slave_allocation[slave] = [previous_provider(provs, test_group[0])]
+        pool.remove(test_group)
+        return test_group
+    return []
+
+
+def indexed_get(index, slave_allocation, slave):
+    # the dispatch logic of ParallelSession.get, without cleansing the appliance
+    current_allocate = slave_allocation.get(slave, [])
+    if len(current_allocate) < APPLIANCE_NUM_LIMIT:
+        group = index.first()
+    else:
+        group = index.first(providers=[None] + current_allocate)
+    if group is not None:
+        if group.provider is not None and group.provider not in current_allocate:
+            slave_allocation[slave].append(group.provider)
+        return index.take(group)
+    group = index.first()
+    slave_allocation[slave] = [group.provider]
+    return index.take(group)
+
+
+def run_previous(providers, groups, slaves):
+    provs = sorted(providers, key=len, reverse=True)
+    stats = DispatchStats()
+    pool = list(groups)
+    slave_allocation = defaultdict(list)
+    start = time()
+    for slave in cycle(slaves):
+        if not pool:
+            break
+        dispatch_start = time()
+        previous_get(pool, provs, slave_allocation, slave)
+        stats.record(time() - dispatch_start)
+    return time() - start, stats
+
+
+def run_indexed(providers, groups, slaves):
+    stats = DispatchStats()
+    slave_allocation = defaultdict(list)
+    start = time()
+    index = ProviderGroupIndex(providers)
+    for group in groups:
+        index.add(group)
+    build_time = time() - start
+    for slave in cycle(slaves):
+        if not index:
+            break
+        dispatch_start = time()
+        indexed_get(index, slave_allocation, slave)
+        stats.record(time() - dispatch_start)
+    return time() - start, stats, build_time
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tests', type=int, default=20000, help='number of test ids')
+    parser.add_argument('--providers', type=int, default=30, help='number of providers')
+    parser.add_argument('--modules', type=int, default=40, help='number of test modules')
+    parser.add_argument('--params', type=int, default=1,
+        help='number of parametrizations per provider in each module')
+    parser.add_argument('--slaves', type=int, default=8, help='number of slaves')
+    parser.add_argument('--skip-previous', action='store_true',
+        help='only benchmark the indexed dispatch')
+    args = parser.parse_args()
+
+    providers, groups = synthetic_groups(args.tests, args.providers, args.modules, args.params)
+    slaves = ['slave{:02d}'.format(i) for i in range(args.slaves)]
+    print '{} tests in {} groups, {} providers, {} slaves'.format(
+        sum(map(len, groups)), len(groups), len(providers), len(slaves))
+
+    total, stats, build_time = run_indexed(providers, groups, slaves)
+    print 'indexed:  {:.3f}s total ({:.3f}s indexing), {}'.format(total, build_time, stats)
+    if not args.skip_previous:
+        total, stats = run_previous(providers, groups, slaves)
+        print 'previous: {:.3f}s total, {}'.format(total, stats)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python2
+"""Benchmark for running commands through :py:class:`utils.ssh.SSHClient`
+
+Runs the same short command many times against an ssh server (ex. a local sshd), with:
+
+* ``previous``: the implementation of ``run_command`` before it waited with select, which polled
+  the session in a busy loop
+* ``run_command``: one session per command, waiting for output with select
+* ``run_commands``: all the commands over a single session
+
+and reports the wall clock and the CPU time (of this process, including paramiko's transport
+thread) per command.
+"""
+import argparse
+import resource
+import sys
+import time
+
+from utils import ports
+from utils.ssh import SSHClient, SSHResult
+
+
+def previous_run_command(client, command):
+    session = client.get_transport().open_session()
+    session.exec_command('{}\n'.format(command))
+    stdout = session.makefile()
+    stderr = session.makefile_stderr()
+    output = ''
+    while True:
+        if session.recv_ready:
+            for line in stdout:
+                output += line
+        if session.recv_stderr_ready:
+            for line in stderr:
+                output += line
+        if session.exit_status_ready():
+            break
+    return SSHResult(session.recv_exit_status(), output)
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(run, number):
+    start, start_cpu = time.time(), cpu_time()
+    results = run()
+    wall, cpu = time.time() - start, cpu_time() - start_cpu
+    assert len(results) == number and all(result.rc == 0 for result in results), results
+    return wall / number * 1000, cpu / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hostname', default='127.0.0.1', help='ssh server to run commands on')
+    parser.add_argument('--port', type=int, default=22, help='port of the ssh server')
+    parser.add_argument('--username', help='defaults to the ssh credentials')
+    parser.add_argument('--password', help='defaults to the ssh credentials')
+    parser.add_argument('-n', '--number', type=int, default=100, help='number of commands to run')
+    parser.add_argument('--command', default='echo benchmark', help='command to run')
+    args = parser.parse_args()
+
+    ports.SSH = args.port
+    connect_kwargs = {'hostname': args.hostname, 'port': args.port}
+    if args.username:
+        connect_kwargs['username'] = args.username
+    if args.password:
+        connect_kwargs['password'] = args.password
+    client = SSHClient(**connect_kwargs)
+    client.connect()
+    commands = [args.command] * args.number
+
+    paths = [
+        ('previous', lambda: [previous_run_command(client, command) for command in commands]),
+        ('run_command', lambda: [client.run_command(command) for command in commands]),
+        ('run_commands', lambda: client.run_commands(commands)),
+    ]
+    print '{} x `{}` on {}:{}'.format(args.number, args.command, args.hostname, args.port)
+    print '{:<14} {:>14} {:>14}'.format('path', 'wall (ms/cmd)', 'cpu (ms/cmd)')
+    for name, run in paths:
+        wall, cpu = measure(run, args.number)
+        print '{:<14} {:>14.2f} {:>14.2f}'.format(name, wall, cpu)
+    client.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
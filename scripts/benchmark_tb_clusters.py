@@ -0,0 +1,145 @@
+#!/usr/bin/env python2
+"""Benchmark for the clustering of the tracebacks of failed tests, see :py:mod:`utils.tb_clusters`
+
+Generates a synthetic corpus of short tracebacks from a number of failure families. Tracebacks of
+one family differ in addresses, ids, timestamps and numbers, and some families also in a random
+name; the family sizes follow a Zipf distribution, and some families are variations of others.
+The corpus is clustered with both the previous implementation of the reporter's top 10, which
+compared every traceback to the first one of every cluster with ``difflib``, and
+:py:func:`utils.tb_clusters.cluster_tracebacks`, and for each of them the time, the number of
+clusters and the pairwise precision and recall of the clusters against the families are
+reported.
+"""
+import argparse
+import difflib
+import random
+import string
+import sys
+import time
+from collections import Counter
+
+from utils.tb_clusters import cluster_tracebacks
+
+EXCEPTIONS = [
+    'NoSuchElementException', 'TimedOutError', 'AssertionError', 'WebDriverException',
+    'StaleElementReferenceException', 'CandidateNotFound', 'KeyError', 'ValueError']
+WORDS = (
+    'unable locate element could not find provision vm instance template provider host cluster '
+    'datastore button link tab accordion tree node page form field input select option wait '
+    'appear disappear refresh status running stopped power state request approve deny queue '
+    'message timeout seconds minutes expected actual value the of to in on for with from by '
+    'service catalog item bundle dialog policy profile alert action condition tag category '
+    'user group role tenant quota report widget dashboard schedule task job event log ssh rest '
+    'api collection resource href id name type attribute action failed error invalid missing'
+).split()
+PLACEHOLDERS = ['{num}', '{addr}', '{uuid}', '{ts}', '{ip}', '{hex}', '{name}']
+
+
+def random_name(rng):
+    return 'test_{}'.format(''.join(rng.choice(string.ascii_letters) for _ in range(8)))
+
+
+def fill(template, rng):
+    return template.format(
+        num=rng.randint(0, 100000), addr=hex(rng.getrandbits(48)),
+        uuid='{:08x}-{:04x}-{:04x}-{:04x}-{:012x}'.format(
+            rng.getrandbits(32), rng.getrandbits(16), rng.getrandbits(16), rng.getrandbits(16),
+            rng.getrandbits(48)),
+        ts='2016-{:02d}-{:02d} {:02d}:{:02d}:{:02d}'.format(
+            rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23), rng.randint(0, 59),
+            rng.randint(0, 59)),
+        ip='10.{}.{}.{}'.format(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)),
+        hex='{:040x}'.format(rng.getrandbits(160)), name=random_name(rng))
+
+
+def families(count, rng):
+    """Returns the templates of the tracebacks of the failure families"""
+    templates = []
+    for _ in range(count):
+        if templates and rng.random() < .2:
+            # A different failure with the same exception, sharing half of the message
+            exception, words = rng.choice(templates)
+            words = list(words)
+            for i in rng.sample(range(len(words)), len(words) // 2):
+                words[i] = rng.choice(WORDS)
+        else:
+            exception = rng.choice(EXCEPTIONS)
+            words = [rng.choice(WORDS) for _ in range(rng.randint(6, 20))]
+            for placeholder in rng.sample(PLACEHOLDERS[:-1], rng.randint(1, 3)):
+                words.insert(rng.randint(0, len(words)), placeholder)
+            if rng.random() < .3:
+                words.insert(rng.randint(0, len(words)), '{name}')
+        templates.append((exception, tuple(words)))
+    return ['{}\n{}'.format(exc, ' '.join(message)) for exc, message in templates]
+
+
+def corpus(size, family_count, seed):
+    """Returns ``(traceback, family)`` entries"""
+    rng = random.Random(seed)
+    templates = families(family_count, rng)
+    weights = [1. / (rank + 1) ** 1.1 for rank in range(family_count)]
+    total = sum(weights)
+    entries = []
+    for _ in range(size):
+        point, family = rng.random() * total, 0
+        while point > weights[family] and family < family_count - 1:
+            point -= weights[family]
+            family += 1
+        entries.append((fill(templates[family], rng), family))
+    return entries
+
+
+def previous_clusters(tb_errors):
+    sets = []
+    for entry in tb_errors:
+        for tset in sets:
+            if difflib.SequenceMatcher(a=entry[0][:10], b=tset[0][0][:10]).ratio() > .8:
+                if difflib.SequenceMatcher(a=entry[0][:20], b=tset[0][0][:20]).ratio() > .75:
+                    if difflib.SequenceMatcher(a=entry[0][:30], b=tset[0][0][:30]).ratio() > .7:
+                        tset.append(entry)
+                        break
+        else:
+            sets.append([entry])
+
+    return sorted(sets, lambda p, q: cmp(len(p), len(q)), reverse=True)
+
+
+def pairs(count):
+    return count * (count - 1) // 2
+
+
+def pairwise_scores(clusters):
+    """Returns the precision and recall of the pairs of entries in the same cluster"""
+    same_cluster = sum(pairs(len(cluster)) for cluster in clusters)
+    same_family = sum(pairs(count) for count in Counter(
+        family for cluster in clusters for _, family in cluster).itervalues())
+    both = sum(
+        pairs(count) for cluster in clusters
+        for count in Counter(family for _, family in cluster).itervalues())
+    return (both / float(same_cluster) if same_cluster else 1.,
+            both / float(same_family) if same_family else 1.)
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--number', type=int, default=20000, help='number of tracebacks')
+    parser.add_argument('--families', type=int, default=300, help='number of failure families')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the corpus')
+    args = parser.parse_args()
+
+    entries = corpus(args.number, args.families, args.seed)
+    print '{} tracebacks of {} families'.format(len(entries), len(set(f for _, f in entries)))
+    print '{:<10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'clustering', 'time (s)', 'clusters', 'precision', 'recall')
+    for name, cluster in [('previous', previous_clusters), ('current', cluster_tracebacks)]:
+        start = time.time()
+        clusters = cluster(entries)
+        seconds = time.time() - start
+        print '{:<10} {:>10.2f} {:>10} {:>10.3f} {:>10.3f}'.format(
+            name, seconds, len(clusters), *pairwise_scores(clusters))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
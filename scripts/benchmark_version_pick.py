@@ -0,0 +1,122 @@
+#!/usr/bin/env python2
+"""Benchmark for :py:func:`utils.version.pick` over the versioned dicts in ``cfme/``
+
+Collects the literal dicts passed to ``pick``/``version.pick``/``deferred_verpick`` in the
+``cfme`` package, and picks from each of them for a few appliance versions with both the current
+(cached) ``pick`` and the previous implementation, which parsed every key and sorted the matching
+versions on every call. The results of both are compared before they're timed.
+"""
+import argparse
+import ast
+import sys
+import timeit
+
+from utils import version
+from utils.path import project_path
+from utils.version import LATEST, LOWEST, Version
+
+PICK_FUNCTIONS = {'pick', 'deferred_verpick'}
+VERSION_NAMES = {'LOWEST': LOWEST, 'LATEST': LATEST, 'UPSTREAM': LATEST}
+
+
+class PreviousVersion(Version):
+    """Version with the comparisons as they were before they skipped parsing Versions again"""
+    def __cmp__(self, other):
+        try:
+            other = PreviousVersion(other)
+        except:
+            raise ValueError('Cannot compare Version to {}'.format(type(other).__name__))
+
+        if self == other:
+            return 0
+        elif self == self.latest() or other == self.lowest():
+            return 1
+        elif self == self.lowest() or other == self.latest():
+            return -1
+        else:
+            return cmp(self.version, other.version)
+
+    def __eq__(self, other):
+        try:
+            return self.version == PreviousVersion(other).version
+        except:
+            return False
+
+
+def previous_get_version(obj):
+    if isinstance(obj, Version):
+        return PreviousVersion(obj)
+    if obj.startswith('master'):
+        return PreviousVersion.latest()
+    return PreviousVersion(obj)
+
+
+def previous_pick(v_dict):
+    v_dict = {previous_get_version(k): v for (k, v) in v_dict.items()}
+    versions = v_dict.keys()
+    current = PreviousVersion(version.current_version())
+    sorted_matching_versions = sorted(filter(lambda v: v <= current, versions),
+                                      reverse=True)
+    return v_dict.get(sorted_matching_versions[0]) if sorted_matching_versions else None
+
+
+def _dict_key(node):
+    if isinstance(node, ast.Str):
+        return node.s
+    name = node.attr if isinstance(node, ast.Attribute) else getattr(node, 'id', None)
+    if name in VERSION_NAMES:
+        return VERSION_NAMES[name]
+    raise ValueError('not a version')
+
+
+def versioned_dicts(package_path):
+    """Yields the literal versioned dicts in a package, with the values replaced by numbers"""
+    for source in package_path.visit('*.py'):
+        try:
+            tree = ast.parse(source.read(), source.strpath)
+        except SyntaxError:
+            continue
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call) or not node.args:
+                continue
+            func = node.func
+            name = func.attr if isinstance(func, ast.Attribute) else getattr(func, 'id', None)
+            if name not in PICK_FUNCTIONS or not isinstance(node.args[0], ast.Dict):
+                continue
+            try:
+                keys = map(_dict_key, node.args[0].keys)
+            except ValueError:
+                continue
+            if keys:
+                yield dict((key, i) for i, key in enumerate(keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--versions', nargs='+',
+        default=['5.3.4.2', '5.4.3.1', '5.5.0.13', 'master'], help='appliance versions to pick for')
+    parser.add_argument('-n', '--number', type=int, default=20,
+        help='number of times to pick from every dict, per version')
+    args = parser.parse_args()
+
+    dicts = list(versioned_dicts(project_path.join('cfme')))
+    print '{} versioned dicts, {} picks per version'.format(len(dicts), len(dicts) * args.number)
+    print '{:<10} {:>16} {:>16}'.format('version', 'previous (us)', 'current (us)')
+    for appliance_version in map(Version, args.versions):
+        version.current_version = lambda: appliance_version
+        for v_dict in dicts:
+            assert version.pick(v_dict) == previous_pick(v_dict), (appliance_version, v_dict)
+        timings = []
+        for pick in (previous_pick, version.pick):
+            def run():
+                for v_dict in dicts:
+                    pick(v_dict)
+            seconds = min(timeit.repeat(run, number=args.number, repeat=3))
+            timings.append(seconds / (len(dicts) * args.number) * 1e6)
+        print '{:<10} {:>16.2f} {:>16.2f}'.format(str(appliance_version), *timings)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,7 @@ from collections import defaultdict
 from jinja2 import Environment, FileSystemLoader
 from utils.path import template_path, log_path
 from utils.conf import jenkins
+from utils.tb_clusters import TracebackClusters
 
 
 @lru_cache()
@@ -19,6 +20,7 @@ template_env = Environment(
 )
 
 tests = defaultdict(dict)
+failures = TracebackClusters()
 
 runs = [(run['name'], run['ver']) for run in jenkins['runs']]
 
@@ -30,11 +32,15 @@ for run in runs:
         test_name = "{}/{}".format(case['className'], case['name'])
         tests[test_name][run[1]] = {'status': case['status'],
                                     'age': case['age']}
+        if case['status'] in {'FAILED', 'REGRESSION'}:
+            failures.add(case.get('errorDetails') or case.get('errorStackTrace') or '',
+                         (test_name, run[1]))
 
 test_index = sorted(tests)
 
 data = template_env.get_template('jenkins_report.html').render(tests=tests,
-                                                               runs=runs, test_index=test_index)
+                                                               runs=runs, test_index=test_index,
+                                                               failures=failures.top(20))
 
 f = open(log_path.strpath + '/jenkins.html', "w")
 f.write(data)
@@ -21,30 +21,46 @@ def json_response(data):
     return HttpResponse(json.dumps(data), content_type="application/json")
 
 
-def json_exception(e):
-    return json_response({
+def exception_data(e):
+    return {
         "status": "exception",
         "result": {
             "class": type(e).__name__,
             "message": str(e)
         }
-    })
+    }
 
 
-def json_autherror(message):
-    return json_response({
+def autherror_data(message):
+    return {
         "status": "autherror",
         "result": {
             "message": str(message)
         }
-    })
+    }
 
 
-def json_success(result):
-    return json_response({
+def success_data(result):
+    return {
         "status": "success",
         "result": result
-    })
+    }
+
+
+def json_exception(e):
+    return json_response(exception_data(e))
+
+
+def json_autherror(message):
+    return json_response(autherror_data(message))
+
+
+def json_success(result):
+    return json_response(success_data(result))
+
+
+class AuthError(Exception):
+    pass
 
 
 class JSONMethod(object):
@@ -86,6 +102,21 @@ class JSONMethod(object):
 
 
 class JSONApi(object):
+    """Dispatches the JSON API calls to the registered methods
+
+    Besides calling a single method, a request can call several methods at once by calling
+    ``batch`` with a list of calls, each of them a dict with ``method``, ``args`` and ``kwargs``.
+    The user is authenticated only once for the whole batch and the result is a list of the
+    results of the individual calls, each with its own status, in the order of the calls.
+    """
+    BATCH_DESCRIPTION = {
+        "name": "batch",
+        "args": ["calls"],
+        "defaults": {},
+        "docstring": "Calls several methods in one request, returns the list of their results.",
+        "needs_authentication": False,
+    }
+
     def __init__(self):
         self._methods = {}
 
@@ -98,18 +129,43 @@ class JSONApi(object):
     def doc(self, request):
         return render(request, 'appliances/apidoc.html', {})
 
-    def __call__(self, request):
-        if request.method != 'POST':
-            return json_success({
-                "available_methods": sorted(
-                    map(lambda m: m.description, self._methods.itervalues()),
-                    key=lambda m: m["name"]),
-            })
+    def authenticator(self, data):
+        """Returns a function that authenticates the user of the request, at most once
+
+        The function returns the :py:class:`User` or raises :py:class:`AuthError`.
+        """
+        authenticated = []
+
+        def authenticate(method_name):
+            if not authenticated:
+                if "auth" not in data:
+                    raise AuthError("Method {} needs authentication!".format(method_name))
+                username, password = data["auth"]
+                try:
+                    user = User.objects.get(username=username)
+                except ObjectDoesNotExist:
+                    user = AuthError("User {} does not exist!".format(username))
+                else:
+                    if not user.check_password(password):
+                        user = AuthError("Wrong password for user {}!".format(username))
+                authenticated.append(user)
+            user, = authenticated
+            if isinstance(user, AuthError):
+                raise user
+            return user
+        return authenticate
+
+    def call(self, method_name, args, kwargs, authenticate):
+        """Calls a method and returns the response data
+
+        Args:
+            method_name: Name of the method
+            args: Positional arguments of the method
+            kwargs: Keyword arguments of the method
+            authenticate: Function returned by :py:meth:`authenticator`
+        """
+        method = None
         try:
-            data = json.loads(request.body)
-            method_name = data["method"]
-            args = data["args"]
-            kwargs = data["kwargs"]
             try:
                 method = self._methods[method_name]
             except KeyError:
@@ -117,27 +173,62 @@ class JSONApi(object):
             create_logger(method).info(
                 "Calling with parameters {}{}".format(repr(tuple(args)), repr(kwargs)))
             if method.auth:
-                if "auth" in data:
-                    username, password = data["auth"]
-                    try:
-                        user = User.objects.get(username=username)
-                    except ObjectDoesNotExist:
-                        return json_autherror("User {} does not exist!".format(username))
-                    if not user.check_password(password):
-                        return json_autherror("Wrong password for user {}!".format(username))
-                    create_logger(method).info(
-                        "Called by user {}/{}".format(user.id, user.username))
-                    return json_success(method(user, *args, **kwargs))
-                else:
-                    return json_autherror("Method {} needs authentication!".format(method_name))
+                user = authenticate(method_name)
+                create_logger(method).info(
+                    "Called by user {}/{}".format(user.id, user.username))
+                result = method(user, *args, **kwargs)
             else:
-                return json_success(method(*args, **kwargs))
+                result = method(*args, **kwargs)
+            create_logger(method).info("Call finished")
+            return success_data(result)
+        except AuthError as e:
+            return autherror_data(e)
         except Exception as e:
-            create_logger(method).error(
+            create_logger(method if method is not None else self).error(
+                "Exception raised during call: {}: {}".format(type(e).__name__, str(e)))
+            return exception_data(e)
+
+    def batch(self, calls, authenticate):
+        """Calls the methods of a batch and returns the list of the response data
+
+        A call of an unknown method, or of ``batch`` itself, gets an exception status like any
+        other failing call, without stopping the rest of the batch.
+        """
+        if not isinstance(calls, list):
+            raise TypeError("batch expects a list of calls")
+        create_logger(self).info("Calling a batch of {} methods".format(len(calls)))
+        results = []
+        for call in calls:
+            if call.get("method") == "batch":
+                results.append(exception_data(NameError("Batches can't be nested!")))
+            else:
+                results.append(self.call(
+                    call.get("method"), call.get("args", []), call.get("kwargs", {}),
+                    authenticate))
+        create_logger(self).info("Batch finished")
+        return results
+
+    def __call__(self, request):
+        if request.method != 'POST':
+            methods = [m.description for m in self._methods.itervalues()]
+            methods.append(self.BATCH_DESCRIPTION)
+            return json_success({
+                "available_methods": sorted(methods, key=lambda m: m["name"]),
+            })
+        try:
+            data = json.loads(request.body)
+            method_name = data["method"]
+            args = data["args"]
+            kwargs = data["kwargs"]
+            authenticate = self.authenticator(data)
+            if method_name == "batch":
+                return json_success(self.batch(*args, authenticate=authenticate, **kwargs))
+            return json_response(self.call(method_name, args, kwargs, authenticate))
+        except Exception as e:
+            create_logger(self).error(
                 "Exception raised during call: {}: {}".format(type(e).__name__, str(e)))
             return json_exception(e)
-        else:
-            create_logger(method).info("Call finished")
+
 
 jsonapi = JSONApi()
 
@@ -158,11 +249,7 @@ def list_appliances(used=False):
         query = query.exclude(appliance_pool__owner=None)
     else:
         query = query.filter(appliance_pool__owner=None)
-    result = []
-    for appliance in query:
-        result.append(appliance.serialized)
-
-    return result
+    return Appliance.serialize_queryset(query)
 
 
 @jsonapi.method
@@ -228,11 +315,7 @@ def request_check(user, request_id):
         "preconfigured": request.preconfigured,
         "yum_update": request.yum_update,
         "progress": int(round(request.percent_finished * 100)),
-        "appliances": [
-            appliance.serialized
-            for appliance
-            in request.appliances
-        ],
+        "appliances": Appliance.serialize_queryset(request.appliances),
     }
 
 
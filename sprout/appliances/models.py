@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
+import time
 import yaml
 
 from celery import chain
 from contextlib import contextmanager
 from datetime import timedelta, date
+from threading import Lock
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models, transaction
+from django.db.models import Case, Count, When
 from django.utils import timezone
 
 from sprout import critical_section
@@ -37,6 +40,12 @@ User.has_quotas = property(has_quotas)
 User.is_a_bot = property(is_a_bot)
 
 
+# Management system clients by provider id, reused while they're younger than this (seconds)
+PROVIDER_API_MAX_AGE = 10 * 60
+_provider_apis = {}
+_provider_apis_lock = Lock()
+
+
 def apply_if_not_none(o, meth, *args, **kwargs):
     if o is None:
         return None
@@ -122,17 +131,63 @@ class Provider(MetadataMixin):
 
     @property
     def api(self):
-        return get_mgmt(self.id)
+        """Management system client of the provider
+
+        The client is kept for :py:data:`PROVIDER_API_MAX_AGE` seconds, so the tasks running in
+        the same worker reuse it and its connections. Use :py:meth:`forget_api` when it fails.
+        """
+        with _provider_apis_lock:
+            api, created = _provider_apis.get(self.id, (None, None))
+        if api is None or time.time() - created > PROVIDER_API_MAX_AGE:
+            api = get_mgmt(self.id)
+            with _provider_apis_lock:
+                _provider_apis[self.id] = api, time.time()
+        return api
+
+    def forget_api(self):
+        """Drops the cached client, the next use of :py:attr:`api` creates a new one"""
+        with _provider_apis_lock:
+            _provider_apis.pop(self.id, None)
+
+    @classmethod
+    def with_load(cls):
+        """Returns a queryset of providers with the counts their load is computed from
+
+        All the counts are annotated in one query, instead of counting them for every provider
+        when its load is needed. The load of the providers is a snapshot then, it doesn't change
+        when appliances or templates are added later.
+        """
+        appliance = "provider_templates__appliance"
+        return cls.objects.annotate(
+            load_managing=Count(appliance, distinct=True),
+            load_provisioning=Count(
+                Case(When(then=appliance, **{
+                    appliance + "__ready": False,
+                    appliance + "__marked_for_deletion": False,
+                    appliance + "__ip_address__isnull": True})),
+                distinct=True),
+            load_templates_preparing=Count(
+                Case(When(provider_templates__ready=False, then="provider_templates")),
+                distinct=True))
+
+    @classmethod
+    def load_snapshot(cls):
+        """Returns a dict of all providers by their id, see :py:meth:`with_load`"""
+        return {provider.id: provider for provider in cls.with_load()}
 
     @property
     def num_currently_provisioning(self):
-        return len(
-            Appliance.objects.filter(
-                ready=False, marked_for_deletion=False, template__provider=self, ip_address=None))
+        if hasattr(self, "load_provisioning"):
+            return self.load_provisioning
+        return Appliance.objects.filter(
+            ready=False, marked_for_deletion=False, template__provider=self,
+            ip_address=None).count()
 
     @property
     def num_templates_preparing(self):
-        return len(Template.objects.filter(provider=self, ready=False))
+        if hasattr(self, "load_templates_preparing"):
+            return self.load_templates_preparing
+        return Template.objects.filter(provider=self, ready=False).count()
 
     @property
     def remaining_configuring_slots(self):
@@ -152,7 +207,9 @@ class Provider(MetadataMixin):
 
     @property
     def num_currently_managing(self):
-        return len(Appliance.objects.filter(template__provider=self))
+        if hasattr(self, "load_managing"):
+            return self.load_managing
+        return Appliance.objects.filter(template__provider=self).count()
 
     @property
     def currently_managed_appliances(self):
@@ -564,6 +621,14 @@ class Appliance(MetadataMixin):
         default=False,
         help_text="Whether the Direct LUN disk is connected. (RHEV Only)")
 
+    # Fields to fetch with values() to serialize appliances without loading the related objects
+    SERIALIZED_VALUES = (
+        "id", "ready", "name", "ip_address", "status", "power_state", "status_changed",
+        "datetime_leased", "leased_until", "marked_for_deletion", "uuid", "lun_disk_connected",
+        "template_id", "template__original_name", "template__provider_id", "template__version",
+        "template__date", "template__template_group_id", "template__name",
+        "template__preconfigured")
+
     @property
     def serialized(self):
         return dict(
@@ -578,17 +643,48 @@ class Appliance(MetadataMixin):
             leased_until=apply_if_not_none(self.leased_until, "isoformat"),
             template_name=self.template.original_name,
             template_id=self.template.id,
-            provider=self.template.provider.id,
+            provider=self.template.provider_id,
             marked_for_deletion=self.marked_for_deletion,
             uuid=self.uuid,
             template_version=self.template.version,
             template_build_date=self.template.date.isoformat(),
-            template_group=self.template.template_group.id,
+            template_group=self.template.template_group_id,
             template_sprout_name=self.template.name,
             preconfigured=self.preconfigured,
             lun_disk_connected=self.lun_disk_connected,
         )
 
+    @classmethod
+    def serialize_values(cls, values):
+        """Same as :py:attr:`serialized`, but from a dict of :py:attr:`SERIALIZED_VALUES`"""
+        return dict(
+            id=values["id"],
+            ready=values["ready"],
+            name=values["name"],
+            ip_address=values["ip_address"],
+            status=values["status"],
+            power_state=values["power_state"],
+            status_changed=apply_if_not_none(values["status_changed"], "isoformat"),
+            datetime_leased=apply_if_not_none(values["datetime_leased"], "isoformat"),
+            leased_until=apply_if_not_none(values["leased_until"], "isoformat"),
+            template_name=values["template__original_name"],
+            template_id=values["template_id"],
+            provider=values["template__provider_id"],
+            marked_for_deletion=values["marked_for_deletion"],
+            uuid=values["uuid"],
+            template_version=values["template__version"],
+            template_build_date=values["template__date"].isoformat(),
+            template_group=values["template__template_group_id"],
+            template_sprout_name=values["template__name"],
+            preconfigured=values["template__preconfigured"],
+            lun_disk_connected=values["lun_disk_connected"],
+        )
+
+    @classmethod
+    def serialize_queryset(cls, queryset):
+        """Serializes all the appliances of a queryset like :py:attr:`serialized`, in one query"""
+        return map(cls.serialize_values, queryset.values(*cls.SERIALIZED_VALUES))
+
     @property
     @contextmanager
     def kill_lock(self):
@@ -896,21 +992,31 @@ class AppliancePool(MetadataMixin):
             ready=True, exists=True, usable=True,
             **self.filter_params).all()
 
+    @property
+    def possible_templates_with_load(self):
+        """:py:attr:`possible_templates` with their providers from :py:meth:`Provider.with_load`"""
+        providers = Provider.load_snapshot()
+        templates = list(self.possible_templates)
+        for template in templates:
+            template.provider = providers[template.provider_id]
+        return templates
+
     @property
     def possible_provisioning_templates(self):
         return sorted(
-            filter(lambda tpl: tpl.provider.free, self.possible_templates),
+            filter(lambda tpl: tpl.provider.free, self.possible_templates_with_load),
             # Sort by date and load to pick the best match (least loaded provider)
             key=lambda tpl: (tpl.date, 1.0 - tpl.provider.appliance_load), reverse=True)
 
     @property
     def possible_providers(self):
         """Which providers contain a template that could be used for provisioning?."""
-        return set(tpl.provider for tpl in self.possible_templates)
+        return set(tpl.provider for tpl in self.possible_templates_with_load)
 
     @property
     def appliances(self):
-        return Appliance.objects.filter(appliance_pool=self).order_by("id").all()
+        return Appliance.objects.filter(appliance_pool=self).select_related(
+            "template", "template__provider").order_by("id").all()
 
     @property
     def current_count(self):
@@ -1029,7 +1135,7 @@ class AppliancePool(MetadataMixin):
     @property
     def num_possible_appliance_slots(self):
         providers = set([])
-        for template in self.possible_templates:
+        for template in self.possible_templates_with_load:
             providers.add(template.provider)
         slots = 0
         for provider in providers:
@@ -5,6 +5,7 @@ import fauxfactory
 import hashlib
 import random
 import re
+import time
 import command
 import yaml
 from django.core.cache import cache
@@ -14,6 +15,7 @@ from django.db import transaction
 from django.utils import timezone
 from celery import chain, chord, shared_task
 from celery.exceptions import MaxRetriesExceededError
+from collections import defaultdict
 from datetime import timedelta
 from functools import wraps
 from novaclient.exceptions import OverLimit as OSOverLimit
@@ -956,42 +958,72 @@ def refresh_appliances(self):
 def refresh_appliances_provider(self, provider_id):
     """Downloads the list of VMs from the provider, then matches them by name or UUID with
     appliances stored in database.
+
+    Only the changed fields of the changed appliances are written, in one transaction. Appliances
+    with the same changes (eg. orphaned ones) are updated together in a single query.
     """
     self.logger.info("Refreshing appliances in {}".format(provider_id))
+    start = time.time()
     provider = Provider.objects.get(id=provider_id)
     if not hasattr(provider.api, "all_vms"):
         # Ignore this provider
         return
-    vms = provider.api.all_vms()
+    try:
+        vms = provider.api.all_vms()
+    except Exception:
+        provider.forget_api()
+        raise
+    listed = time.time()
     dict_vms = {}
     uuid_vms = {}
     for vm in vms:
         dict_vms[vm.name] = vm
         if vm.uuid:
             uuid_vms[vm.uuid] = vm
-    for appliance in Appliance.objects.filter(template__provider=provider):
-        if appliance.uuid is not None and appliance.uuid in uuid_vms:
-            vm = uuid_vms[appliance.uuid]
+    now = timezone.now()
+    updates = defaultdict(list)
+    appliances = Appliance.objects.filter(template__provider=provider).values(
+        "id", "name", "uuid", "ip_address", "power_state")
+    for appliance in appliances:
+        if appliance["uuid"] is not None and appliance["uuid"] in uuid_vms:
+            vm = uuid_vms[appliance["uuid"]]
             # Using the UUID and change the name if it changed
-            appliance.name = vm.name
-            appliance.ip_address = vm.ip
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.power_state, Appliance.Power.UNKNOWN))
-            appliance.save()
-        elif appliance.name in dict_vms:
-            vm = dict_vms[appliance.name]
+            new_values = {
+                "name": vm.name,
+                "ip_address": vm.ip,
+                "power_state": Appliance.POWER_STATES_MAPPING.get(
+                    vm.power_state, Appliance.Power.UNKNOWN)}
+        elif appliance["name"] in dict_vms:
+            vm = dict_vms[appliance["name"]]
             # Using the name, and then retrieve uuid
-            appliance.uuid = vm.uuid
-            appliance.ip_address = vm.ip
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.power_state, Appliance.Power.UNKNOWN))
-            appliance.save()
-            self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
-                appliance.id, appliance.name, appliance.uuid))
+            new_values = {
+                "uuid": vm.uuid,
+                "ip_address": vm.ip,
+                "power_state": Appliance.POWER_STATES_MAPPING.get(
+                    vm.power_state, Appliance.Power.UNKNOWN)}
+            if vm.uuid != appliance["uuid"]:
+                self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
+                    appliance["id"], appliance["name"], vm.uuid))
         else:
             # Orphaned :(
-            appliance.set_power_state(Appliance.Power.ORPHANED)
-            appliance.save()
+            new_values = {"power_state": Appliance.Power.ORPHANED}
+        changes = {
+            key: value for key, value in new_values.iteritems() if appliance[key] != value}
+        if "power_state" in changes:
+            Appliance.class_logger(appliance["id"]).info(
+                "Changed power state to {}".format(changes["power_state"]))
+            changes["power_state_changed"] = now
+        if changes:
+            updates[tuple(sorted(changes.iteritems()))].append(appliance["id"])
+    if updates:
+        with transaction.atomic():
+            for changes, ids in updates.iteritems():
+                Appliance.objects.filter(id__in=ids).update(**dict(changes))
+    self.logger.info(
+        "Refreshed {} appliances in {} ({} changed, {} updates): "
+        "{:.1f}s listing {} VMs, {:.1f}s total".format(
+            len(appliances), provider_id, sum(map(len, updates.itervalues())), len(updates),
+            listed - start, len(vms), time.time() - start))
 
 
 @singleton_task()
@@ -1006,33 +1038,36 @@ def check_templates_in_provider(self, provider_id):
     self.logger.info("Initiated a periodic template check for {}".format(provider_id))
     provider = Provider.objects.get(id=provider_id)
     # Get templates and update metadata
+    start = time.time()
     try:
         templates = map(str, provider.api.list_template())
     except:
+        provider.forget_api()
         provider.working = False
         provider.save()
     else:
         provider.working = True
         provider.save()
-        with provider.edit_metadata as metadata:
-            metadata["templates"] = templates
+        if provider.templates != templates:
+            with provider.edit_metadata as metadata:
+                metadata["templates"] = templates
     if not provider.working:
         return
     # Check Sprout template existence
-    # expiration_time = (timezone.now() - timedelta(**settings.BROKEN_APPLIANCE_GRACE_TIME))
-    for template in Template.objects.filter(provider=provider):
+    existing_templates = set(templates)
+    updates = {True: [], False: []}
+    for id, name, exists in Template.objects.filter(provider=provider).values_list(
+            "id", "name", "exists"):
+        if (name in existing_templates) != exists:
+            updates[not exists].append(id)
+    if updates[True] or updates[False]:
         with transaction.atomic():
-            tpl = Template.objects.get(pk=template.pk)
-            exists = tpl.name in templates
-            tpl.exists = exists
-            tpl.save()
-        # if not exists:
-        #     if len(Appliance.objects.filter(template=template).all()) == 0\
-        #             and template.status_changed < expiration_time:
-        #         # No other appliance is made from this template so no need to keep it
-        #         with transaction.atomic():
-        #             tpl = Template.objects.get(pk=template.pk)
-        #             tpl.delete()
+            for exists, ids in updates.iteritems():
+                if ids:
+                    Template.objects.filter(id__in=ids).update(exists=exists)
+    self.logger.info(
+        "Checked the templates in {} ({} now exist, {} don't): {:.1f}s".format(
+            provider_id, len(updates[True]), len(updates[False]), time.time() - start))
 
 
 @singleton_task()
@@ -1122,11 +1157,9 @@ def generic_shepherd(self, preconfigured):
                 **filter_keep).all())
         # If it can be deployed, it must exist
         possible_templates_for_provision = filter(lambda tpl: tpl.exists, possible_templates)
-        appliances = []
-        for template in possible_templates:
-            appliances.extend(
-                Appliance.objects.filter(
-                    template=template, appliance_pool=None, marked_for_deletion=False))
+        appliances = list(
+            Appliance.objects.filter(
+                template__in=possible_templates, appliance_pool=None, marked_for_deletion=False))
         # If we then want to delete some templates, better kill the eldest. status_changed
         # says which one was provisioned when, because nothing else then touches that field.
         appliances.sort(key=lambda appliance: appliance.status_changed)
@@ -1136,17 +1169,19 @@ def generic_shepherd(self, preconfigured):
             # Provision ONE appliance at time for each group, that way it is possible to maintain
             # reasonable balancing
             new_appliance_name = settings.APPLIANCE_FORMAT.format(
-                group=template.template_group.id,
-                date=template.date.strftime("%y%m%d"),
+                group=grp.id,
+                date=possible_templates[-1].date.strftime("%y%m%d"),
                 rnd=fauxfactory.gen_alphanumeric(8))
             with transaction.atomic():
                 # Now look for templates that are on non-busy providers
+                providers = Provider.load_snapshot()
                 tpl_free = filter(
-                    lambda t: t.provider.free,
+                    lambda t: providers[t.provider_id].free,
                     possible_templates_for_provision)
                 if tpl_free:
                     appliance = Appliance(
-                        template=sorted(tpl_free, key=lambda t: t.provider.appliance_load)[0],
+                        template=sorted(
+                            tpl_free, key=lambda t: providers[t.provider_id].appliance_load)[0],
                         name=new_appliance_name)
                     appliance.save()
             if tpl_free:
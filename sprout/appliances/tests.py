@@ -1,4 +1,219 @@
 # -*- coding: utf-8 -*-
-# from django.test import TestCase
+import json
+import time
+from datetime import date
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+
+from appliances import models
+from appliances.api import JSONApi, jsonapi
+from appliances.models import Appliance, AppliancePool, Group, Provider, Template
+from appliances.tasks import refresh_appliances_provider
+
+
+class ApplianceSerializationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("sprout-test", password="sprout-test")
+        self.group = Group.objects.create(id="downstream-55z")
+        self.pool = AppliancePool.objects.create(
+            total_count=0, group=self.group, owner=self.user)
+        self.templates = []
+        for i in range(3):
+            provider = Provider.objects.create(id="provider{}".format(i))
+            self.templates.append(Template.objects.create(
+                provider=provider, template_group=self.group, version="5.5.0.{}".format(i),
+                date=date(2016, 1, i + 1), original_name="cfme-55{}".format(i),
+                name="sprout-cfme-55{}".format(i), preconfigured=bool(i % 2)))
+
+    def call(self, method_name, *args):
+        response = jsonapi.call(method_name, args, {}, lambda method_name: self.user)
+        self.assertEqual(response["status"], "success", response["result"])
+        return response["result"]
+
+    def create_appliances(self, count, pool=None):
+        for i in range(count):
+            Appliance.objects.create(
+                template=self.templates[i % len(self.templates)], appliance_pool=pool,
+                name="appliance{}".format(Appliance.objects.count()),
+                ip_address="10.0.0.{}".format(i))
+
+    def test_serialize_queryset_matches_serialized(self):
+        self.create_appliances(5, pool=self.pool)
+        appliances = Appliance.objects.order_by("id")
+        self.assertEqual(
+            Appliance.serialize_queryset(appliances), [a.serialized for a in appliances])
+
+    def test_list_appliances_query_count(self):
+        self.create_appliances(2)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.call("list_appliances")), 2)
+        self.create_appliances(10)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.call("list_appliances")), 12)
+
+    def test_request_check_query_count(self):
+        self.create_appliances(2, pool=self.pool)
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.call("request_check", self.pool.id)["appliances"]), 2)
+        self.create_appliances(10, pool=self.pool)
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.call("request_check", self.pool.id)["appliances"]), 12)
+
+
+class BatchTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_user("sprout-test", password="sprout-test")
+        self.api = JSONApi()
+
+        @self.api.method
+        def add(a, b):
+            return a + b
+
+        @self.api.authenticated_method
+        def whoami(user, suffix=""):
+            return user.username + suffix
+
+        @self.api.authenticated_method
+        def fail(user):
+            raise ValueError("failed on purpose")
+
+    def post(self, calls, password="sprout-test"):
+        request = RequestFactory().post(
+            "/appliances/api", json.dumps({
+                "method": "batch", "args": [calls], "kwargs": {},
+                "auth": ["sprout-test", password]}),
+            content_type="application/json")
+        response = json.loads(self.api(request).content)
+        self.assertEqual(response["status"], "success", response["result"])
+        return response["result"]
+
+    def test_user_looked_up_once(self):
+        calls = [{"method": "whoami", "args": [], "kwargs": {"suffix": str(i)}} for i in range(5)]
+        with self.assertNumQueries(1):
+            results = self.post(calls)
+        self.assertEqual(
+            results, [{"status": "success", "result": "sprout-test{}".format(i)} for i in range(5)])
+
+    def test_statuses(self):
+        results = self.post([
+            {"method": "add", "args": [1, 2]},
+            {"method": "whoami"},
+            {"method": "fail"},
+            {"method": "missing"},
+            {"method": "batch", "args": [[{"method": "add", "args": [1, 2]}]]},
+            {"method": "add", "args": [3, 4]}])
+        self.assertEqual([result["status"] for result in results], [
+            "success", "success", "exception", "exception", "exception", "success"])
+        self.assertEqual(results[0]["result"], 3)
+        self.assertEqual(results[2]["result"]["class"], "ValueError")
+        self.assertEqual(results[3]["result"]["class"], "NameError")
+        self.assertEqual(results[4]["result"]["class"], "NameError")
+        self.assertEqual(results[5]["result"], 7)
+
+    def test_autherror(self):
+        with self.assertNumQueries(1):
+            results = self.post([
+                {"method": "whoami"}, {"method": "add", "args": [1, 2]}, {"method": "whoami"}],
+                password="wrong")
+        self.assertEqual(
+            [result["status"] for result in results], ["autherror", "success", "autherror"])
+
+
+class ProviderLoadTestCase(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(id="downstream-55z")
+        self.providers = [
+            Provider.objects.create(
+                id="provider{}".format(i), working=True, appliance_limit=[None, 10, 20][i])
+            for i in range(3)]
+        for i, provider in enumerate(self.providers):
+            for j in range(i + 1):
+                template = Template.objects.create(
+                    provider=provider, template_group=self.group, version="5.5.0.{}".format(j),
+                    date=date(2016, 1, j + 1), original_name="cfme-55{}".format(j),
+                    name="sprout-cfme-55{}-{}".format(i, j), ready=j > 0, exists=True,
+                    usable=True)
+                for k in range(2 * i + j):
+                    Appliance.objects.create(
+                        template=template, name="appliance{}-{}-{}".format(i, j, k),
+                        ip_address="10.0.0.{}".format(k) if k % 2 else None, ready=k % 3 == 0)
+
+    def test_load_snapshot_matches_counts(self):
+        with self.assertNumQueries(1):
+            snapshot = Provider.load_snapshot()
+        self.assertEqual(sorted(snapshot), [provider.id for provider in self.providers])
+        for provider in self.providers:
+            loaded = snapshot[provider.id]
+            for attr in [
+                    "num_currently_provisioning", "num_templates_preparing",
+                    "num_currently_managing", "remaining_provisioning_slots",
+                    "remaining_appliance_slots", "remaining_configuring_slots", "free",
+                    "appliance_load", "provisioning_load", "load"]:
+                self.assertEqual(getattr(loaded, attr), getattr(provider, attr), attr)
+
+    def test_possible_provisioning_templates_query_count(self):
+        user = User.objects.create_user("sprout-test", password="sprout-test")
+        pool = AppliancePool.objects.create(
+            total_count=1, group=self.group, owner=user, version="5.5.0.1")
+        with self.assertNumQueries(2):
+            templates = pool.possible_provisioning_templates
+            # provider2 has all of its provisioning slots taken
+            self.assertEqual(
+                [template.provider.id for template in templates], ["provider1"])
+
+
+class FakeVM(object):
+    def __init__(self, name, uuid, ip, power_state):
+        self.name = name
+        self.uuid = uuid
+        self.ip = ip
+        self.power_state = power_state
+
+
+class FakeProviderApi(object):
+    def __init__(self, vms):
+        self.vms = vms
+
+    def all_vms(self):
+        return self.vms
+
+
+class RefreshAppliancesTestCase(TestCase):
+    def setUp(self):
+        self.provider = Provider.objects.create(id="provider0", working=True)
+        template = Template.objects.create(
+            provider=self.provider, template_group=Group.objects.create(id="downstream-55z"),
+            version="5.5.0.1", date=date(2016, 1, 1), original_name="cfme-551",
+            name="sprout-cfme-551")
+        self.appliances = [
+            Appliance.objects.create(template=template, name="appliance{}".format(i))
+            for i in range(20)]
+        self.vms = [
+            FakeVM("appliance{}".format(i), "uuid-{}".format(i), "10.0.0.{}".format(i), "up")
+            for i in range(10)]
+        models._provider_apis[self.provider.id] = FakeProviderApi(self.vms), time.time()
+        self.addCleanup(self.provider.forget_api)
+
+    def test_refresh(self):
+        refresh_appliances_provider(self.provider.id)
+        appliances = Appliance.objects.order_by("id")
+        for appliance, vm in zip(appliances, self.vms):
+            self.assertEqual(appliance.uuid, vm.uuid)
+            self.assertEqual(appliance.ip_address, vm.ip)
+            self.assertEqual(appliance.power_state, Appliance.Power.ON)
+        for appliance in appliances[len(self.vms):]:
+            self.assertEqual(appliance.power_state, Appliance.Power.ORPHANED)
+
+        self.vms[0].name = "appliance0-renamed"
+        self.vms[1].power_state = "down"
+        refresh_appliances_provider(self.provider.id)
+        self.assertEqual(Appliance.objects.get(id=self.appliances[0].id).name, self.vms[0].name)
+        self.assertEqual(
+            Appliance.objects.get(id=self.appliances[1].id).power_state, Appliance.Power.OFF)
+
+    def test_refresh_updates_only_changes(self):
+        refresh_appliances_provider(self.provider.id)
+        # Getting the provider and its appliances, nothing to update
+        with self.assertNumQueries(2):
+            refresh_appliances_provider(self.provider.id)
@@ -54,7 +54,7 @@ def providers(request, provider_id=None):
         except ObjectDoesNotExist:
             messages.warning(request, "Provider '{}' does not exist.".format(provider_id))
             return redirect("providers")
-    providers = Provider.objects.order_by("id")
+    providers = Provider.with_load().order_by("id")
     complete_usage = Provider.complete_user_usage()
     return render(request, 'appliances/providers.html', locals())
 
@@ -223,7 +223,7 @@ def providers_for_date_group_and_version(request):
                 filters["date"] = parser.parse(date)
             providers = Template.objects.filter(**filters).values("provider").distinct()
             providers = sorted([p.values()[0] for p in providers])
-            providers = [Provider.objects.get(id=provider) for provider in providers]
+            providers = list(Provider.with_load().filter(id__in=providers).order_by("id"))
             for provider in providers:
                 appl_filter = dict(
                     appliance_pool=None, ready=True, template__provider=provider,
@@ -234,7 +234,7 @@ def providers_for_date_group_and_version(request):
 
                 if "version" in filters:
                     appl_filter["template__version"] = filters["version"]
-                shepherd_appliances[provider.id] = len(Appliance.objects.filter(**appl_filter))
+                shepherd_appliances[provider.id] = Appliance.objects.filter(**appl_filter).count()
                 total_shepherd_slots += shepherd_appliances[provider.id]
                 total_appliance_slots += provider.remaining_appliance_slots
                 total_provisioning_slots += provider.remaining_provisioning_slots
@@ -263,6 +263,7 @@ def my_appliances(request, show_user="my"):
         pools = AppliancePool.objects.order_by("id")
     else:
         pools = AppliancePool.objects.filter(owner__username=show_user).order_by("id")
+    pools = pools.select_related("group", "owner")
     groups = Group.objects.order_by("id")
     can_order_pool = show_user == "my"
     new_pool_possible = True
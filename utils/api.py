@@ -7,6 +7,10 @@ import re
 import requests
 import simplejson
 from copy import copy
+from multiprocessing.pool import ThreadPool
+from requests.adapters import HTTPAdapter
+from threading import Lock
+from time import time
 from fixtures.pytest_store import store
 from utils.log import logger
 from utils.version import Version
@@ -18,7 +22,28 @@ class APIException(Exception):
 
 
 class API(object):
-    def __init__(self, entry_point, auth):
+    """REST API client
+
+    All requests are made through one keep-alive, connection-pooled :py:class:`requests.Session`
+    which is shared by every :py:class:`Collection` and :py:class:`Entity` derived from this
+    object, and by the objects returned from :py:meth:`api_version`.
+
+    Args:
+        entry_point: URL of the API entry point
+        auth: ``(user, password)`` tuple or a dict with ``user`` and ``password`` keys
+        pool_size: Maximum number of connections kept open to the appliance
+        max_retries: How many times to retry a request that failed to connect
+        session: Session to use instead of creating a new one
+        cache_ttl: How long, in seconds, fetched entity data may be reused, see
+            :py:class:`EntityCache`. Entities aren't cached by default.
+        cache: Entity cache to use instead of creating a new one
+    """
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_MAX_RETRIES = 3
+    DEFAULT_CACHE_TTL = 0
+
+    def __init__(self, entry_point, auth, pool_size=None, max_retries=None, session=None,
+            cache_ttl=None, cache=None):
         self._entry_point = entry_point
         if isinstance(auth, dict):
             self._auth = (auth["user"], auth["password"])
@@ -26,8 +51,34 @@ class API(object):
             self._auth = tuple(auth[:2])
         else:
             raise ValueError("Unknown values provider for auth")
+        if session is None:
+            session = self._create_session(
+                pool_size or self.DEFAULT_POOL_SIZE,
+                self.DEFAULT_MAX_RETRIES if max_retries is None else max_retries)
+        self._session = session
+        if cache is None:
+            cache = EntityCache(self.DEFAULT_CACHE_TTL if cache_ttl is None else cache_ttl)
+        self._cache = cache
         self._load_data()
 
+    @staticmethod
+    def _create_session(pool_size, max_retries):
+        session = requests.Session()
+        session.verify = False
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @property
+    def session(self):
+        return self._session
+
+    @property
+    def cache(self):
+        return self._cache
+
     def _load_data(self):
         data = self.get(self._entry_point)
         self.collections = CollectionsIndex(self, data.pop("collections", []))
@@ -55,7 +106,7 @@ class API(object):
 
     def get(self, url, **get_params):
         logger.info("[RESTAPI] GET {} {}".format(url, repr(get_params)))
-        data = requests.get(url, auth=self._auth, params=get_params, verify=False)
+        data = self._session.get(url, auth=self._auth, params=get_params)
         try:
             data = data.json()
         except simplejson.scanner.JSONDecodeError:
@@ -64,7 +115,8 @@ class API(object):
 
     def post(self, url, **payload):
         logger.info("[RESTAPI] POST {} {}".format(url, repr(payload)))
-        data = requests.post(url, auth=self._auth, data=json.dumps(payload), verify=False)
+        self._cache.clear()
+        data = self._session.post(url, auth=self._auth, data=json.dumps(payload))
         logger.info("[RESTAPI] RESPONSE {}".format(data))
         try:
             data = data.json()
@@ -77,7 +129,8 @@ class API(object):
 
     def delete(self, url, **payload):
         logger.info("[RESTAPI] DELETE {} {}".format(url, repr(payload)))
-        data = requests.delete(url, auth=self._auth, data=json.dumps(payload), verify=False)
+        self._cache.clear()
+        data = self._session.delete(url, auth=self._auth, data=json.dumps(payload))
         logger.info("[RESTAPI] RESPONSE {}".format(data))
         try:
             data = data.json()
@@ -100,7 +153,8 @@ class API(object):
         return entity
 
     def api_version(self, version):
-        return type(self)(self._versions[version], self._auth)
+        return type(self)(
+            self._versions[version], self._auth, session=self._session, cache=self._cache)
 
     @property
     def versions(self):
@@ -120,6 +174,46 @@ class API(object):
         return self.version == self.latest_version
 
 
+class EntityCache(object):
+    """Time-limited cache of entity data, keyed by href
+
+    Filled by every GET of an entity and by :py:meth:`Collection.prefetch`, and read by
+    the entity loads that don't need fresh data (e.g. indexing a collection or looking up
+    a missing attribute). Search results are always loaded fresh, as they are what waiting for
+    an entity's state polls. Any POST or DELETE through the API clears the whole cache, since
+    actions can change entities other than the ones they were called on. A ``ttl`` of 0 disables
+    the cache.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, href):
+        with self._lock:
+            try:
+                stored, data = self._entries[href]
+            except KeyError:
+                return None
+            if time() - stored > self.ttl:
+                del self._entries[href]
+                return None
+        return copy(data)
+
+    def put(self, href, data):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[href] = (time(), copy(data))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class CollectionsIndex(object):
     def __init__(self, api, data):
         self._api = api
@@ -177,6 +271,11 @@ class SearchResult(object):
 
 
 class Collection(object):
+    #: Number of entities requested per page by :py:meth:`prefetch`
+    PREFETCH_PAGE_SIZE = 500
+    #: Number of parallel GETs :py:meth:`prefetch` makes when ``expand`` is not available
+    PREFETCH_WORKERS = 8
+
     def __init__(self, api, href, name, description=None):
         self._api = api
         self._href = href
@@ -203,6 +302,66 @@ class Collection(object):
         self._actions = self._data.pop("actions", [])
         if self._data["name"] != self.name:
             raise ValueError("Name mishap!")
+        self._cache_resources(self._resources)
+
+    def _cache_resources(self, resources):
+        for resource in resources:
+            if "id" in resource and isinstance(resource.get("href"), basestring):
+                self._api.cache.put(resource["href"], resource)
+
+    def prefetch(self, attributes=None, page_size=None, workers=None):
+        """Load every entity of the collection in as few requests as possible
+
+        The entities are requested with ``expand=resources`` page by page. If the collection
+        can't be expanded, the resource hrefs are listed and the entities are fetched with up to
+        ``workers`` parallel GETs instead. Fetched data is stored in the API's
+        :py:class:`EntityCache`, so subsequent loads of these entities don't hit the appliance.
+
+        Args:
+            attributes: Additional attributes to load for each entity
+            page_size: Number of entities requested per page
+            workers: Number of parallel GETs when ``expand`` is not available
+
+        Returns: A list of fully loaded :py:class:`Entity` objects
+        """
+        if isinstance(attributes, basestring):
+            attributes = [attributes]
+        try:
+            resources = self._prefetch_expanded(attributes, page_size or self.PREFETCH_PAGE_SIZE)
+        except APIException as e:
+            logger.info("[RESTAPI] Could not expand {}, fetching in parallel: {}".format(
+                self.name, str(e)))
+            resources = self._prefetch_parallel(attributes, workers or self.PREFETCH_WORKERS)
+        self._cache_resources(resources)
+        return [Entity(self, resource) for resource in resources]
+
+    def _prefetch_expanded(self, attributes, page_size):
+        kwargs = {"expand": "resources"}
+        if attributes:
+            kwargs["attributes"] = ",".join(attributes)
+        resources = []
+        while True:
+            data = self._api.get(self._href, offset=len(resources), limit=page_size, **kwargs)
+            page = data["resources"]
+            if any("id" not in resource for resource in page):
+                raise APIException("Collection {} did not expand resources".format(self.name))
+            resources.extend(page)
+            # Older APIs ignore offset and limit and return everything at once
+            if not page or len(resources) >= data["subcount"]:
+                return resources
+
+    def _prefetch_parallel(self, attributes, workers):
+        self.reload()
+        kwargs = {}
+        if attributes:
+            kwargs["attributes"] = ",".join(attributes)
+        hrefs = [resource["href"] for resource in self._resources]
+        pool = ThreadPool(max(1, min(workers, len(hrefs))))
+        try:
+            return pool.map(lambda href: self._api.get(href, **kwargs), hrefs)
+        finally:
+            pool.close()
+            pool.join()
 
     def reload_if_needed(self):
         if self._data is None:
@@ -274,7 +433,7 @@ class Collection(object):
     def __getitem__(self, position):
         self.reload_if_needed()
         entity = Entity(self, self._resources[position])
-        entity.reload()
+        entity.reload(cached=True)
         return entity
 
     def __len__(self):
@@ -331,7 +490,16 @@ class Entity(object):
         else:  # Malformed
             raise ValueError("Malformed data: {}".format(repr(self._data)))
 
-    def reload(self, expand=None, get=True, attributes=None):
+    def reload(self, expand=None, get=True, attributes=None, cached=False):
+        """(Re)load the entity data from the appliance
+
+        Args:
+            expand: Subcollections to expand
+            get: If False, only process the data the entity already has
+            attributes: Additional attributes to load
+            cached: Reuse data from the API's :py:class:`EntityCache` if it has any for this
+                entity. Only used when neither ``expand`` nor ``attributes`` are passed.
+        """
         kwargs = {}
         if expand:
             if isinstance(expand, (list, tuple)):
@@ -342,7 +510,12 @@ class Entity(object):
                 attributes = [attributes]
             kwargs.update(attributes=",".join(attributes))
         if get:
-            new = self.collection._api.get(self._href, **kwargs)
+            api = self.collection._api
+            new = api.cache.get(self._href) if cached and not kwargs else None
+            if new is None:
+                new = api.get(self._href, **kwargs)
+                if isinstance(new, dict) and "id" in new:
+                    api.cache.put(self._href, new)
             if self._data is None:
                 self._data = new
             else:
@@ -405,6 +578,11 @@ class Entity(object):
             self._incomplete = False
 
     def __getattr__(self, attr):
+        if self.collection._api.cache.get(self._href) is not None:
+            self.reload(cached=True)
+            if attr in self.__dict__:
+                # It got loaded from the cache
+                return self.__dict__[attr]
         self.reload()
         if attr in self.__dict__:
             # It got loaded
@@ -2,6 +2,7 @@
 import atexit
 import fauxfactory
 import hashlib
+import json
 import os
 import random
 import re
@@ -10,9 +11,9 @@ import socket
 import subprocess
 import yaml
 from datetime import datetime
-from tempfile import mkdtemp
+from tempfile import NamedTemporaryFile, mkdtemp
 from textwrap import dedent
-from time import sleep
+from time import sleep, time
 from urlparse import ParseResult, urlparse
 
 import dateutil.parser
@@ -27,10 +28,11 @@ from utils import api, conf, datafile, db, lazycache, trackerbot, db_queries, ss
 from utils.log import logger, create_sublogger, logger_wrap
 from utils.mgmt_system import RHEVMSystem, VMWareSystem
 from utils.net import net_check, resolve_hostname
-from utils.path import data_path, scripts_path
+from utils.path import data_path, log_path, scripts_path
 from utils.providers import get_mgmt, get_crud
 from utils.version import Version, get_stream, pick, LATEST
 from utils.signals import fire
+from utils.timeutil import parsetime
 from utils.wait import wait_for
 
 RUNNING_UNDER_SPROUT = os.environ.get("RUNNING_UNDER_SPROUT", "false") != "false"
@@ -46,6 +48,118 @@ class ApplianceException(Exception):
     pass
 
 
+class ApplianceFacts(object):
+    """Facts about an appliance that only change when it's rebooted, updated or reconfigured
+
+    The facts found over SSH (version, build, ...) are all collected by one command, the first time
+    any of them is needed; other facts (ex. from the database) are collected one at a time.
+    They are kept in a json file per appliance address, which other processes (ex. parallelizer
+    slaves) read instead of asking the appliance again, until the file is older than the ttl or
+    the facts are invalidated (see :py:meth:`IPAppliance.invalidate_facts`).
+
+    Args:
+        appliance: The :py:class:`IPAppliance` the facts are about
+        ttl: Seconds the facts file is used for, defaults to ``appliance_facts.ttl`` in the env
+            conf, or 1800
+        persist: If ``False``, the facts are only kept in memory (ex. in sprout, where the same
+            address is used for many appliances)
+
+    """
+    probe_command = (
+        'cd /var/www/miq/vmdb; '
+        'test -f VERSION && echo "version=$(cat VERSION)" && '
+        'echo "build_mtime=$(stat --printf=%Y VERSION)"; '
+        'test -f BUILD && echo "build=$(cat BUILD)"; '
+        'test -f GUID && echo "guid=$(cat GUID)"; '
+        'test -f /etc/redhat-release && '
+        "echo \"os_version=$(sed 's/.* release \\(.*\\) (.*/\\1/' /etc/redhat-release)\"; "
+        'true')
+
+    def __init__(self, appliance, ttl=None, persist=True):
+        self.appliance = appliance
+        if ttl is None:
+            ttl = conf.env.get('appliance_facts', {}).get('ttl', 1800)
+        self.ttl = ttl
+        self.persist = persist
+        self.path = log_path.join('appliance_facts', '{}.json'.format(appliance.address))
+        self._facts = None
+
+    def get(self, name, collect):
+        """Returns a fact, collecting it with ``collect`` if it isn't known
+
+        ``None`` is never kept, so it is collected again the next time.
+        """
+        facts = self._load()
+        if name not in facts:
+            value = collect()
+            if value is None:
+                return None
+            facts[name] = value
+            self._save(facts)
+        return facts[name]
+
+    def ssh_fact(self, name):
+        """Returns one of the facts found over SSH, or ``None`` if the appliance didn't have it"""
+        return self.get('ssh', self._probe).get(name)
+
+    def forget(self, name):
+        """Forgets a fact, so it is collected again the next time it is needed"""
+        facts = self._load()
+        if facts.pop(name, None) is not None:
+            self._save(facts, merge=False)
+
+    def invalidate(self):
+        """Forgets all of the facts"""
+        self._facts = {}
+        if self.persist and self.path.check():
+            self.path.remove()
+
+    def _probe(self):
+        res = self.appliance.ssh_client.run_command(self.probe_command)
+        if res.rc != 0:
+            raise RuntimeError('Unable to retrieve appliance facts: {}'.format(res.output))
+        facts = {}
+        for line in res.output.splitlines():
+            name, sep, value = line.partition('=')
+            if sep:
+                facts[name] = value
+        return facts
+
+    def _read(self):
+        if not self.persist or not self.path.check():
+            return {}
+        if time() - self.path.mtime() > self.ttl:
+            return {}
+        try:
+            with self.path.open() as f:
+                return json.load(f)
+        except ValueError:
+            # corrupted file, collect the facts again
+            return {}
+
+    def _load(self):
+        if self._facts is None:
+            self._facts = self._read()
+        return self._facts
+
+    def _save(self, facts, merge=True):
+        if not self.persist:
+            return
+        if merge:
+            # keep the facts that other processes collected in the meantime
+            facts.update((name, value) for name, value in self._read().iteritems()
+                if name not in facts)
+        self.path.dirpath().ensure(dir=True)
+        temp_file = NamedTemporaryFile(dir=self.path.dirname, suffix='.tmp', delete=False)
+        try:
+            with temp_file:
+                json.dump(facts, temp_file)
+            os.rename(temp_file.name, self.path.strpath)
+        except Exception:
+            os.unlink(temp_file.name)
+            raise
+
+
 class Appliance(object):
     """Appliance represents an already provisioned cfme appliance vm
 
@@ -456,6 +570,8 @@ class IPAppliance(object):
         """
 
         log_callback("Configuring appliance {}".format(self.address))
+        # a new appliance can have the address of an old one
+        self.invalidate_facts()
         with self as ipapp:
             ipapp.wait_for_ssh()
             configure_function = pick({
@@ -593,9 +709,13 @@ class IPAppliance(object):
 
     @lazycache
     def rest_api(self):
+        rest_conf = conf.env.get("rest_api", {})
         return api.API(
             "{}://{}:{}/api".format(self.scheme, self.address, self.ui_port),
-            auth=("admin", "smartvm"))
+            auth=("admin", "smartvm"),
+            pool_size=rest_conf.get("pool_size"),
+            max_retries=rest_conf.get("max_retries"),
+            cache_ttl=rest_conf.get("cache_ttl"))
 
     @lazycache
     def address(self):
@@ -632,32 +752,38 @@ class IPAppliance(object):
     def url(self):
         return "{}://{}/".format(self.scheme, self.address)
 
+    @lazycache
+    def facts(self):
+        """The :py:class:`ApplianceFacts` of this appliance"""
+        return ApplianceFacts(self, persist=not RUNNING_UNDER_SPROUT)
+
+    def invalidate_facts(self):
+        """Forgets the facts about this appliance, ex. after it was rebooted or updated"""
+        self.facts.invalidate()
+        for name in ('version', 'build', 'os_version', 'build_datetime', 'build_date',
+                'is_downstream', 'guid'):
+            delattr(self, name)
+
     @lazycache
     def version(self):
-        res = self.ssh_client.run_command('cat /var/www/miq/vmdb/VERSION')
-        if res.rc != 0:
+        version = self.facts.ssh_fact('version')
+        if version is None:
             raise RuntimeError('Unable to retrieve appliance VMDB version')
-        return Version(res.output)
+        return Version(version)
 
     @lazycache
     def build(self):
-        if self.ssh_client.is_appliance_downstream():
-            res = self.ssh_client.run_command('cat /var/www/miq/vmdb/BUILD')
-            if res.rc != 0:
-                raise RuntimeError('Unable to retrieve appliance VMDB version')
-            return res.output.strip("\n")
-        else:
-            return "master"
+        # Only downstream appliances have a BUILD file
+        return self.facts.ssh_fact('build') or "master"
 
     @lazycache
     def os_version(self):
         # Currently parses the os version out of redhat release file to allow for
         # rhel and centos appliances
-        res = self.ssh_client.run_command(
-            r"cat /etc/redhat-release | sed 's/.* release \(.*\) (.*/\1/' #)")
-        if res.rc != 0:
+        os_version = self.facts.ssh_fact('os_version')
+        if os_version is None:
             raise RuntimeError('Unable to retrieve appliance OS version')
-        return Version(res.output)
+        return Version(os_version)
 
     @lazycache
     def log(self):
@@ -1134,6 +1260,8 @@ class IPAppliance(object):
 
         if reboot:
             self.reboot(wait_for_web_ui=False, log_callback=log_callback)
+        else:
+            self.invalidate_facts()
 
         return result
 
@@ -1473,6 +1601,7 @@ class IPAppliance(object):
 
         wait_for(lambda: client.uptime() < old_uptime, handle_exception=True,
             num_sec=600, message='appliance to reboot', delay=10)
+        self.invalidate_facts()
 
         if wait_for_web_ui:
             self.wait_for_web_ui()
@@ -1724,27 +1853,27 @@ class IPAppliance(object):
 
     @lazycache
     def build_datetime(self):
-        datetime = self.ssh_client.get_build_datetime()
-        return datetime
+        build_mtime = self.facts.ssh_fact('build_mtime')
+        if build_mtime is None:
+            raise RuntimeError('Unable to retrieve appliance build datetime')
+        return parsetime.fromtimestamp(int(build_mtime))
 
     @lazycache
     def build_date(self):
-        date = self.ssh_client.get_build_date()
-        return date
+        return self.build_datetime.date()
 
     @lazycache
     def is_downstream(self):
-        return self.ssh_client.is_appliance_downstream()
+        return self.facts.ssh_fact('build') is not None
 
     def has_netapp(self):
         return self.ssh_client.appliance_has_netapp()
 
     @lazycache
     def guid(self):
-        result = self.ssh_client.run_command('cat /var/www/miq/vmdb/GUID')
-        return result.output
+        return self.facts.ssh_fact('guid')
 
-    @lazycache
+    @property
     def configuration_details(self):
         """Return details that are necessary to navigate through Configuration accordions.
 
@@ -1756,8 +1885,16 @@ class IPAppliance(object):
             If the data weren't found in the DB, :py:class:`NoneType`
             If the data were found, it returns tuple ``(region, server name,
             server id, server zone id)``
+
+        This is one of the :py:attr:`facts`; deleting it collects it again the next time.
         """
-        return db_queries.get_configuration_details(self.db)
+        details = self.facts.get('configuration_details',
+            lambda: db_queries.get_configuration_details(self.db))
+        return tuple(details) if details is not None else None
+
+    @configuration_details.deleter
+    def configuration_details(self):
+        self.facts.forget('configuration_details')
 
     def server_id(self):
         try:
@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
+import cPickle as pickle
+import os
 import re
+import time
 from bugzilla import Bugzilla as _Bugzilla
 from collections import Sequence
+from tempfile import NamedTemporaryFile
 
 from utils import lazycache
 from utils.conf import cfme_data, credentials
 from utils.log import logger
+from utils.path import log_path
 from utils.version import (
     LATEST, Version, current_version, appliance_build_datetime, appliance_is_downstream)
 
 NONE_FIELDS = {"---", "undefined", "unspecified"}
+# Fields fetched with the bugs besides the default ones; the first comment tells whether a bug is
+# a copy of another bug
+EXTRA_FIELDS = ["comments"]
 
 
 class Product(object):
@@ -46,11 +54,24 @@ class Product(object):
 
 
 class Bugzilla(object):
+    """Bugzilla with a cache of the bugs fetched from it
+
+    Args:
+        product: Name of the default product
+        cache_file: :py:class:`py.path.local` of a file to share the fetched bugs between processes
+            (ex. parallelizer slaves) through, if given
+        cache_ttl: Seconds the cache file is used for
+        **kwargs: Passed to :py:class:`bugzilla.Bugzilla`
+    """
     def __init__(self, **kwargs):
         self.__product = kwargs.pop("product", None)
+        self.__cache_file = kwargs.pop("cache_file", None)
+        self.__cache_ttl = kwargs.pop("cache_ttl", 3600)
         self.__kwargs = kwargs
         self.__bug_cache = {}
         self.__product_cache = {}
+        self.__cache_loaded = False
+        self.__cache_dirty = False
 
     @property
     def bug_count(self):
@@ -86,7 +107,8 @@ class Bugzilla(object):
         password = credentials.get(cr_root, {}).get("password", None)
         return cls(
             url=url, user=username, password=password, cookiefile=None,
-            tokenfile=None, product=product)
+            tokenfile=None, product=product, cache_file=log_path.join("bugzilla_cache.pickle"),
+            cache_ttl=cfme_data.get("bugzilla", {}).get("cache_ttl", 3600))
 
     @lazycache
     def bugzilla(self):
@@ -107,17 +129,100 @@ class Bugzilla(object):
         else:
             return Version(cfme_data.get("bugzilla", {}).get("upstream_version", "9.9"))
 
+    def _load_cache_file(self):
+        self.__cache_loaded = True
+        cache_file = self.__cache_file
+        if cache_file is None or not cache_file.check():
+            return
+        if time.time() - cache_file.mtime() > self.__cache_ttl:
+            return
+        try:
+            with cache_file.open("rb") as f:
+                bugs = pickle.load(f)
+        except Exception as e:
+            logger.warning("Unable to load the bugzilla cache {}: {}".format(cache_file, e))
+            return
+        for id, bug in bugs.iteritems():
+            self.__bug_cache.setdefault(id, BugWrapper(self, bug))
+
+    def save_cache(self):
+        """Writes the bugs fetched by this process to the cache file, if there are new ones"""
+        cache_file = self.__cache_file
+        if cache_file is None or not self.__cache_dirty:
+            return
+        # The bugs are pickled without their connection to bugzilla
+        bugs = {id: bug._bug for id, bug in self.__bug_cache.iteritems()}
+        cache_file.dirpath().ensure(dir=True)
+        temp_file = NamedTemporaryFile(dir=cache_file.dirname, suffix=".tmp", delete=False)
+        try:
+            with temp_file:
+                pickle.dump(bugs, temp_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_file.name, cache_file.strpath)
+        except Exception:
+            os.unlink(temp_file.name)
+            raise
+        self.__cache_dirty = False
+
+    def get_bugs(self, ids):
+        """Returns the bugs with these ids, fetching the ones not cached yet in a single call
+
+        Bugs that don't exist or aren't accessible are left out.
+        """
+        if not self.__cache_loaded:
+            self._load_cache_file()
+        ids = [int(id) for id in ids]
+        missing = set(id for id in ids if id not in self.__bug_cache)
+        if missing:
+            for bug in self.bugzilla.getbugs(
+                    sorted(missing), extra_fields=EXTRA_FIELDS, permissive=True):
+                if bug is not None:
+                    self.__bug_cache[int(bug.id)] = BugWrapper(self, bug)
+            self.__cache_dirty = True
+        return [self.__bug_cache[id] for id in ids if id in self.__bug_cache]
+
     def get_bug(self, id):
         id = int(id)
-        if id not in self.__bug_cache:
-            self.__bug_cache[id] = BugWrapper(self, self.bugzilla.getbugsimple(id))
-        return self.__bug_cache[id]
+        bugs = self.get_bugs([id])
+        if not bugs:
+            # Let bugzilla raise the fault
+            self.__bug_cache[id] = BugWrapper(
+                self, self.bugzilla.getbug(id, extra_fields=EXTRA_FIELDS))
+            return self.__bug_cache[id]
+        return bugs[0]
+
+    def prefetch_variants(self, ids):
+        """Fetches bugs and all of their variants (see :py:meth:`get_bug_variants`)
+
+        The variants are looked for breadth-first, fetching the duplicates, copies and blocked bugs
+        of each level of variants in a single call.
+        """
+        variants = set(bug.id for bug in self.get_bugs(ids))
+        visited = set()
+        while variants:
+            visited.update(variants)
+            linked = set()
+            # blocked bug id: variants it blocks
+            blocked = {}
+            for bug in self.get_bugs(variants):
+                if bug.status == "CLOSED" and bug.resolution == "DUPLICATE":
+                    linked.add(int(bug.dupe_of))
+                    continue
+                if bug.copy_of:
+                    linked.add(bug.copy_of)
+                for blocked_id in bug._bug.blocks:
+                    blocked.setdefault(int(blocked_id), set()).add(bug.id)
+            variants = set(linked)
+            for bug in self.get_bugs(linked | set(blocked)):
+                if bug.copy_of in blocked.get(bug.id, ()):
+                    variants.add(bug.id)
+            variants -= visited
 
     def get_bug_variants(self, id):
         if isinstance(id, BugWrapper):
             bug = id
         else:
             bug = self.get_bug(id)
+        self.prefetch_variants([bug.id])
         expanded = set([])
         found = set([])
         stack = set([bug])
@@ -224,7 +329,14 @@ class BugWrapper(object):
         If the field is string and it has zero length, or the value is specified as "not specified",
         it will return None.
         """
-        value = getattr(self._bug, attr)
+        try:
+            value = getattr(self._bug, attr)
+        except AttributeError:
+            if self._bug.bugzilla is not None:
+                raise
+            # The bug was loaded from the cache file, it needs the connection to resolve aliases
+            self._bug.bugzilla = self._bugzilla.bugzilla
+            value = getattr(self._bug, attr)
         if attr in self.loose:
             if isinstance(value, Sequence) and not isinstance(value, basestring):
                 value = value[0]
@@ -273,10 +385,9 @@ class BugWrapper(object):
     def copies(self):
         """Returns list of copies of this bug."""
         result = []
-        for bug_id in self._bug.blocks:
-            bug = self._bugzilla.get_bug(bug_id)
+        for bug in self._bugzilla.get_bugs(self._bug.blocks):
             if bug.copy_of == self._bug.id:
-                result.append(bug_id)
+                result.append(bug.id)
         return map(int, result)
 
     @property
@@ -255,9 +255,10 @@ class ReportCompile(object):
             r = reporter.ReporterBase()
             reports_done = {'composite': False, 'provider': False}
             self._progress_update(None, reports_done)
-            r._run_report(composite_report['tests'], self.work_dir.strpath)
+            index = r.index_tests(composite_report['tests'], self.work_dir.strpath, None)
+            r._run_report(composite_report['tests'], self.work_dir.strpath, index=index)
             self._progress_update('composite', reports_done)
-            r._run_provider_report(composite_report['tests'], self.work_dir.strpath)
+            r._run_provider_report(composite_report['tests'], self.work_dir.strpath, index=index)
             self._progress_update('provider', reports_done)
             self._progress_finish()
         except ZeroDivisionError:
@@ -1,3 +1,5 @@
+import cPickle as pickle
+import os
 from collections import Mapping
 from contextlib import contextmanager
 from itertools import izip
@@ -5,7 +7,7 @@ from tempfile import NamedTemporaryFile
 
 import yaml
 from sqlalchemy import MetaData, create_engine, event, inspect
-from sqlalchemy.exc import ArgumentError, DisconnectionError, InvalidRequestError
+from sqlalchemy.exc import ArgumentError, DisconnectionError, InvalidRequestError, SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import Pool
@@ -14,7 +16,7 @@ from fixtures.pytest_store import store
 from utils import conf, lazycache, ports, version
 from utils.datafile import load_data_file
 from utils.log import logger
-from utils.path import data_path
+from utils.path import data_path, log_path
 from utils.signals import fire, on_signal
 from utils.ssh import SSHClient
 
@@ -84,7 +86,9 @@ class Db(Mapping):
         Creating a table object requires a call to the database so that SQLAlchemy can do
         reflection to determine the table's structure (columns, keys, indices, etc). On
         a latent connection, this can be extremely slow, which will affect methods that return
-        tables, like the mapping interface or :py:meth:`values`.
+        tables, like the mapping interface or :py:meth:`values`. Reflected tables are kept in a
+        :py:class:`ReflectionCache` on disk, so each table is only reflected once per schema
+        version, no matter how many processes or copies of this db use it.
 
     """
     def __init__(self, hostname=None, credentials=None):
@@ -222,6 +226,22 @@ class Db(Mapping):
         # rails table names follow similar rules as pep8 identifiers; expose them as such
         return sorted(inspect(self.engine).get_table_names())
 
+    @lazycache
+    def schema_version(self):
+        """The latest rails migration applied to this database, or ``None`` if there are none"""
+        try:
+            return self.engine.scalar('SELECT max(version) FROM schema_migrations')
+        except SQLAlchemyError as e:
+            logger.warning('[DB] schema version of {} not found: {}'.format(self.hostname, e))
+            return None
+
+    @lazycache
+    def reflection_cache(self):
+        """The :py:class:`ReflectionCache` of this database's schema version, or ``None``"""
+        if self.schema_version is None:
+            return None
+        return ReflectionCache(log_path.join('db_reflection', self.schema_version))
+
     @lazycache
     def session(self):
         """Returns a :py:class:`Session <sqlalchemy:sqlalchemy.orm.session.Session>`
@@ -262,11 +282,26 @@ class Db(Mapping):
     def reflect_table(self, table_name):
         """Populate :py:attr:`metadata` with information on a table
 
+        The table (and the tables it references) are loaded from the :py:attr:`reflection_cache`
+        if they were reflected before, otherwise they're reflected and added to the cache.
+
         Args:
             table_name: The name of a table to reflect
 
         """
-        self.metadata.reflect(only=[table_name])
+        if table_name in self.metadata.tables:
+            # already reflected, ex. as a table referenced by another table
+            return
+        cache = self.reflection_cache
+        reflected = cache.load(table_name) if cache is not None else None
+        if reflected is None:
+            reflected = MetaData()
+            reflected.reflect(bind=self.engine, only=[table_name])
+            if cache is not None:
+                cache.save(table_name, reflected)
+        for table in reflected.sorted_tables:
+            if table.name not in self.metadata.tables:
+                table.tometadata(self.metadata)
 
     def _table(self, table_name):
         """Retrieves, reflects, and caches table objects
@@ -293,6 +328,50 @@ class Db(Mapping):
                 return None
 
 
+class ReflectionCache(object):
+    """Reflected tables, pickled to disk
+
+    Each table is pickled with the tables it references, in a
+    :py:class:`MetaData <sqlalchemy:sqlalchemy.schema.MetaData>` of its own. The files are written
+    atomically, so several processes (ex. parallelizer slaves) can share a cache.
+
+    Args:
+        path: :py:class:`py.path.local` of the cache directory; a database schema can change with
+            every migration, so it should be specific to the schema version
+
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def _table_path(self, table_name):
+        return self.path.join('{}.pickle'.format(table_name))
+
+    def load(self, table_name):
+        """Returns the MetaData of a table, or ``None`` if it isn't cached"""
+        table_path = self._table_path(table_name)
+        if not table_path.check():
+            return None
+        try:
+            with table_path.open('rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            # corrupted or from an incompatible sqlalchemy, reflect it again
+            logger.warning('[DB] Unable to load reflected table {}: {}'.format(table_name, e))
+            return None
+
+    def save(self, table_name, metadata):
+        table_path = self._table_path(table_name)
+        self.path.ensure(dir=True)
+        temp_file = NamedTemporaryFile(dir=self.path.strpath, suffix='.tmp', delete=False)
+        try:
+            with temp_file:
+                pickle.dump(metadata, temp_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_file.name, table_path.strpath)
+        except Exception:
+            os.unlink(temp_file.name)
+            raise
+
+
 def db_yamls(db=None, guid=None):
     """Returns the yamls from the db configuration table as a dict
 
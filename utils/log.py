@@ -50,6 +50,15 @@ those source locations to make the resultant log message more useful. To do so,
 If ``source_lineno`` is ``None`` and ``source_file`` is included, the line number will be omitted.
 This is useful in cases where the line number can't be determined or isn't necessary.
 
+Artifactor Log Records
+^^^^^^^^^^^^^^^^^^^^^^
+
+Messages sent to ``logger`` are also recorded by the artifactor logger plugin, if it is enabled.
+A message is only processed when the cfme logger or the plugin's ``level`` accepts it, so
+suppressed messages (e.g. trace messages) are nearly free. Records for the artifactor are
+buffered and sent in batches; they are flushed before each test starts and finishes with
+``logger.flush_art_log()``.
+
 Configuration
 ^^^^^^^^^^^^^
 
@@ -130,10 +139,13 @@ Members
 ^^^^^^^
 
 """
+import atexit
 import fauxfactory
 import inspect
 import logging
+import Queue
 import sys
+import threading
 import warnings
 import datetime as dt
 from logging.handlers import RotatingFileHandler, SysLogHandler
@@ -141,12 +153,15 @@ from pkgutil import iter_modules
 from time import time
 from traceback import extract_tb, format_tb
 
+import diaper
 import psphere
 
 from utils import conf, lazycache, safe_string
 from utils.path import get_rel_path, log_path
 
 MARKER_LEN = 80
+# Number of records buffered before they're shipped to the artifactor
+ART_LOG_BATCH_SIZE = 100
 
 # set logging defaults
 _default_conf = {
@@ -457,8 +472,97 @@ def nth_frame_info(n):
     return inspect.getframeinfo(inspect.stack(1)[n][0])
 
 
+def nth_frame_source(n):
+    """Cheaply determine the filename and lineno of the code running at the "n"th frame
+
+    Unlike :py:func:`nth_frame_info`, this walks the frame objects directly and never reads
+    source files for context, so it is suitable for use on every log emission.
+
+    Args:
+        n: Number of the stack frame to inspect, counted the same way as in
+            :py:func:`nth_frame_info`
+
+    Raises ValueError if the stack doesn't contain the nth frame
+
+    Returns a ``(filename, lineno)`` tuple
+
+    """
+    # 0 is this function's frame, so "n" lines up with inspect.stack()[n]
+    frame = sys._getframe(n)
+    return frame.f_code.co_filename, frame.f_lineno
+
+
+_rel_path_cache = {}
+
+
+def _source_rel_path(filename):
+    # get_rel_path builds py.path objects, so remember the result for each source file
+    try:
+        return _rel_path_cache[filename]
+    except KeyError:
+        relpath = _rel_path_cache[filename] = get_rel_path(filename)
+        return relpath
+
+
+class _ArtifactorLogChannel(object):
+    """Buffers artifactor log records and ships them in batches from a background thread
+
+    Records are kept in the order they were logged, and handed to the artifactor with the
+    ``log_messages`` hook once ``batch_size`` records have accumulated or :py:meth:`flush`
+    is called. :py:meth:`flush` blocks until every record logged before it has been sent.
+
+    """
+    def __init__(self, client, slaveid, batch_size=ART_LOG_BATCH_SIZE):
+        self.client = client
+        self.slaveid = slaveid
+        self.batch_size = batch_size
+        self._records = []
+        self._lock = threading.Lock()
+        self._batches = Queue.Queue()
+        self._sender = None
+
+    def _send_batches(self):
+        while True:
+            batch = self._batches.get()
+            try:
+                # Never let a failing artifactor take the logging call down with it
+                with diaper:
+                    self.client.fire_hook('log_messages', log_records=batch, slaveid=self.slaveid)
+            finally:
+                self._batches.task_done()
+
+    def _queue_batch(self):
+        # must be called with self._lock held
+        if not self._records:
+            return
+        if self._sender is None:
+            self._sender = threading.Thread(target=self._send_batches, name='artifactor-log')
+            self._sender.daemon = True
+            self._sender.start()
+            atexit.register(self.flush)
+        batch, self._records = self._records, []
+        self._batches.put(batch)
+
+    def append(self, record):
+        with self._lock:
+            self._records.append(record)
+            if len(self._records) >= self.batch_size:
+                self._queue_batch()
+
+    def flush(self):
+        with self._lock:
+            self._queue_batch()
+        self._batches.join()
+
+
 class ArtifactorLoggerAdapter(logging.LoggerAdapter):
-    """Logger Adapter that hands messages off to the artifactor before logging"""
+    """Logger Adapter that hands messages off to the artifactor before logging
+
+    Messages are only processed if either the underlying logger or the artifactor logger
+    plugin will record them, so suppressed messages cost little more than a level check.
+    Records bound for the artifactor are buffered, see :py:meth:`flush_art_log`.
+
+    """
     @lazycache
     def artifactor(self):
         from fixtures.artifactor_plugin import art_client
@@ -469,69 +573,100 @@ class ArtifactorLoggerAdapter(logging.LoggerAdapter):
         from fixtures.artifactor_plugin import SLAVEID
         return SLAVEID or ""
 
+    @lazycache
+    def art_level(self):
+        """The lowest level recorded by an enabled artifactor logger plugin
+
+        ``None`` if there is no artifactor, or it isn't logging messages.
+
+        """
+        if not self.artifactor:
+            return None
+        plugins = conf.env.get('artifactor', {}).get('plugins', {}) or {}
+        levels = [logging.getLevelName(str(plugin.get('level', 'DEBUG')).upper())
+            for plugin in plugins.itervalues()
+            if plugin.get('plugin') == 'logger' and plugin.get('enabled', False)]
+        levels = [level for level in levels if isinstance(level, int)]
+        return min(levels) if levels else None
+
+    @lazycache
+    def art_channel(self):
+        return _ArtifactorLogChannel(self.artifactor, self.slaveid)
+
     def art_log(self, level_name, message, kwargs):
         art_log_record = {
             'level': level_name,
             'message': safe_string(message),
             'extra': kwargs.get('extra', '')
         }
-        self.artifactor.fire_hook('log_message', log_record=art_log_record, slaveid=self.slaveid)
+        self.art_channel.append(art_log_record)
 
-    def log(self, lvl, msg, *args, **kwargs):
-        level_name = logging.getLevelName(lvl).lower()
+    def flush_art_log(self):
+        """Send all buffered log records to the artifactor, waiting until they are handed off
+
+        Called before tests start and finish, so records end up in the right test's log.
+
+        """
+        if self.art_level is not None:
+            self.art_channel.flush()
+
+    def _art_enabled_for(self, lvl):
+        return self.art_level is not None and lvl >= self.art_level
+
+    def _log(self, lvl, level_name, msg, args, kwargs):
         msg, kwargs = self.process(msg, kwargs)
-        self.art_log(level_name, msg, kwargs)
+        if self._art_enabled_for(lvl):
+            self.art_log(level_name, msg, kwargs)
         return self.logger.log(lvl, msg, *args, **kwargs)
 
+    def log(self, lvl, msg, *args, **kwargs):
+        if self.isEnabledFor(lvl) or self._art_enabled_for(lvl):
+            level_name = logging.getLevelName(lvl).lower()
+            return self._log(lvl, level_name, msg, args, kwargs)
+
     def trace(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('trace', msg, kwargs)
-        return self.logger.trace(msg, *args, **kwargs)
+        if self.isEnabledFor(logging.TRACE) or self._art_enabled_for(logging.TRACE):
+            return self._log(logging.TRACE, 'trace', msg, args, kwargs)
 
     def debug(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('debug', msg, kwargs)
-        return self.logger.debug(msg, *args, **kwargs)
+        if self.isEnabledFor(logging.DEBUG) or self._art_enabled_for(logging.DEBUG):
+            return self._log(logging.DEBUG, 'debug', msg, args, kwargs)
 
     def info(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('info', msg, kwargs)
-        return self.logger.info(msg, *args, **kwargs)
+        if self.isEnabledFor(logging.INFO) or self._art_enabled_for(logging.INFO):
+            return self._log(logging.INFO, 'info', msg, args, kwargs)
 
     def warning(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('warning', msg, kwargs)
-        return self.logger.warning(msg, *args, **kwargs)
+        if self.isEnabledFor(logging.WARNING) or self._art_enabled_for(logging.WARNING):
+            return self._log(logging.WARNING, 'warning', msg, args, kwargs)
 
     def error(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('error', msg, kwargs)
-        return self.logger.error(msg, *args, **kwargs)
+        if self.isEnabledFor(logging.ERROR) or self._art_enabled_for(logging.ERROR):
+            return self._log(logging.ERROR, 'error', msg, args, kwargs)
 
     def critical(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('critical', msg, kwargs)
-        return self.logger.critical(msg, *args, **kwargs)
+        if self.isEnabledFor(logging.CRITICAL) or self._art_enabled_for(logging.CRITICAL):
+            return self._log(logging.CRITICAL, 'critical', msg, args, kwargs)
 
     def exception(self, msg, *args, **kwargs):
-        kwargs['exc_info'] = 1
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('error', msg, kwargs)
-        return self.logger.error(msg, *args, **kwargs)
+        if self.isEnabledFor(logging.ERROR) or self._art_enabled_for(logging.ERROR):
+            kwargs['exc_info'] = 1
+            return self._log(logging.ERROR, 'error', msg, args, kwargs)
 
     def process(self, msg, kwargs):
-        # frames
-        # 0: call to nth_frame_info
-        # 1: adapter process method (this method)
-        # 2: adapter logging method
-        # 3: original logging call
-        frameinfo = nth_frame_info(3)
         extra = kwargs.get('extra', {})
         # add extra data if needed
         if not extra.get('source_file'):
-            if frameinfo.filename:
-                extra['source_file'] = get_rel_path(frameinfo.filename)
-                extra['source_lineno'] = frameinfo.lineno
+            # frames
+            # 0: call to nth_frame_source
+            # 1: adapter process method (this method)
+            # 2: adapter _log method
+            # 3: adapter logging method
+            # 4: original logging call
+            filename, lineno = nth_frame_source(4)
+            if filename:
+                extra['source_file'] = _source_rel_path(filename)
+                extra['source_lineno'] = lineno
             else:
                 # calling frame didn't have a filename
                 extra['source_file'] = 'unknown'
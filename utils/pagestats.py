@@ -12,15 +12,31 @@ from utils.browser import ensure_browser_open
 from utils.conf import perf_tests
 from utils.log import logger
 from utils.path import log_path
-from utils.perf import generate_statistics
+from utils.perf import generate_statistics, generate_statistics_rows
 from utils.ssh import SSHTail
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import UnexpectedAlertPresentException
+from array import array
+from collections import OrderedDict
 from time import time
 import csv
+import json
 import numpy
 import re
 
+# Regular Expressions to capture the events of a request from the ruby production.log:
+
+# [----] I, [2015-06-16T14:24:37.345812 #2774:a3f994]  INFO -- : ....
+# Started GET "/dashboard/show" for 127.0.0.1 at ...
+rails_started = re.compile(r'Started\s(.*?\s)for\s')
+# Completed 200 OK in 1207ms (Views: 1016.9ms | ActiveRecord: 53.8ms)
+# Completed 500 Internal Server Error in 30ms
+rails_completed = re.compile(r'Completed\s(\d+\s.*?)\sin\s([0-9\.]+)ms')
+rails_views = re.compile(r'Views:\s([0-9\.]*)ms')
+rails_activerecord = re.compile(r'ActiveRecord:\s([0-9\.]*)ms')
+#   MiqServer Load (0.5ms)  SELECT ...
+rails_query_time = re.compile(r'\s\(([0-9\.]*)ms\)')
+
 
 def analyze_page_stat(pages, soft_assert):
     for page in pages:
@@ -205,8 +221,9 @@ def navigate_split_table(table, page_name, nav_limit, ui_worker_pid, prod_tail,
 
 
 def standup_perf_ui(ui_worker_pid, soft_assert):
-    logger.info('Opening /var/www/miq/vmdb/log/production.log for tail')
-    prod_tail = SSHTail('/var/www/miq/vmdb/log/production.log')
+    # Only the lines of the UI worker are used
+    prod_tail = SSHTail('/var/www/miq/vmdb/log/production.log',
+        line_filter='#{}'.format(ui_worker_pid))
     prod_tail.set_initial_file_end()
 
     ensure_browser_open()
@@ -226,45 +243,16 @@ def pages_to_csv(pages, file_name):
 
 
 def pages_to_statistics_csv(pages, filters, report_file_name):
-    all_statistics = []
-    for page in pages:
-        # Determine if the page matches a pattern and swap request to pattern
-        for p_filter in filters:
-            results = p_filter.search(page.request.strip())
-            if results:
-                page.request = p_filter.pattern
-                break
-        added = False
-
-        if len(all_statistics) > 0:
-            for pg_statistics in all_statistics:
-                if pg_statistics.request == page.request:
-                    if page.seleniumtime > 0:
-                        pg_statistics.seleniumtimes.append(int(page.seleniumtime))
-                    pg_statistics.completedintimes.append(float(page.completedintime))
-                    if page.viewstime > 0:
-                        pg_statistics.viewstimes.append(float(page.viewstime))
-                    pg_statistics.activerecordtimes.append(float(page.activerecordtime))
-                    pg_statistics.selectcounts.append(int(page.selectcount))
-                    pg_statistics.cachedcounts.append(int(page.cachedcount))
-                    pg_statistics.uncachedcounts.append(int(page.uncachedcount))
-                    added = True
-                    break
+    """Aggregates pages by the filter pattern their request matches and appends the statistics
+    of each pattern to a csv report (see :py:class:`PageStatAggregate`)."""
+    aggregate = PageStatAggregate(filters)
+    aggregate.add_pages(pages)
+    aggregate_to_statistics_csv(aggregate, report_file_name)
 
-        if not added:
-            pg_statistics = PageStatLists()
-            pg_statistics.request = page.request
-            if page.seleniumtime > 0:
-                pg_statistics.seleniumtimes.append(int(page.seleniumtime))
-            pg_statistics.completedintimes.append(float(page.completedintime))
-            if page.viewstime > 0:
-                pg_statistics.viewstimes.append(float(page.viewstime))
-            pg_statistics.activerecordtimes.append(float(page.activerecordtime))
-            pg_statistics.selectcounts.append(int(page.selectcount))
-            pg_statistics.cachedcounts.append(int(page.cachedcount))
-            pg_statistics.uncachedcounts.append(int(page.uncachedcount))
-            all_statistics.append(pg_statistics)
 
+def aggregate_to_statistics_csv(aggregate, report_file_name):
+    """Appends the statistics of a :py:class:`PageStatAggregate` to a csv report, writing the
+    headers first if the report doesn't exist yet."""
     csvdata_path = log_path.join('csv_output', report_file_name)
     if csvdata_path.isfile():
         logger.info('Appending to: {}'.format(report_file_name))
@@ -288,27 +276,20 @@ def pages_to_statistics_csv(pages, filters, report_file_name):
             csvfile.writerow(headers)
 
         # Contents of CSV
-        for page_statistics in all_statistics:
-            if len(page_statistics.completedintimes) > 1:
+        for request, statistics in aggregate.statistics():
+            samples, _, average, _, _, stddev, percentile90, _ = statistics[1]
+            if samples > 1:
                 logger.debug('Samples/Avg/90th/Std: {} : {} : {} : {} Pattern: {}'.format(
-                    str(len(page_statistics.completedintimes)).rjust(7),
-                    str(round(numpy.average(page_statistics.completedintimes), 2)).rjust(7),
-                    str(round(numpy.percentile(page_statistics.completedintimes, 90), 2)).rjust(7),
-                    str(round(numpy.std(page_statistics.completedintimes), 2)).rjust(7),
-                    page_statistics.request))
-            stats = [page_statistics.request]
-            stats.extend(generate_statistics(page_statistics.seleniumtimes))
-            stats.extend(generate_statistics(page_statistics.completedintimes))
-            stats.extend(generate_statistics(page_statistics.viewstimes))
-            stats.extend(generate_statistics(page_statistics.activerecordtimes))
-            stats.extend(generate_statistics(page_statistics.selectcounts))
-            stats.extend(generate_statistics(page_statistics.cachedcounts))
-            stats.extend(generate_statistics(page_statistics.uncachedcounts))
+                    str(samples).rjust(7), str(average).rjust(7), str(percentile90).rjust(7),
+                    str(stddev).rjust(7), request))
+            stats = [request]
+            for measurement_statistics in statistics:
+                stats.extend(measurement_statistics)
             csvfile.writerow(stats)
     finally:
         outputfile.close()
 
-    logger.debug('Size of Aggregated list of pages: {}'.format(len(all_statistics)))
+    logger.debug('Size of Aggregated list of pages: {}'.format(len(aggregate)))
 
 
 def perf_bench_read_tree(tree):
@@ -318,14 +299,87 @@ def perf_bench_read_tree(tree):
     return tree_contents, seleniumtime
 
 
-def perf_click(uiworker_pid, tailer, measure_sel_time, clickable, *args):
-    # Regular Expressions to find the ruby production completed time and select query time
-    status_re = re.compile(r'Completed\s([0-9]*\s[a-zA-Z]*)\sin\s([0-9\.]*)ms')
-    views_re = re.compile(r'Views:\s([0-9\.]*)ms')
-    activerecord_re = re.compile(r'ActiveRecord:\s([0-9\.]*)ms')
-    select_query_time_re = re.compile(r'\s\(([0-9\.]*)ms\)')
-    worker_pid = '#' + uiworker_pid
+def production_log_events(lines, worker_pid=None):
+    """Yields the events of the rails production.log lines of a worker
+
+    Each line is classified as one of:
+
+    * ``('started', request)``
+    * ``('completed', status, completed in time, views time, activerecord time)``, where the
+      views and activerecord times are ``None`` if the line has none (ex. redirects), and the
+      status and the completed in time are ``None`` if they can't be parsed
+    * ``('select', query time, cached, line)``, where the query time is ``None`` if the line
+      has none
+    * ``('cache',)``, for a cached query that isn't a select
+
+    Args:
+        lines: Lines of production.log
+        worker_pid: Only the lines of the worker with this pid are used, or all lines if ``None``
+    """
+    # [----] D, [2015-06-16T14:24:37.345812 #2774:a3f994] DEBUG -- : ...
+    worker_tag = '#{}:'.format(worker_pid) if worker_pid is not None else None
+    # Most of the lines are queries, so they are looked for first
+    for line in lines:
+        if worker_tag is not None and worker_tag not in line:
+            continue
+        if 'SELECT' in line:
+            query_time_result = rails_query_time.search(line)
+            yield ('select', float(query_time_result.group(1)) if query_time_result else None,
+                'CACHE' in line, line)
+        elif 'CACHE' in line:
+            yield 'cache',
+        elif ' -- : Started ' in line:
+            started_result = rails_started.search(line)
+            if started_result:
+                yield 'started', started_result.group(1)
+        elif ' -- : Completed ' in line:
+            # The request completed even if its status can't be parsed
+            status_result = rails_completed.search(line)
+            times_start = status_result.end() if status_result else 0
+            views_result = rails_views.search(line, times_start)
+            activerecord_result = rails_activerecord.search(line, times_start)
+            yield ('completed', status_result.group(1) if status_result else None,
+                float(status_result.group(2)) if status_result else None,
+                float(views_result.group(1)) if views_result else None,
+                float(activerecord_result.group(1)) if activerecord_result else None)
+
+
+def production_log_to_pages(events, query_threshold):
+    """Builds the PageStats of the requests completed in production.log events
+
+    Args:
+        events: Events from :py:func:`production_log_events`
+        query_threshold: Selects taking longer (ms) are kept in the slowselects of the page
+    """
+    pgstats = []
+    pgstat = PageStat()
+    for event in events:
+        kind = event[0]
+        if kind == 'select':
+            pgstat.selectcount += 1
+            if event[1] is not None and event[1] > query_threshold:
+                pgstat.slowselects.append(event[3])
+            if event[2]:
+                pgstat.cachedcount += 1
+        elif kind == 'cache':
+            pgstat.cachedcount += 1
+        elif kind == 'started':
+            pgstat.request = event[1]
+        elif kind == 'completed':
+            if event[1] is not None:
+                pgstat.status = event[1]
+                pgstat.completedintime = event[2]
+            pgstat.uncachedcount = pgstat.selectcount - pgstat.cachedcount
+            if event[3] is not None:
+                pgstat.viewstime = event[3]
+            if event[4] is not None:
+                pgstat.activerecordtime = event[4]
+            pgstats.append(pgstat)
+            pgstat = PageStat()
+    return pgstats
+
 
+def perf_click(uiworker_pid, tailer, measure_sel_time, clickable, *args):
     # Time the selenium transaction from "click"
     seleniumtime = 0
     if clickable:
@@ -333,49 +387,15 @@ def perf_click(uiworker_pid, tailer, measure_sel_time, clickable, *args):
         clickable(*args)
         seleniumtime = int((time() - starttime) * 1000)
 
-    pgstats = []
-    pgstat = PageStat()
-    line_count = 0
     starttime = time()
-
-    for line in tailer:
-        line_count += 1
-        if worker_pid in line:
-            if 'SELECT' in line:
-                pgstat.selectcount += 1
-                selecttime = select_query_time_re.search(line)
-                if selecttime:
-                    if float(selecttime.group(1)) > perf_tests['ui']['threshold']['query_time']:
-                        pgstat.slowselects.append(line)
-            if 'CACHE' in line:
-                pgstat.cachedcount += 1
-            if 'INFO -- : Started' in line:
-                # Obtain method and requested page
-                started_idx = line.index('Started') + 8
-                pgstat.request = line[started_idx:line.index('for', 72)]
-            if 'INFO -- : Completed' in line:
-                # Obtain status code and total render time
-                status_result = status_re.search(line)
-                if status_result:
-                    pgstat.status = status_result.group(1)
-                    pgstat.completedintime = float(status_result.group(2))
-
-                pgstat.uncachedcount = pgstat.selectcount - pgstat.cachedcount
-
-                # Redirects don't always have a view timing
-                views_result = views_re.search(line)
-                if views_result:
-                    pgstat.viewstime = float(views_result.group(1))
-                activerecord_result = activerecord_re.search(line)
-                if activerecord_result:
-                    pgstat.activerecordtime = float(activerecord_result.group(1))
-                pgstats.append(pgstat)
-                pgstat = PageStat()
+    lines = list(tailer)
+    pgstats = production_log_to_pages(production_log_events(lines, uiworker_pid),
+        perf_tests['ui']['threshold']['query_time'])
     if pgstats:
         if measure_sel_time:
             pgstats[-1].seleniumtime = seleniumtime
     timediff = time() - starttime
-    logger.debug('Parsed ({}) lines in {}'.format(line_count, timediff))
+    logger.debug('Parsed ({}) lines in {}'.format(len(lines), timediff))
     return pgstats
 
 
@@ -410,14 +430,136 @@ class PageStat(object):
             ', Status: ' + self.status
 
 
-class PageStatLists(object):
-
-    def __init__(self):
-        self.request = ''
-        self.seleniumtimes = []
-        self.completedintimes = []
-        self.viewstimes = []
-        self.activerecordtimes = []
-        self.selectcounts = []
-        self.cachedcounts = []
-        self.uncachedcounts = []
+class PageStatAggregate(object):
+    """Measurements of pages, aggregated by the filter pattern their request matches
+
+    A page is aggregated under the pattern of the first filter that its request matches, or under
+    its request if no filter matches. The filters are combined into a single regex, and each
+    distinct request is only matched once. The measurements of each pattern are kept in typed
+    arrays, in the order the patterns were first seen; selenium and views times are only kept
+    when they were measured (greater than 0).
+
+    Aggregates of several tests, runs or slaves can be combined with :py:meth:`merge`, and
+    persisted with :py:meth:`dump` and :py:meth:`load`.
+
+    Args:
+        filters: Compiled regexes of the patterns to aggregate requests under
+    """
+    # attribute of PageStat, array typecode, whether only measured (> 0) values are kept
+    measurements = [
+        ('seleniumtime', 'l', True),
+        ('completedintime', 'd', False),
+        ('viewstime', 'd', True),
+        ('activerecordtime', 'd', False),
+        ('selectcount', 'l', False),
+        ('cachedcount', 'l', False),
+        ('uncachedcount', 'l', False)]
+
+    def __init__(self, filters=()):
+        self.filters = list(filters)
+        self._filter = _combine_filters(self.filters)
+        self._patterns = {}
+        self._arrays = OrderedDict()
+
+    def pattern(self, request):
+        """Returns the pattern a request is aggregated under"""
+        try:
+            return self._patterns[request]
+        except KeyError:
+            pattern = self._patterns[request] = self._filter(request.strip()) or request
+            return pattern
+
+    def _measurement_arrays(self, pattern):
+        try:
+            return self._arrays[pattern]
+        except KeyError:
+            arrays = self._arrays[pattern] = [
+                array(typecode) for _, typecode, _ in self.measurements]
+            return arrays
+
+    def add(self, page):
+        arrays = self._measurement_arrays(self.pattern(page.request))
+        for values, (name, typecode, measured_only) in zip(arrays, self.measurements):
+            value = getattr(page, name)
+            if measured_only and not value > 0:
+                continue
+            values.append(int(value) if typecode == 'l' else float(value))
+
+    def add_pages(self, pages):
+        for page in pages:
+            self.add(page)
+
+    def merge(self, other):
+        """Adds the measurements of another aggregate to this one"""
+        for pattern, other_arrays in other._arrays.iteritems():
+            for values, other_values in zip(self._measurement_arrays(pattern), other_arrays):
+                values.extend(other_values)
+
+    def statistics(self):
+        """Yields each pattern with the :py:func:`utils.perf.generate_statistics` of each
+        measurement, in the order of :py:attr:`measurements`"""
+        # Every page adds to the measurements that aren't filtered, so they are computed together
+        always = [i for i, (_, _, measured_only) in enumerate(self.measurements)
+            if not measured_only]
+        for pattern, arrays in self._arrays.iteritems():
+            statistics = [None] * len(arrays)
+            for i, row_statistics in zip(always, generate_statistics_rows(
+                    [_as_numpy(arrays[i]) for i in always])):
+                statistics[i] = row_statistics
+            for i, values in enumerate(arrays):
+                if statistics[i] is None:
+                    statistics[i] = generate_statistics(_as_numpy(values))
+            yield pattern, statistics
+
+    def dump(self, file_name):
+        """Writes the measurements to a json file"""
+        data = [[pattern, [values.tolist() for values in arrays]]
+            for pattern, arrays in self._arrays.iteritems()]
+        with open(file_name, 'w') as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, file_name, filters=()):
+        """Reads the measurements written by :py:meth:`dump`"""
+        aggregate = cls(filters)
+        with open(file_name) as f:
+            data = json.load(f)
+        for pattern, lists in data:
+            for values, other_values in zip(aggregate._measurement_arrays(pattern), lists):
+                values.extend(other_values)
+        return aggregate
+
+    def __len__(self):
+        return len(self._arrays)
+
+
+def _as_numpy(values):
+    return numpy.frombuffer(values, dtype=numpy.dtype(values.typecode))
+
+
+def _combine_filters(filters):
+    """Returns a function that returns the pattern of the first filter matching a string
+
+    The filters are combined into one regex of lookaheads, so the alternatives are tried in the
+    order of the filters, each anywhere in the string. Filters with groups or flags of their own
+    can't be combined, and are searched one at a time instead.
+    """
+    if not filters:
+        return lambda request: None
+    if any(f.groups or f.flags != filters[0].flags for f in filters):
+        def first_match(request):
+            for p_filter in filters:
+                if p_filter.search(request):
+                    return p_filter.pattern
+            return None
+        return first_match
+    combined = re.compile('|'.join(r'(?=[\s\S]*?(?:{})())'.format(f.pattern) for f in filters),
+        filters[0].flags)
+    patterns = [f.pattern for f in filters]
+
+    def first_match(request):
+        match = combined.match(request)
+        if match is None:
+            return None
+        return patterns[match.lastindex - 1]
+    return first_match
@@ -3,6 +3,7 @@ from utils.ssh import SSHClient, SSHTail
 from utils.db import get_yaml_config, set_yaml_config
 from utils.log import logger
 import numpy
+import os
 import time
 
 
@@ -16,32 +17,60 @@ def collect_log(ssh_client, log_prefix, local_file_name, strip_whitespace=False)
     dest_file = '{}{}.perf.log'.format(log_dir, log_prefix)
     dest_file_gz = '{}{}.perf.log.gz'.format(log_dir, log_prefix)
 
-    ssh_client.run_command('rm -f {}'.format(dest_file_gz))
-
-    status, out = ssh_client.run_command('ls -1 {}-*'.format(log_file))
+    status, out = ssh_client.run_command('rm -f {}; ls -1 {}-*'.format(dest_file_gz, log_file))
+    commands = []
     if status == 0:
         files = out.strip().split('\n')
         for lfile in sorted(files):
-            ssh_client.run_command('cp {} {}-2.gz'.format(lfile, lfile))
-            ssh_client.run_command('gunzip {}-2.gz'.format(lfile))
+            commands.append('cp {} {}-2.gz'.format(lfile, lfile))
+            commands.append('gunzip {}-2.gz'.format(lfile))
             if strip_whitespace:
-                ssh_client.run_command('sed -i  \'s/^ *//; s/ *$//; /^$/d; /^\s*$/d\' '
+                commands.append('sed -i  \'s/^ *//; s/ *$//; /^$/d; /^\s*$/d\' '
                     '{}-2'.format(lfile))
-            ssh_client.run_command('cat {}-2 >> {}'.format(lfile, dest_file))
-            ssh_client.run_command('rm {}-2'.format(lfile))
+            commands.append('cat {}-2 >> {}'.format(lfile, dest_file))
+            commands.append('rm {}-2'.format(lfile))
 
-    ssh_client.run_command('cp {} {}-2'.format(log_file, log_file))
+    commands.append('cp {} {}-2'.format(log_file, log_file))
     if strip_whitespace:
-        ssh_client.run_command('sed -i  \'s/^ *//; s/ *$//; /^$/d; /^\s*$/d\' '
+        commands.append('sed -i  \'s/^ *//; s/ *$//; /^$/d; /^\s*$/d\' '
             '{}-2'.format(log_file))
-    ssh_client.run_command('cat {}-2 >> {}'.format(log_file, dest_file))
-    ssh_client.run_command('rm {}-2'.format(log_file))
-    ssh_client.run_command('gzip {}{}.perf.log'.format(log_dir, log_prefix))
+    commands.append('cat {}-2 >> {}'.format(log_file, dest_file))
+    commands.append('rm {}-2'.format(log_file))
+    commands.append('gzip {}{}.perf.log'.format(log_dir, log_prefix))
+    ssh_client.run_commands(commands)
 
     ssh_client.get_file(dest_file_gz, local_file_name)
     ssh_client.run_command('rm -f {}'.format(dest_file_gz))
 
 
+def collect_log_segments(ssh_client, log_prefix, local_dir):
+    """Collects the rotated (gzipped) segments and the current log of a single log prefix (ex. evm)
+    as separate files, so they can be parsed in parallel.
+
+    Returns: List of the local file paths, oldest first
+    """
+    log_dir = '/var/www/miq/vmdb/log/'
+    log_file = '{}{}.log'.format(log_dir, log_prefix)
+    dest_file = '{}{}.perf.log'.format(log_dir, log_prefix)
+
+    remote_files = []
+    # Copy the current log, so it isn't collected while being written to
+    (status, out), _ = ssh_client.run_commands([
+        'ls -1 {}-*'.format(log_file), 'cp {} {}'.format(log_file, dest_file)])
+    if status == 0:
+        # Rotated logs are suffixed with the date, so they sort oldest first
+        remote_files.extend(sorted(out.strip().split('\n')))
+    remote_files.append(dest_file)
+
+    local_files = []
+    for remote_file in remote_files:
+        local_file = os.path.join(local_dir, os.path.basename(remote_file))
+        ssh_client.get_file(remote_file, local_file)
+        local_files.append(local_file)
+    ssh_client.run_command('rm -f {}'.format(dest_file))
+    return local_files
+
+
 def convert_top_mem_to_mib(top_mem):
     """Takes a top memory unit from top_output.log and converts it to MiB"""
     if top_mem[-1:] == 'm':
@@ -53,6 +82,19 @@ def convert_top_mem_to_mib(top_mem):
     return num
 
 
+def convert_top_mem_to_mib_array(top_mems, units):
+    """Converts top memory values to MiB, like :py:func:`convert_top_mem_to_mib` for many values
+
+    Args:
+        top_mems: Sequence of the memory values without their unit
+        units: Sequence of the units of the values, ``'m'``, ``'g'`` or anything else for KiB
+    """
+    top_mems = numpy.asarray(top_mems, dtype=float)
+    units = numpy.asarray(units)
+    factors = numpy.where(units == 'm', 1., numpy.where(units == 'g', 1024., 1 / 1024.))
+    return top_mems * factors
+
+
 def generate_statistics(the_list, decimals=2):
     """Returns comma seperated statistics over a list of numbers.
 
@@ -75,6 +117,27 @@ def generate_statistics(the_list, decimals=2):
             percentile99]
 
 
+def generate_statistics_rows(rows, decimals=2):
+    """Returns the statistics of :py:func:`generate_statistics` for each row of a 2d array.
+
+    All of the rows have the same number of samples, so the statistics are computed for every
+    row at once.
+    """
+    rows = numpy.asarray(rows, dtype=float)
+    if rows.shape[1] == 0:
+        return [[0, 0, 0, 0, 0, 0, 0, 0] for row in rows]
+    columns = [
+        numpy.amin(rows, axis=1),
+        numpy.average(rows, axis=1),
+        numpy.median(rows, axis=1),
+        numpy.amax(rows, axis=1),
+        numpy.std(rows, axis=1),
+        numpy.percentile(rows, 90, axis=1),
+        numpy.percentile(rows, 99, axis=1)]
+    return [[rows.shape[1]] + [round(column[i], decimals) for column in columns]
+        for i in range(rows.shape[0])]
+
+
 def get_worker_pid(worker_type):
     """Obtains the pid of the first worker with the worker_type specified"""
     ssh_client = SSHClient()
@@ -97,8 +160,7 @@ def set_rails_loglevel(level, validate_against_worker='MiqUiWorker'):
     logger.info('Setting log level_rails on appliance to {}'.format(level))
     yaml = get_yaml_config('vmdb')
     if not str(yaml['log']['level_rails']).lower() == level.lower():
-        logger.info('Opening /var/www/miq/vmdb/log/evm.log for tail')
-        evm_tail = SSHTail('/var/www/miq/vmdb/log/evm.log')
+        evm_tail = SSHTail('/var/www/miq/vmdb/log/evm.log', line_filter=ui_worker_pid)
         evm_tail.set_initial_file_end()
 
         yaml['log']['level_rails'] = level
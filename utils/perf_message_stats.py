@@ -4,13 +4,19 @@ appliance.
 """
 from utils.log import logger
 from utils.path import log_path
-from utils.perf import convert_top_mem_to_mib
+from utils.perf import convert_top_mem_to_mib_array
 from utils.perf import generate_statistics
 from datetime import datetime
 import dateutil.parser as du_parser
 from datetime import timedelta
 from time import time
+from array import array
+import calendar
+from functools import partial
+from itertools import imap, izip
+from multiprocessing import Pool, cpu_count
 import csv
+import gzip
 import numpy
 import os
 import pygal
@@ -42,6 +48,15 @@ miqwkr = re.compile(r'MIQ\(([A-Za-z]*)\)\sID\s\[([0-9]*)\],\sPID\s\[([0-9]*)\]')
 miqwkr_id = re.compile(r'with\sID:\s\[([0-9]*)\]')
 # For use with workers exiting, such as authentication failures:
 miqwkr_id_2 = re.compile(r'ID\s\[([0-9]*)\]')
+# Any line relevant to workers
+miqwkr_line = re.compile(r'Interrupt|MIQ\([A-Za-z]*\) ID|"evm_worker_uptime_exceeded|'
+    r'"evm_worker_memory_exceeded|"evm_worker_stop|Worker exiting.')
+
+# Line charts with more values per line than this are drawn without dots
+CHART_DOTS_LIMIT = 200
+
+# evm.log files are split into chunks of this many bytes to be parsed in parallel
+EVM_CHUNK_SIZE = 64 * 1024 * 1024
 
 # top regular expressions
 # Cpu(s): 13.7%us,  1.2%sy,  2.1%ni, 80.0%id,  1.7%wa,  0.0%hi,  0.1%si,  1.3%st
@@ -55,237 +70,110 @@ miq_swap = re.compile(r'Swap:\s+([0-9]*)k\stotal,\s+([0-9]*)k\sused,\s+([0-9]*)k
     r'([0-9]*)k\scached')
 # PID PPID USER PR NI VIRT RES SHR S %CPU %MEM TIME+  COMMAND
 # 17526 2320 root 30 10 324m 9.8m 2444 S 0.0 0.2 0:09.38 /var/www/miq/vmdb/lib/workers/bin/worker.rb
-miq_top = re.compile(r'([0-9]+)\s+[0-9]+\s+[A-Za-z0-9]+\s+[0-9]+\s+[0-9\-]+\s+([0-9\.mg]+)\s+'
-    r'([0-9\.mg]+)\s+([0-9\.mg]+)\s+[SRDZ]\s+([0-9\.]+)\s+([0-9\.]+)')
-
-
-def evm_to_messages(evm_file, filters):
-    test_start = ''
-    test_end = ''
-    line_count = 0
-    messages = {}
-    msg_cmds = {}
-
-    runningtime = time()
-    evmlogfile = open(evm_file, 'r')
-    evm_log_line = evmlogfile.readline()
-    while evm_log_line:
-        line_count += 1
-        evm_log_line = evm_log_line.strip()
-
-        miqmsg_result = miqmsg.search(evm_log_line)
-        if miqmsg_result:
-
-            # Obtains the first timestamp in the log file
-            if test_start == '':
-                ts, pid = get_msg_timestamp_pid(evm_log_line)
-                test_start = ts
-
-            # A message was first put on the queue, this starts its queuing time
-            if (miqmsg_result.group(1) == 'MiqQueue.put'):
-
-                msg_cmd = get_msg_cmd(evm_log_line)
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    ts, pid = get_msg_timestamp_pid(evm_log_line)
-                    test_end = ts
-                    messages[msg_id] = MiqMsgStat()
-                    messages[msg_id].msg_id = msg_id
-                    messages[msg_id].msg_id = '\'' + msg_id + '\''
-                    messages[msg_id].msg_cmd = msg_cmd
-                    messages[msg_id].pid_put = pid
-                    messages[msg_id].puttime = ts
-                    msg_args = get_msg_args(evm_log_line)
-                    if msg_args is False:
-                        logger.debug('Could not obtain message args line #: {}'.format(line_count))
-                    else:
-                        messages[msg_id].msg_args = msg_args
-                else:
-                    logger.error('Could not obtain message id, line #: {}'.format(line_count))
-
-            elif (miqmsg_result.group(1) == 'MiqQueue.get_via_drb'):
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    if msg_id in messages:
-                        ts, pid = get_msg_timestamp_pid(evm_log_line)
-                        test_end = ts
-                        messages[msg_id].pid_get = pid
-                        messages[msg_id].gettime = ts
-                        messages[msg_id].deq_time = get_msg_deq(evm_log_line)
-                    else:
-                        logger.error('Message ID not in dictionary: {}'.format(msg_id))
-                else:
-                    logger.error('Could not obtain message id, line #: {}'.format(line_count))
-
-            elif (miqmsg_result.group(1) == 'MiqQueue.delivered'):
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    ts, pid = get_msg_timestamp_pid(evm_log_line)
-                    test_end = ts
-                    if msg_id in messages:
-                        messages[msg_id].del_time = get_msg_del(evm_log_line)
-                        messages[msg_id].total_time = messages[msg_id].deq_time + \
-                            messages[msg_id].del_time
-                    else:
-                        logger.error('Message ID not in dictionary: {}'.format(msg_id))
-                else:
-                    logger.error('Could not obtain message id, line #: {}'.format(line_count))
-
-        if (line_count % 100000) == 0:
+miq_top = re.compile(r'([0-9]+)\s+[0-9]+\s+[A-Za-z0-9]+\s+[0-9]+\s+[0-9\-]+\s+([0-9\.]+)([mg]?)\s+'
+    r'([0-9\.]+)([mg]?)\s+([0-9\.]+)([mg]?)\s+[SRDZ]\s+([0-9\.]+)\s+([0-9\.]+)')
+
+
+def evm_log_chunks(evm_files, chunk_size=EVM_CHUNK_SIZE):
+    """Splits evm.log segments into chunks that can be parsed independently
+
+    Plain files are split into byte ranges of about ``chunk_size`` bytes, gzipped (rotated)
+    segments can't be seeked in and are a single chunk each.
+
+    Args:
+        evm_files: Paths of the log segments, oldest first
+        chunk_size: Size of the byte range chunks
+
+    Returns: List of ``(path, start, end)`` tuples, in log order
+    """
+    chunks = []
+    for evm_file in evm_files:
+        if evm_file.endswith('.gz'):
+            chunks.append((evm_file, 0, None))
+            continue
+        size = os.path.getsize(evm_file)
+        for start in range(0, size, chunk_size):
+            chunks.append((evm_file, start, min(start + chunk_size, size)))
+    return chunks
+
+
+def evm_to_stats(evm_files, filters, rawdata_writer=None, workers=1,
+        chunk_size=EVM_CHUNK_SIZE):
+    """Parses evm.log segments for messages and workers
+
+    The segments are split into chunks (see :py:func:`evm_log_chunks`), which are parsed by
+    a pool of ``workers`` processes. The parsed chunks are then added to an
+    :py:class:`EvmLogParser` in log order, which follows messages and workers across chunk
+    boundaries, so the results don't depend on the number of workers.
+
+    Args:
+        evm_files: Path of the evm.log, or list of paths of its segments, oldest first
+        filters: Dict of command suffix to compiled regex, matched against message args
+        rawdata_writer: Optional :py:class:`csv.DictWriter`, each message is written to it when it
+            is retired
+        workers: Number of processes parsing the chunks, ``1`` parses them in this process
+        chunk_size: Size in bytes of the chunks plain files are split into
+
+    Returns: The :py:class:`EvmLogParser` holding the results
+    """
+    if isinstance(evm_files, basestring):
+        evm_files = [evm_files]
+    parser = EvmLogParser(rawdata_writer)
+    chunks = evm_log_chunks(evm_files, chunk_size)
+    parse_chunk = partial(parse_evm_chunk, filters=filters)
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        parsed_chunks = pool.imap(parse_chunk, chunks) if pool else imap(parse_chunk, chunks)
+        runningtime = time()
+        for chunk, (events, line_count, worker_line_count) in izip(chunks, parsed_chunks):
+            parser.add_chunk(events, line_count, worker_line_count)
             timediff = time() - runningtime
             runningtime = time()
-            logger.info('Count {} : Parsed 100000 lines in {}'.format(line_count, timediff))
-
-        evm_log_line = evmlogfile.readline()
-
-    # I tried to avoid two loops but this reduced the complexity of filtering on messages.
-    # By filtering over messages, we can better display what is occuring under the covers, as a
-    # daily rollup is picked up off the queue different than a hourly rollup, etc
-    for msg in sorted(messages.keys()):
-        msg_args = messages[msg].msg_args
-        # Determine if the pattern matches and append to the command if it does
-        for p_filter in filters:
-            results = filters[p_filter].search(msg_args.strip())
-            if results:
-                messages[msg].msg_cmd = '{}{}'.format(messages[msg].msg_cmd, p_filter)
-                break
-        msg_cmd = messages[msg].msg_cmd
-        if msg_cmd not in msg_cmds:
-            msg_cmds[msg_cmd] = {}
-            msg_cmds[msg_cmd]['total'] = []
-            msg_cmds[msg_cmd]['queue'] = []
-            msg_cmds[msg_cmd]['execute'] = []
-        if messages[msg].total_time != 0:
-            msg_cmds[msg_cmd]['total'].append(round(messages[msg].total_time, 2))
-            msg_cmds[msg_cmd]['queue'].append(round(messages[msg].deq_time, 2))
-            msg_cmds[msg_cmd]['execute'].append(round(messages[msg].del_time, 2))
-
-    return messages, msg_cmds, test_start, test_end, line_count
-
-
-def evm_to_workers(evm_file):
-    # Use grep to reduce # of lines to sort through
-    p = subprocess.Popen(['grep', 'Interrupt\\|MIQ([A-Za-z]*) ID\\|"evm_worker_uptime_exceeded\\|'
-            '"evm_worker_memory_exceeded\\|"evm_worker_stop\\|Worker exiting.', evm_file],
-            stdout=subprocess.PIPE)
-    greppedevmlog, err = p.communicate()
-    greppedevmlog = greppedevmlog.strip()
-
-    evmlines = greppedevmlog.split('\n')
-
-    workers = {}
-    wkr_upt_exc = 0
-    wkr_mem_exc = 0
-    wkr_stp = 0
-    wkr_int = 0
-    wkr_ext = 0
-    for evm_log_line in evmlines:
-        ts, pid = get_msg_timestamp_pid(evm_log_line)
-
-        miqwkr_result = miqwkr.search(evm_log_line)
-        if miqwkr_result:
-            workerid = int(miqwkr_result.group(2))
-            if workerid not in workers:
-                workers[workerid] = MiqWorker()
-                workers[workerid].worker_type = miqwkr_result.group(1)
-                workers[workerid].pid = miqwkr_result.group(3)
-                workers[workerid].worker_id = int(workerid)
-                workers[workerid].start_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_uptime_exceeded' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_upt_exc += 1
-                        workers[workerid].terminated = 'evm_worker_uptime_exceeded'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_memory_exceeded' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_mem_exc += 1
-                        workers[workerid].terminated = 'evm_worker_memory_exceeded'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_stop' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_stp += 1
-                        workers[workerid].terminated = 'evm_worker_stop'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'Interrupt' in evm_log_line:
-            for workerid in workers:
-                if not workers[workerid].end_ts:
-                    wkr_int += 1
-                    workers[workerid].terminated = 'Interrupted'
-                    workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'Worker exiting.' in evm_log_line:
-            miqwkr_id_2_result = miqwkr_id_2.search(evm_log_line)
-            if miqwkr_id_2_result:
-                workerid = int(miqwkr_id_2_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_ext += 1
-                        workers[workerid].terminated = 'Worker Exited'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-
-    return workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, len(evmlines)
+            logger.info('Count {} : Parsed {} lines of {} ({}-{}) in {}'.format(
+                parser.line_count, line_count, os.path.basename(chunk[0]), chunk[1],
+                chunk[2] if chunk[2] is not None else 'end', timediff))
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+    parser.finish()
+    return parser
 
 
 def split_appliance_charts(top_appliance, charts_dir):
-    # Automatically split top_output data roughly per day
-    minutes_in_a_day = 24 * 60
-    size_data = len(top_appliance['datetimes'])
-    start_hour = top_appliance['datetimes'][0][11:13]
-    start_minute = top_appliance['datetimes'][0][14:16]
-    bracket_end = minutes_in_a_day - ((int(start_hour) * 60) + int(start_minute))
-
-    if size_data > minutes_in_a_day:
-        # Greater than one day worth of data, split
-        file_names = [generate_appliance_charts(top_appliance, charts_dir, 0, bracket_end)]
-        for start_bracket in range(bracket_end, len(top_appliance['datetimes']), minutes_in_a_day):
-            if (start_bracket + minutes_in_a_day) > size_data:
-                end_index = size_data - 1
-            else:
-                end_index = start_bracket + minutes_in_a_day
-            file_names.append(generate_appliance_charts(top_appliance, charts_dir, start_bracket,
-                end_index))
-        return file_names
-    else:
-        # Less than one day worth of data, do not split
-        return [generate_appliance_charts(top_appliance, charts_dir, 0, size_data - 1)]
+    # Split top_output data per day
+    timestamps = top_appliance['timestamps']
+    days = numpy.arange(timestamps[0] // 86400 + 1, timestamps[-1] // 86400 + 1) * 86400
+    bounds = [0] + list(numpy.searchsorted(timestamps, days)) + [len(timestamps)]
+    return [generate_appliance_charts(top_appliance, charts_dir, start_index, end_index)
+        for start_index, end_index in zip(bounds[:-1], bounds[1:]) if start_index < end_index]
 
 
 def generate_appliance_charts(top_appliance, charts_dir, start_index, end_index):
-    cpu_chart_file = '/{}-app-cpu.svg'.format(top_appliance['datetimes'][start_index])
-    mem_chart_file = '/{}-app-mem.svg'.format(top_appliance['datetimes'][start_index])
+    datetimes = top_datetimes(top_appliance['timestamps'][start_index:end_index])
+    cpu_chart_file = '/{}-app-cpu.svg'.format(datetimes[0])
+    mem_chart_file = '/{}-app-mem.svg'.format(datetimes[0])
 
     lines = {}
-    lines['Idle'] = top_appliance['cpuid'][start_index:end_index]
-    lines['User'] = top_appliance['cpuus'][start_index:end_index]
-    lines['System'] = top_appliance['cpusy'][start_index:end_index]
-    lines['Nice'] = top_appliance['cpuni'][start_index:end_index]
-    lines['Wait'] = top_appliance['cpuwa'][start_index:end_index]
+    lines['Idle'] = top_appliance['cpuid'][start_index:end_index].tolist()
+    lines['User'] = top_appliance['cpuus'][start_index:end_index].tolist()
+    lines['System'] = top_appliance['cpusy'][start_index:end_index].tolist()
+    lines['Nice'] = top_appliance['cpuni'][start_index:end_index].tolist()
+    lines['Wait'] = top_appliance['cpuwa'][start_index:end_index].tolist()
     # lines['Hi'] = top_appliance['cpuhi'][start_index:end_index]  # IRQs %
     # lines['Si'] = top_appliance['cpusi'][start_index:end_index]  # Soft IRQs %
     # lines['St'] = top_appliance['cpust'][start_index:end_index]  # Steal CPU %
-    line_chart_render('CPU Usage', 'Date Time', 'Percent',
-        top_appliance['datetimes'][start_index:end_index], lines, charts_dir.join(cpu_chart_file),
-        True)
+    line_chart_render('CPU Usage', 'Date Time', 'Percent', datetimes, lines,
+        charts_dir.join(cpu_chart_file), True)
 
     lines = {}
-    lines['Memory Total'] = top_appliance['memtot'][start_index:end_index]
-    lines['Memory Free'] = top_appliance['memfre'][start_index:end_index]
-    lines['Memory Used'] = top_appliance['memuse'][start_index:end_index]
-    lines['Swap Used'] = top_appliance['swause'][start_index:end_index]
-    lines['cached'] = top_appliance['cached'][start_index:end_index]
-    line_chart_render('Memory Usage', 'Date Time', 'KiB',
-        top_appliance['datetimes'][start_index:end_index], lines, charts_dir.join(mem_chart_file))
+    lines['Memory Total'] = top_appliance['memtot'][start_index:end_index].tolist()
+    lines['Memory Free'] = top_appliance['memfre'][start_index:end_index].tolist()
+    lines['Memory Used'] = top_appliance['memuse'][start_index:end_index].tolist()
+    lines['Swap Used'] = top_appliance['swause'][start_index:end_index].tolist()
+    lines['cached'] = top_appliance['cached'][start_index:end_index].tolist()
+    line_chart_render('Memory Usage', 'Date Time', 'KiB', datetimes, lines,
+        charts_dir.join(mem_chart_file))
     return cpu_chart_file, mem_chart_file
 
 
@@ -378,18 +266,19 @@ def generate_worker_charts(workers, top_workers, charts_dir):
             workers[worker].worker_type))
         worker_name = '{}-{}'.format(worker, workers[worker].worker_type)
 
+        datetimes = top_datetimes(top_workers[worker]['timestamps'])
+
         lines = {}
-        lines['Virt Mem'] = top_workers[worker]['virt']
-        lines['Res Mem'] = top_workers[worker]['res']
-        lines['Shared Mem'] = top_workers[worker]['share']
-        line_chart_render(worker_name, 'Date Time', 'Memory in MiB',
-            top_workers[worker]['datetimes'], lines,
+        lines['Virt Mem'] = top_workers[worker]['virt'].tolist()
+        lines['Res Mem'] = top_workers[worker]['res'].tolist()
+        lines['Shared Mem'] = top_workers[worker]['share'].tolist()
+        line_chart_render(worker_name, 'Date Time', 'Memory in MiB', datetimes, lines,
             charts_dir.join('/{}-Memory.svg'.format(worker_name)))
 
         lines = {}
-        lines['CPU %'] = top_workers[worker]['cpu_per']
-        line_chart_render(worker_name, 'Date Time', 'CPU Usage', top_workers[worker]['datetimes'],
-            lines, charts_dir.join('/{}-CPU.svg'.format(worker_name)))
+        lines['CPU %'] = top_workers[worker]['cpu_per'].tolist()
+        line_chart_render(worker_name, 'Date Time', 'CPU Usage', datetimes, lines,
+            charts_dir.join('/{}-CPU.svg'.format(worker_name)))
 
 
 def get_first_miqtop(top_log_file):
@@ -472,82 +361,17 @@ def line_chart_render(title, xtitle, ytitle, x_labels, lines, fname, stacked=Fal
     line_chart.legend_font_size = 8
     line_chart.truncate_legend = 26
     line_chart.x_labels = x_labels
+    # A dot per value makes rendering long series (ex. a day of top samples) slow, and the dots
+    # would overlap anyway
+    if max(len(values) for values in lines.itervalues()) > CHART_DOTS_LIMIT:
+        line_chart.show_dots = False
     sortedlines = sorted(lines.keys())
     for line in sortedlines:
         line_chart.add(line, lines[line])
     line_chart.render_to_file(str(fname))
 
 
-def messages_to_hourly_buckets(messages, test_start, test_end):
-    hr_bkt = {}
-    # Hour buckets look like: hr_bkt[msg_cmd][msg_date][msg_hour] = MiqMsgBucket()
-    for msg in messages:
-        # put on queue, deals with queuing:
-        msg_cmd = messages[msg].msg_cmd
-        putdate = messages[msg].puttime[:10]
-        puthour = messages[msg].puttime[11:13]
-        if msg_cmd not in hr_bkt:
-            hr_bkt[msg_cmd] = provision_hour_buckets(test_start, test_end)
-
-        hr_bkt[msg_cmd][putdate][puthour].total_put += 1
-        hr_bkt[msg_cmd][putdate][puthour].sum_deq += messages[msg].deq_time
-        if (hr_bkt[msg_cmd][putdate][puthour].min_deq == 0 or
-                hr_bkt[msg_cmd][putdate][puthour].min_deq > messages[msg].deq_time):
-            hr_bkt[msg_cmd][putdate][puthour].min_deq = messages[msg].deq_time
-        if (hr_bkt[msg_cmd][putdate][puthour].max_deq == 0 or
-                hr_bkt[msg_cmd][putdate][puthour].max_deq < messages[msg].deq_time):
-            hr_bkt[msg_cmd][putdate][puthour].max_deq = messages[msg].deq_time
-        hr_bkt[msg_cmd][putdate][puthour].avg_deq = \
-            hr_bkt[msg_cmd][putdate][puthour].sum_deq / hr_bkt[msg_cmd][putdate][puthour].total_put
-
-        # Get time is when the message is delivered
-        getdate = messages[msg].gettime[:10]
-        gethour = messages[msg].gettime[11:13]
-
-        hr_bkt[msg_cmd][getdate][gethour].total_get += 1
-        hr_bkt[msg_cmd][getdate][gethour].sum_del += messages[msg].del_time
-        if (hr_bkt[msg_cmd][getdate][gethour].min_del == 0 or
-                hr_bkt[msg_cmd][getdate][gethour].min_del > messages[msg].del_time):
-            hr_bkt[msg_cmd][getdate][gethour].min_del = messages[msg].del_time
-        if (hr_bkt[msg_cmd][getdate][gethour].max_del == 0 or
-                hr_bkt[msg_cmd][getdate][gethour].max_del < messages[msg].del_time):
-            hr_bkt[msg_cmd][getdate][gethour].max_del = messages[msg].del_time
-
-        hr_bkt[msg_cmd][getdate][gethour].avg_del = \
-            hr_bkt[msg_cmd][getdate][gethour].sum_del / hr_bkt[msg_cmd][getdate][gethour].total_get
-    return hr_bkt
-
-
-def messages_to_statistics_csv(messages, statistics_file_name):
-    all_statistics = []
-    for msg_id in messages:
-        msg = messages[msg_id]
-
-        added = False
-        if len(all_statistics) > 0:
-            for msg_statistics in all_statistics:
-                if msg_statistics.cmd == msg.msg_cmd:
-
-                    if msg.del_time > 0:
-                        msg_statistics.delivertimes.append(float(msg.del_time))
-                        msg_statistics.gets += 1
-                    msg_statistics.dequeuetimes.append(float(msg.deq_time))
-                    msg_statistics.totaltimes.append(float(msg.total_time))
-                    msg_statistics.puts += 1
-                    added = True
-                    break
-
-        if not added:
-            msg_statistics = MiqMsgLists()
-            msg_statistics.cmd = msg.msg_cmd
-            if msg.del_time > 0:
-                msg_statistics.delivertimes.append(float(msg.del_time))
-                msg_statistics.gets = 1
-            msg_statistics.dequeuetimes.append(float(msg.deq_time))
-            msg_statistics.totaltimes.append(float(msg.total_time))
-            msg_statistics.puts = 1
-            all_statistics.append(msg_statistics)
-
+def msg_times_to_statistics_csv(msg_times, statistics_file_name):
     csvdata_path = log_path.join('csv_output', statistics_file_name)
     outputfile = csvdata_path.open('w', ensure=True)
 
@@ -563,23 +387,143 @@ def messages_to_statistics_csv(messages, statistics_file_name):
         csvfile.writerow(headers)
 
         # Contents of CSV
-        for msg_statistics in sorted(all_statistics, key=lambda x: x.cmd):
-            if msg_statistics.gets > 1:
+        for cmd in sorted(msg_times):
+            times = msg_times[cmd]
+            dequeuetimes = numpy.array(times.deq_times)
+            delivertimes = numpy.array(times.del_times)
+            totaltimes = numpy.array(times.total_times)
+            if times.gets > 1:
                 logger.debug('Samples/Avg/90th/Std: {} : {} : {} : {},Cmd: {}'.format(
-                    str(len(msg_statistics.totaltimes)).rjust(7),
-                    str(round(numpy.average(msg_statistics.totaltimes), 3)).rjust(7),
-                    str(round(numpy.percentile(msg_statistics.totaltimes, 90), 3)).rjust(7),
-                    str(round(numpy.std(msg_statistics.totaltimes), 3)).rjust(7),
-                    msg_statistics.cmd))
-            stats = [msg_statistics.cmd, msg_statistics.puts, msg_statistics.gets]
-            stats.extend(generate_statistics(msg_statistics.dequeuetimes, 3))
-            stats.extend(generate_statistics(msg_statistics.delivertimes, 3))
-            stats.extend(generate_statistics(msg_statistics.totaltimes, 3))
+                    str(len(totaltimes)).rjust(7),
+                    str(round(numpy.average(totaltimes), 3)).rjust(7),
+                    str(round(numpy.percentile(totaltimes, 90), 3)).rjust(7),
+                    str(round(numpy.std(totaltimes), 3)).rjust(7),
+                    cmd))
+            stats = [cmd, times.puts, times.gets]
+            stats.extend(generate_statistics(dequeuetimes, 3))
+            stats.extend(generate_statistics(delivertimes[delivertimes > 0], 3))
+            stats.extend(generate_statistics(totaltimes, 3))
             csvfile.writerow(stats)
     finally:
         outputfile.close()
 
 
+def msg_times_to_total_time_lists(msg_times):
+    """Builds the per command lists of (rounded) timings of completed messages for charting"""
+    msg_cmds = {}
+    for cmd, times in msg_times.iteritems():
+        completed = [i for i, total_time in enumerate(times.total_times) if total_time != 0]
+        msg_cmds[cmd] = {
+            'total': [round(times.total_times[i], 2) for i in completed],
+            'queue': [round(times.deq_times[i], 2) for i in completed],
+            'execute': [round(times.del_times[i], 2) for i in completed],
+        }
+    return msg_cmds
+
+
+def parse_evm_chunk(chunk, filters=None):
+    """Parses a chunk of an evm.log into events for :py:meth:`EvmLogParser.add_chunk`
+
+    The chunk holds the lines starting within its byte range. Events are tuples of the event
+    type and its data, line numbers in them are relative to the chunk.
+
+    Args:
+        chunk: ``(path, start, end)`` as returned by :py:func:`evm_log_chunks`
+        filters: Dict of command suffix to compiled regex, matched against message args
+
+    Returns: Tuple of the events, the number of lines and the number of worker lines
+    """
+    path, start, end = chunk
+    events = []
+    line_count = 0
+    worker_line_count = 0
+    started = False
+    if end is None:
+        evmlogfile = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'r')
+        lines = evmlogfile
+    else:
+        evmlogfile = open(path, 'r')
+        lines = _chunk_lines(evmlogfile, start, end)
+    try:
+        for evm_log_line in lines:
+            line_count += 1
+            if 'MIQ(' in evm_log_line:
+                miqmsg_result = miqmsg.search(evm_log_line)
+                if miqmsg_result:
+                    evm_log_line = evm_log_line.strip()
+                    if not started:
+                        started = True
+                        events.append(('start', get_msg_timestamp_pid(evm_log_line)[0]))
+                    _message_event(events, miqmsg_result.group(1), evm_log_line, line_count,
+                        filters or {})
+            if miqwkr_line.search(evm_log_line):
+                worker_line_count += 1
+                _worker_event(events, evm_log_line.strip())
+    finally:
+        evmlogfile.close()
+    return events, line_count, worker_line_count
+
+
+def _chunk_lines(evmlogfile, start, end):
+    # Lines belong to the chunk they start in, so skip the rest of a line started before
+    if start > 0:
+        evmlogfile.seek(start - 1)
+        evmlogfile.readline()
+    position = evmlogfile.tell()
+    while position < end:
+        evm_log_line = evmlogfile.readline()
+        if not evm_log_line:
+            break
+        position += len(evm_log_line)
+        yield evm_log_line
+
+
+def _message_event(events, miq_method, evm_log_line, line_no, filters):
+    if miq_method == 'MiqQueue.put':
+        msg_cmd = get_msg_cmd(evm_log_line)
+        msg_args = get_msg_args(evm_log_line)
+        # Filtering on message args better displays what is occuring under the covers, as a
+        # daily rollup is picked up off the queue different than a hourly rollup, etc
+        for p_filter in filters:
+            if filters[p_filter].search((msg_args or '').strip()):
+                msg_cmd = '{}{}'.format(msg_cmd, p_filter)
+                break
+        ts, pid = get_msg_timestamp_pid(evm_log_line)
+        events.append(('put', line_no, get_msg_id(evm_log_line), msg_cmd, ts, pid, msg_args))
+    elif miq_method == 'MiqQueue.get_via_drb':
+        ts, pid = get_msg_timestamp_pid(evm_log_line)
+        events.append(('get', line_no, get_msg_id(evm_log_line), ts, pid,
+            get_msg_deq(evm_log_line)))
+    elif miq_method == 'MiqQueue.delivered':
+        ts, pid = get_msg_timestamp_pid(evm_log_line)
+        events.append(('delivered', line_no, get_msg_id(evm_log_line), ts,
+            get_msg_del(evm_log_line)))
+
+
+def _worker_event(events, evm_log_line):
+    ts, pid = get_msg_timestamp_pid(evm_log_line)
+    miqwkr_result = miqwkr.search(evm_log_line)
+    if miqwkr_result:
+        events.append(('worker', miqwkr_result.group(1), int(miqwkr_result.group(2)),
+            miqwkr_result.group(3), ts))
+    elif 'evm_worker_uptime_exceeded' in evm_log_line:
+        _terminated_event(events, miqwkr_id, evm_log_line, ts, 'evm_worker_uptime_exceeded')
+    elif 'evm_worker_memory_exceeded' in evm_log_line:
+        _terminated_event(events, miqwkr_id, evm_log_line, ts, 'evm_worker_memory_exceeded')
+    elif 'evm_worker_stop' in evm_log_line:
+        _terminated_event(events, miqwkr_id, evm_log_line, ts, 'evm_worker_stop')
+    elif 'Interrupt' in evm_log_line:
+        events.append(('interrupt', ts))
+    elif 'Worker exiting.' in evm_log_line:
+        _terminated_event(events, miqwkr_id_2, evm_log_line, ts, 'Worker Exited')
+
+
+def _terminated_event(events, id_regex, evm_log_line, ts, reason):
+    id_result = id_regex.search(evm_log_line)
+    if id_result:
+        events.append(('terminated', int(id_result.group(1)), reason, ts))
+
+
 def provision_hour_buckets(test_start, test_end, init=True):
     buckets = {}
     start_date = datetime.strptime(test_start[:10], '%Y-%m-%d')
@@ -613,7 +557,47 @@ def provision_hour_buckets(test_start, test_end, init=True):
     return buckets
 
 
+def top_datetimes(timestamps):
+    """Formats epoch timestamps of top samples as chart labels (``YYYY-MM-DD HH:MM:SS``)"""
+    return [dt.replace('T', ' ')
+        for dt in numpy.asarray(timestamps, dtype='int64').astype('datetime64[s]').astype(str)]
+
+
+def round_mib(values):
+    """Rounds an array to 2 decimals, half away from zero like :py:func:`round`"""
+    return numpy.sign(values) * numpy.floor(numpy.abs(values) * 100 + .5) / 100
+
+
+def _top_time(top_line, miqtop_time, timezone_offset, miqtop_ahead):
+    # top - 11:00:43
+    cur_hour = int(top_line[6:8])
+    cur_min = int(top_line[9:11])
+    cur_sec = int(top_line[12:14])
+    if miqtop_ahead and cur_hour > miqtop_time.hour:
+        # Have not found miqtop date/time yet so we must rely on miqtop date/time "ahead"
+        logger.info('miqtop_time is ahead by one day')
+        miqtop_time = miqtop_time - timedelta(days=1)
+    cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
+        - timedelta(hours=timezone_offset)
+    # Timestamps are seconds since the epoch of the (naive) appliance time
+    return cur_time, calendar.timegm(cur_time.timetuple())
+
+
+def _miqtop_time(top_line):
+    # miqtop: .* is-> Mon Jan 26 08:57:39 EST 2015 -0500
+    str_start = top_line.index('is->')
+    miqtop_time = du_parser.parse(top_line[str_start:], fuzzy=True, ignoretz=True)
+    # Time logged in top is the system's time which is ahead/behind by the timezone offset
+    timezone_offset = int(top_line[str_start + 34:str_start + 37])
+    return miqtop_time - timedelta(hours=timezone_offset), timezone_offset
+
+
 def top_to_appliance(top_file):
+    """Parses the appliance CPU, memory and swap usage of top_output.log
+
+    Returns: Tuple of a dict of numpy arrays (``timestamps`` as epoch seconds, memory in MiB)
+        and the number of parsed lines
+    """
     # Find first miqtop log line
     miqtop_time, timezone_offset = get_first_miqtop(top_file)
 
@@ -628,72 +612,43 @@ def top_to_appliance(top_file):
     top_lines = greppedtop.strip().split('\n')
     line_count = 0
 
-    top_keys = ['datetimes', 'cpuus', 'cpusy', 'cpuni', 'cpuid', 'cpuwa', 'cpuhi', 'cpusi', 'cpust',
-        'memtot', 'memuse', 'memfre', 'buffer', 'swatot', 'swause', 'swafre', 'cached']
-    top_app = dict((key, []) for key in top_keys)
+    cpu_keys = ['cpuus', 'cpusy', 'cpuni', 'cpuid', 'cpuwa', 'cpuhi', 'cpusi', 'cpust']
+    mem_keys = ['memtot', 'memuse', 'memfre', 'buffer']
+    swap_keys = ['swatot', 'swause', 'swafre', 'cached']
+    timestamps = array('l')
+    columns = dict((key, array('d')) for key in cpu_keys + mem_keys + swap_keys)
 
-    cur_time = None
+    cur_timestamp = 0
     miqtop_ahead = True
     runningtime = time()
     for top_line in top_lines:
         line_count += 1
         if 'top - ' in top_line:
-            # top - 11:00:43
-            cur_hour = int(top_line[6:8])
-            cur_min = int(top_line[9:11])
-            cur_sec = int(top_line[12:14])
-            if miqtop_ahead:
-                # Have not found miqtop date/time yet so we must rely on miqtop date/time "ahead"
-                if cur_hour <= miqtop_time.hour:
-                    cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
-                else:
-                    # miqtop_time is ahead by date
-                    logger.info('miqtop_time is ahead by one day')
-                    cur_time = miqtop_time - timedelta(days=1)
-                    cur_time = cur_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
-            else:
-                cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                    - timedelta(hours=timezone_offset)
+            cur_time, cur_timestamp = _top_time(top_line, miqtop_time, timezone_offset,
+                miqtop_ahead)
         elif 'miqtop: ' in top_line:
             miqtop_ahead = False
-            # miqtop: .* is-> Mon Jan 26 08:57:39 EST 2015 -0500
-            str_start = top_line.index('is->')
-            miqtop_time = du_parser.parse(top_line[str_start:], fuzzy=True, ignoretz=True)
-            # Time logged in top is the system's time which is ahead/behind by the timezone offset
-            timezone_offset = int(top_line[str_start + 34:str_start + 37])
-            miqtop_time = miqtop_time - timedelta(hours=timezone_offset)
+            miqtop_time, timezone_offset = _miqtop_time(top_line)
         elif 'Cpu(s): ' in top_line:
             miq_cpu_result = miq_cpu.search(top_line)
             if miq_cpu_result:
-                top_app['datetimes'].append(str(cur_time))
-                top_app['cpuus'].append(float(miq_cpu_result.group(1).strip()))
-                top_app['cpusy'].append(float(miq_cpu_result.group(2).strip()))
-                top_app['cpuni'].append(float(miq_cpu_result.group(3).strip()))
-                top_app['cpuid'].append(float(miq_cpu_result.group(4).strip()))
-                top_app['cpuwa'].append(float(miq_cpu_result.group(5).strip()))
-                top_app['cpuhi'].append(float(miq_cpu_result.group(6).strip()))
-                top_app['cpusi'].append(float(miq_cpu_result.group(7).strip()))
-                top_app['cpust'].append(float(miq_cpu_result.group(8).strip()))
+                timestamps.append(cur_timestamp)
+                for key, value in zip(cpu_keys, miq_cpu_result.groups()):
+                    columns[key].append(float(value))
             else:
                 logger.error('Issue with miq_cpu regex: {}'.format(top_line))
         elif 'Mem: ' in top_line:
             miq_mem_result = miq_mem.search(top_line)
             if miq_mem_result:
-                top_app['memtot'].append(round(float(miq_mem_result.group(1).strip()) / 1024, 2))
-                top_app['memuse'].append(round(float(miq_mem_result.group(2).strip()) / 1024, 2))
-                top_app['memfre'].append(round(float(miq_mem_result.group(3).strip()) / 1024, 2))
-                top_app['buffer'].append(round(float(miq_mem_result.group(4).strip()) / 1024, 2))
+                for key, value in zip(mem_keys, miq_mem_result.groups()):
+                    columns[key].append(float(value))
             else:
                 logger.error('Issue with miq_mem regex: {}'.format(top_line))
         elif 'Swap: ' in top_line:
             miq_swap_result = miq_swap.search(top_line)
             if miq_swap_result:
-                top_app['swatot'].append(round(float(miq_swap_result.group(1).strip()) / 1024, 2))
-                top_app['swause'].append(round(float(miq_swap_result.group(2).strip()) / 1024, 2))
-                top_app['swafre'].append(round(float(miq_swap_result.group(3).strip()) / 1024, 2))
-                top_app['cached'].append(round(float(miq_swap_result.group(4).strip()) / 1024, 2))
+                for key, value in zip(swap_keys, miq_swap_result.groups()):
+                    columns[key].append(float(value))
             else:
                 logger.error('Issue with miq_swap regex: {}'.format(top_line))
         else:
@@ -702,10 +657,22 @@ def top_to_appliance(top_file):
             timediff = time() - runningtime
             runningtime = time()
             logger.info('Count {} : Parsed 20000 lines in {}'.format(line_count, timediff))
+
+    top_app = {'timestamps': numpy.array(timestamps, dtype='int64')}
+    for key in cpu_keys:
+        top_app[key] = numpy.array(columns[key])
+    for key in mem_keys + swap_keys:
+        # KiB to MiB
+        top_app[key] = round_mib(numpy.array(columns[key]) / 1024)
     return top_app, len(top_lines)
 
 
 def top_to_workers(workers, top_file):
+    """Parses the CPU and memory usage of the workers' processes from top_output.log
+
+    Returns: Tuple of a dict of worker id to a dict of numpy arrays (``timestamps`` as epoch
+        seconds, memory in MiB) and the number of parsed lines
+    """
     # Find first miqtop log line
     miqtop_time, timezone_offset = get_first_miqtop(top_file)
 
@@ -720,82 +687,83 @@ def top_to_workers(workers, top_file):
     timediff = time() - runningtime
     logger.info('Grepped top_output for pids & time data in {}'.format(timediff))
 
+    top_worker_keys = ['virt', 'res', 'share', 'cpu_per', 'mem_per']
+    top_worker_mem_keys = ['virt', 'res', 'share']
+    # pids can be reused, so a pid maps to every worker that had it
+    pid_workers = {}
+    for worker in workers:
+        pid_workers.setdefault(workers[worker].pid, []).append(workers[worker])
+
     # This is very ugly because miqtop does include the date but top does not
     # Also pids can be duplicated, so careful attention to detail on when a pid starts and ends
     top_lines = greppedtop.strip().split('\n')
     line_count = 0
-    top_workers = {}
+    columns = {}
     cur_time = None
+    cur_timestamp = 0
     miqtop_ahead = True
     runningtime = time()
     for top_line in top_lines:
         line_count += 1
         if 'top - ' in top_line:
-            # top - 11:00:43
-            cur_hour = int(top_line[6:8])
-            cur_min = int(top_line[9:11])
-            cur_sec = int(top_line[12:14])
-            if miqtop_ahead:
-                # Have not found miqtop time yet so we must rely on miqtop time "ahead"
-                if cur_hour <= miqtop_time.hour:
-                    cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
-                else:
-                    # miqtop_time is ahead by date
-                    logger.info('miqtop_time is ahead by one day')
-                    cur_time = miqtop_time - timedelta(days=1)
-                    cur_time = cur_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
-            else:
-                cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                    - timedelta(hours=timezone_offset)
+            cur_time, cur_timestamp = _top_time(top_line, miqtop_time, timezone_offset,
+                miqtop_ahead)
         elif 'miqtop: ' in top_line:
             miqtop_ahead = False
-            # miqtop: .* is-> Mon Jan 26 08:57:39 EST 2015 -0500
-            str_start = top_line.index('is->')
-            miqtop_time = du_parser.parse(top_line[str_start:], fuzzy=True, ignoretz=True)
-            # Time logged in top is the system's time which is ahead/behind by the timezone offset
-            timezone_offset = int(top_line[str_start + 34:str_start + 37])
-            miqtop_time = miqtop_time - timedelta(hours=timezone_offset)
+            miqtop_time, timezone_offset = _miqtop_time(top_line)
         else:
             top_results = miq_top.search(top_line)
             if top_results:
-                top_pid = top_results.group(1)
-                top_virt = convert_top_mem_to_mib(top_results.group(2))
-                top_res = convert_top_mem_to_mib(top_results.group(3))
-                top_share = convert_top_mem_to_mib(top_results.group(4))
-                top_cpu_per = float(top_results.group(5))
-                top_mem_per = float(top_results.group(6))
-                for worker in workers:
-                    if workers[worker].pid == top_pid:
-                        if cur_time > workers[worker].start_ts and \
-                                (workers[worker].end_ts == '' or cur_time < workers[worker].end_ts):
-                            w_id = workers[worker].worker_id
-                            if w_id not in top_workers:
-                                top_workers[w_id] = {}
-                                top_workers[w_id]['datetimes'] = []
-                                top_workers[w_id]['virt'] = []
-                                top_workers[w_id]['res'] = []
-                                top_workers[w_id]['share'] = []
-                                top_workers[w_id]['cpu_per'] = []
-                                top_workers[w_id]['mem_per'] = []
-                            top_workers[w_id]['datetimes'].append(str(cur_time))
-                            top_workers[w_id]['virt'].append(top_virt)
-                            top_workers[w_id]['res'].append(top_res)
-                            top_workers[w_id]['share'].append(top_share)
-                            top_workers[w_id]['cpu_per'].append(top_cpu_per)
-                            top_workers[w_id]['mem_per'].append(top_mem_per)
-                            break
+                for worker in pid_workers.get(top_results.group(1), ()):
+                    if cur_time > worker.start_ts and \
+                            (worker.end_ts == '' or cur_time < worker.end_ts):
+                        if worker.worker_id not in columns:
+                            worker_columns = columns[worker.worker_id] = {
+                                'timestamps': array('l')}
+                            worker_columns.update((key, array('d')) for key in top_worker_keys)
+                            worker_columns.update((key + '_units', array('c'))
+                                for key in top_worker_mem_keys)
+                        worker_columns = columns[worker.worker_id]
+                        worker_columns['timestamps'].append(cur_timestamp)
+                        (pid, virt, virt_unit, res, res_unit, share, share_unit, cpu_per,
+                            mem_per) = top_results.groups()
+                        for key, value in [('virt', virt), ('res', res), ('share', share),
+                                ('cpu_per', cpu_per), ('mem_per', mem_per)]:
+                            worker_columns[key].append(float(value))
+                        # KiB values have no unit
+                        worker_columns['virt_units'].append(virt_unit or 'k')
+                        worker_columns['res_units'].append(res_unit or 'k')
+                        worker_columns['share_units'].append(share_unit or 'k')
+                        break
             else:
                 logger.error('Issue with miq_top regex or grepping of top file:{}'.format(top_line))
         if (line_count % 20000) == 0:
             timediff = time() - runningtime
             runningtime = time()
             logger.info('Count {} : Parsed 20000 lines in {}'.format(line_count, timediff))
+
+    top_workers = {}
+    for w_id, worker_columns in columns.iteritems():
+        top_workers[w_id] = {'timestamps': numpy.array(worker_columns['timestamps'], dtype='int64')}
+        for key in top_worker_keys:
+            if key in top_worker_mem_keys:
+                top_workers[w_id][key] = convert_top_mem_to_mib_array(worker_columns[key],
+                    numpy.frombuffer(worker_columns[key + '_units'], dtype='S1'))
+            else:
+                top_workers[w_id][key] = numpy.array(worker_columns[key])
     return top_workers, len(top_lines)
 
 
-def perf_process_evm(evm_file, top_file):
+def perf_process_evm(evm_file, top_file, workers=None):
+    """Generates the csvs and charts of the messages and workers of evm.log and top_output.log
+
+    Args:
+        evm_file: Path of the evm.log, or list of paths of its (rotated) segments, oldest first
+        top_file: Path of the top_output.log
+        workers: Number of processes parsing evm.log, defaults to the number of cpus
+    """
+    if workers is None:
+        workers = cpu_count()
     msg_filters = {
         '-hourly': re.compile(r'\"[0-9\-]*T[0-9\:]*Z\",\s\"hourly\"'),
         '-daily': re.compile(r'\"[0-9\-]*T[0-9\:]*Z\",\s\"daily\"'),
@@ -808,22 +776,33 @@ def perf_process_evm(evm_file, top_file):
     starttime = time()
     initialtime = starttime
 
-    logger.info('----------- Parsing evm log file for messages -----------')
-    messages, msg_cmds, test_start, test_end, msg_lc = evm_to_messages(evm_file, msg_filters)
+    charts_dir = log_path.join('charts')
+    if not os.path.exists(str(charts_dir)):
+        os.mkdir(str(charts_dir))
+
+    logger.info('----------- Parsing evm log file for messages and workers -----------')
+    rawdata_file = log_path.join('csv_output', 'queue-rawdata.csv').open('w', ensure=True)
+    try:
+        rawdata_writer = csv.DictWriter(rawdata_file, fieldnames=MiqMsgStat().headers,
+            delimiter=',', quotechar='\'', quoting=csv.QUOTE_MINIMAL)
+        rawdata_writer.writeheader()
+        evm_stats = evm_to_stats(evm_file, msg_filters, rawdata_writer, workers)
+    finally:
+        rawdata_file.close()
     timediff = time() - starttime
+    msg_times = evm_stats.msg_times
+    msg_cmds = msg_times_to_total_time_lists(msg_times)
+    test_start, test_end = evm_stats.test_start, evm_stats.test_end
+    msg_count, msg_lc = evm_stats.message_count, evm_stats.line_count
+    workers, wkr_lc = evm_stats.workers, evm_stats.worker_line_count
+    wkr_mem_exc, wkr_upt_exc = evm_stats.wkr_mem_exc, evm_stats.wkr_upt_exc
+    wkr_stp, wkr_int, wkr_ext = evm_stats.wkr_stp, evm_stats.wkr_int, evm_stats.wkr_ext
     logger.info('----------- Completed Parsing evm log file -----------')
-    logger.info('Parsed {} lines of evm log file for messages in {}'.format(msg_lc, timediff))
-    logger.info('Total # of Messages: {}'.format(len(messages)))
+    logger.info('Parsed {} lines of evm log file in {}'.format(msg_lc, timediff))
+    logger.info('Total # of Messages: {}'.format(msg_count))
     logger.info('Total # of Commands: {}'.format(len(msg_cmds)))
     logger.info('Start Time: {}'.format(test_start))
     logger.info('End Time: {}'.format(test_end))
-
-    logger.info('----------- Parsing evm log file for workers -----------')
-    starttime = time()
-    workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_lc = evm_to_workers(evm_file)
-    timediff = time() - starttime
-    logger.info('----------- Completed Parsing evm log for workers -----------')
-    logger.info('Parsed {} lines of evm log file for workers in {}'.format(wkr_lc, timediff))
     logger.info('Total # of Workers: {}'.format(len(workers)))
     logger.info('# Workers Memory Exceeded: {}'.format(wkr_mem_exc))
     logger.info('# Workers Uptime Exceeded: {}'.format(wkr_upt_exc))
@@ -846,20 +825,15 @@ def perf_process_evm(evm_file, top_file):
     logger.info('----------- Completed Parsing top_output log -----------')
     logger.info('Parsed {} lines of top_output file for workers in {}'.format(tp_lc, timediff))
 
-    charts_dir = log_path.join('charts')
-    if not os.path.exists(str(charts_dir)):
-        os.mkdir(str(charts_dir))
-
     logger.info('----------- Generating Raw Data csv files -----------')
     starttime = time()
-    generate_raw_data_csv(messages, 'queue-rawdata.csv')
     generate_raw_data_csv(workers, 'workers-rawdata.csv')
     timediff = time() - starttime
     logger.info('Generated Raw Data csv files in: {}'.format(timediff))
 
     logger.info('----------- Generating Hourly Buckets -----------')
     starttime = time()
-    hr_bkt = messages_to_hourly_buckets(messages, test_start, test_end)
+    hr_bkt = evm_stats.hourly_buckets()
     timediff = time() - starttime
     logger.info('Generated Hourly Buckets in: {}'.format(timediff))
 
@@ -889,7 +863,7 @@ def perf_process_evm(evm_file, top_file):
 
     logger.info('----------- Generating Message Statistics -----------')
     starttime = time()
-    messages_to_statistics_csv(messages, 'queue-statistics.csv')
+    msg_times_to_statistics_csv(msg_times, 'queue-statistics.csv')
     timediff = time() - starttime
     logger.info('Generated Message Statistics in: {}'.format(timediff))
 
@@ -923,7 +897,7 @@ def perf_process_evm(evm_file, top_file):
     html_menu.write('Parsed {} lines for messages<br>'.format(msg_lc))
     html_menu.write('Start Time: {}<br>'.format(test_start))
     html_menu.write('End Time: {}<br>'.format(test_end))
-    html_menu.write('Message Count: {}<br>'.format(len(messages)))
+    html_menu.write('Message Count: {}<br>'.format(msg_count))
     html_menu.write('Command Count: {}<br>'.format(len(msg_cmds)))
 
     html_menu.write('Parsed {} lines for workers<br>'.format(wkr_lc))
@@ -975,7 +949,7 @@ def perf_process_evm(evm_file, top_file):
     html_wkr_menu.write('Parsed {} lines for messages<br>'.format(msg_lc))
     html_wkr_menu.write('Start Time: {}<br>'.format(test_start))
     html_wkr_menu.write('End Time: {}<br>'.format(test_end))
-    html_wkr_menu.write('Message Count: {}<br>'.format(len(messages)))
+    html_wkr_menu.write('Message Count: {}<br>'.format(msg_count))
     html_wkr_menu.write('Command Count: {}<br>'.format(len(msg_cmds)))
 
     html_wkr_menu.write('Parsed {} lines for workers<br>'.format(wkr_lc))
@@ -1054,15 +1028,22 @@ class MiqMsgStat(object):
             str(self.del_time) + ' : ' + str(self.total_time)
 
 
-class MiqMsgLists(object):
-
+class MiqMsgTimes(object):
+    """Compact store of the timings of one command's messages"""
     def __init__(self):
-        self.cmd = ''
         self.puts = 0
         self.gets = 0
-        self.dequeuetimes = []
-        self.delivertimes = []
-        self.totaltimes = []
+        self.deq_times = array('d')
+        self.del_times = array('d')
+        self.total_times = array('d')
+
+    def add(self, msg):
+        self.puts += 1
+        if msg.del_time > 0:
+            self.gets += 1
+        self.deq_times.append(msg.deq_time)
+        self.del_times.append(msg.del_time)
+        self.total_times.append(msg.total_time)
 
 
 class MiqMsgBucket(object):
@@ -1111,3 +1092,177 @@ class MiqWorker(object):
     def __str__(self):
         return self.worker_id + ' : ' + self.worker_type + ' : ' + self.pid + ' : ' + \
             str(self.start_ts) + ' : ' + str(self.end_ts) + ' : ' + self.terminated
+
+
+class EvmLogParser(object):
+    """Builds message and worker statistics from the events of :py:func:`parse_evm_chunk`
+
+    Only messages still on the queue are kept as :py:class:`MiqMsgStat` objects. Once a message
+    is delivered, it is retired: written to the raw data csv (if a writer was given) and
+    added to its command's :py:class:`MiqMsgTimes` and hourly :py:class:`MiqMsgBucket`s.
+    Messages never delivered are retired by :py:meth:`finish`.
+
+    Chunks have to be added in the order they appear in the log, as messages and workers are
+    followed across chunks.
+    """
+    def __init__(self, rawdata_writer=None):
+        self.rawdata_writer = rawdata_writer
+        self.line_count = 0
+        self.test_start = ''
+        self.test_end = ''
+        self.messages = {}
+        self.message_count = 0
+        self.msg_times = {}
+        self.hourly = {}
+        self.workers = {}
+        self.worker_line_count = 0
+        self.wkr_upt_exc = 0
+        self.wkr_mem_exc = 0
+        self.wkr_stp = 0
+        self.wkr_int = 0
+        self.wkr_ext = 0
+
+    def add_chunk(self, events, line_count, worker_line_count):
+        handlers = {
+            'start': self._start,
+            'put': self._put,
+            'get': self._get,
+            'delivered': self._delivered,
+            'worker': self._worker,
+            'terminated': self._terminated,
+            'interrupt': self._interrupt,
+        }
+        for event in events:
+            handlers[event[0]](*event[1:])
+        self.line_count += line_count
+        self.worker_line_count += worker_line_count
+
+    def finish(self):
+        """Retires the messages that were never delivered"""
+        for msg_id in sorted(self.messages):
+            self._retire(self.messages.pop(msg_id))
+
+    def hourly_buckets(self):
+        """Returns the hourly buckets as ``hr_bkt[msg_cmd][msg_date][msg_hour]``
+
+        Every hour between the start and end of the log has a bucket.
+        """
+        hr_bkt = {}
+        for msg_cmd, dates in self.hourly.iteritems():
+            hr_bkt[msg_cmd] = provision_hour_buckets(self.test_start, self.test_end)
+            for date, hours in dates.iteritems():
+                hr_bkt[msg_cmd].setdefault(date, {}).update(hours)
+        return hr_bkt
+
+    def _start(self, ts):
+        # Obtains the first timestamp in the log file
+        if self.test_start == '':
+            self.test_start = ts
+
+    def _put(self, line_no, msg_id, msg_cmd, ts, pid, msg_args):
+        line_no += self.line_count
+        # A message was first put on the queue, this starts its queuing time
+        if msg_id:
+            self.test_end = ts
+            msg = self.messages[msg_id] = MiqMsgStat()
+            msg.msg_id = '\'' + msg_id + '\''
+            msg.msg_cmd = msg_cmd
+            msg.pid_put = pid
+            msg.puttime = ts
+            if msg_args is False:
+                logger.debug('Could not obtain message args line #: {}'.format(line_no))
+            else:
+                msg.msg_args = msg_args
+        else:
+            logger.error('Could not obtain message id, line #: {}'.format(line_no))
+
+    def _get(self, line_no, msg_id, ts, pid, deq_time):
+        if msg_id:
+            if msg_id in self.messages:
+                self.test_end = ts
+                msg = self.messages[msg_id]
+                msg.pid_get = pid
+                msg.gettime = ts
+                msg.deq_time = deq_time
+            else:
+                logger.error('Message ID not in dictionary: {}'.format(msg_id))
+        else:
+            logger.error('Could not obtain message id, line #: {}'.format(
+                line_no + self.line_count))
+
+    def _delivered(self, line_no, msg_id, ts, del_time):
+        if msg_id:
+            self.test_end = ts
+            if msg_id in self.messages:
+                msg = self.messages.pop(msg_id)
+                msg.del_time = del_time
+                msg.total_time = msg.deq_time + msg.del_time
+                self._retire(msg)
+            else:
+                logger.error('Message ID not in dictionary: {}'.format(msg_id))
+        else:
+            logger.error('Could not obtain message id, line #: {}'.format(
+                line_no + self.line_count))
+
+    def _retire(self, msg):
+        self.message_count += 1
+        if self.rawdata_writer is not None:
+            self.rawdata_writer.writerow(dict(msg))
+        if msg.msg_cmd not in self.msg_times:
+            self.msg_times[msg.msg_cmd] = MiqMsgTimes()
+        self.msg_times[msg.msg_cmd].add(msg)
+
+        # put on queue, deals with queuing:
+        bk = self._bucket(msg.msg_cmd, msg.puttime[:10], msg.puttime[11:13])
+        bk.total_put += 1
+        bk.sum_deq += msg.deq_time
+        if bk.min_deq == 0 or bk.min_deq > msg.deq_time:
+            bk.min_deq = msg.deq_time
+        if bk.max_deq == 0 or bk.max_deq < msg.deq_time:
+            bk.max_deq = msg.deq_time
+        bk.avg_deq = bk.sum_deq / bk.total_put
+
+        # Get time is when the message is delivered
+        bk = self._bucket(msg.msg_cmd, msg.gettime[:10], msg.gettime[11:13])
+        bk.total_get += 1
+        bk.sum_del += msg.del_time
+        if bk.min_del == 0 or bk.min_del > msg.del_time:
+            bk.min_del = msg.del_time
+        if bk.max_del == 0 or bk.max_del < msg.del_time:
+            bk.max_del = msg.del_time
+        bk.avg_del = bk.sum_del / bk.total_get
+
+    def _bucket(self, msg_cmd, date, hour):
+        hours = self.hourly.setdefault(msg_cmd, {}).setdefault(date, {})
+        if hour not in hours:
+            hours[hour] = MiqMsgBucket()
+        return hours[hour]
+
+    def _worker(self, worker_type, workerid, pid, ts):
+        if workerid not in self.workers:
+            worker = self.workers[workerid] = MiqWorker()
+            worker.worker_type = worker_type
+            worker.pid = pid
+            worker.worker_id = workerid
+            worker.start_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
+
+    def _terminated(self, workerid, reason, ts):
+        worker = self.workers.get(workerid)
+        if worker is not None and not worker.terminated:
+            worker.terminated = reason
+            worker.end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
+            if reason == 'evm_worker_uptime_exceeded':
+                self.wkr_upt_exc += 1
+            elif reason == 'evm_worker_memory_exceeded':
+                self.wkr_mem_exc += 1
+            elif reason == 'evm_worker_stop':
+                self.wkr_stp += 1
+            else:
+                self.wkr_ext += 1
+
+    def _interrupt(self, ts):
+        for worker in self.workers.itervalues():
+            if not worker.end_ts:
+                self.wkr_int += 1
+                worker.terminated = 'Interrupted'
+                worker.end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
@@ -25,6 +25,11 @@ class APIMethodCall(object):
 
 
 class SproutClient(object):
+    """Client of the Sprout JSON API
+
+    Every method of the API can be called as a method of the client. The requests go through one
+    :py:class:`requests.Session`, so the connection to Sprout is kept alive and reused.
+    """
     def __init__(
             self, protocol="http", host="localhost", port=8000, entry="appliances/api", auth=None):
         self._proto = protocol
@@ -32,13 +37,14 @@ class SproutClient(object):
         self._port = port
         self._entry = entry
         self._auth = auth
+        self._session = requests.Session()
 
     @property
     def api_entry(self):
         return "{}://{}:{}/{}".format(self._proto, self._host, self._port, self._entry)
 
     def _post(self, **data):
-        return requests.post(self.api_entry, data=json.dumps(data))
+        return self._session.post(self.api_entry, data=json.dumps(data))
 
     def _call_post(self, **data):
         """Protect from the Sprout being updated (error 502,503)"""
@@ -50,15 +56,7 @@ class SproutClient(object):
         )
         return result.out.json()
 
-    def call_method(self, name, *args, **kwargs):
-        req_data = {
-            "method": name,
-            "args": args,
-            "kwargs": kwargs,
-        }
-        if self._auth is not None:
-            req_data["auth"] = self._auth
-        result = self._call_post(**req_data)
+    def _result(self, result):
         try:
             if result["status"] == "exception":
                 raise SproutException(
@@ -72,6 +70,48 @@ class SproutClient(object):
         except KeyError:
             raise Exception("Malformed response from Sprout!")
 
+    def call_method(self, name, *args, **kwargs):
+        req_data = {
+            "method": name,
+            "args": args,
+            "kwargs": kwargs,
+        }
+        if self._auth is not None:
+            req_data["auth"] = self._auth
+        return self._result(self._call_post(**req_data))
+
+    def batch(self, calls):
+        """Calls several methods in a single request
+
+        The user is authenticated only once for all of the calls.
+
+        Args:
+            calls: List of ``(name, args, kwargs)`` tuples, ``args`` and ``kwargs`` can be left out
+        Returns:
+            List of the results of the calls, in the same order. If any of the calls failed, the
+            exception of the first one that failed is raised instead.
+        """
+        batch = []
+        for call in calls:
+            if len(call) == 3:
+                name, args, kwargs = call
+            elif len(call) == 2:
+                name, args = call
+                kwargs = {}
+            elif len(call) == 1:
+                name, = call
+                args, kwargs = (), {}
+            else:
+                raise ValueError("Calls are (name, args, kwargs) tuples, got {!r}".format(call))
+            batch.append({"method": name, "args": args, "kwargs": kwargs})
+        if not batch:
+            return []
+        return map(self._result, self.call_method("batch", batch))
+
+    def close(self):
+        """Closes the connections kept alive to Sprout"""
+        self._session.close()
+
     def __getattr__(self, attr):
         return APIMethodCall(self, attr)
 
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 import iso8601
+import pipes
 import re
+import select
 import socket
 import sys
+import time
+import uuid
 from collections import namedtuple
 from urlparse import urlparse
 
@@ -21,6 +25,12 @@ from utils.timeutil import parsetime
 # Default blocking time before giving up on an ssh command execution,
 # in seconds (float)
 RUNCMD_TIMEOUT = 1200.0
+# Maximum number of bytes read from an ssh channel at once
+RECV_BUFFER_SIZE = 32768
+# Seconds an SSHTail waits for more lines when iterating
+TAIL_SETTLE_TIME = 0.1
+# Number of lines an SSHTail reads from its channel at once when iterating
+TAIL_BATCH_LINES = 1000
 SSHResult = namedtuple("SSHResult", ["rc", "output"])
 
 _ssh_key_file = project_path.join('.generated_ssh_key')
@@ -132,49 +142,155 @@ class SSHClient(paramiko.SSHClient):
             self.connect()
         return super(SSHClient, self).get_transport(*args, **kwargs)
 
+    def _read_channel(self, session, timeout=None):
+        """Yields ``(stream, data)`` as output arrives on the session, until the command exits
+
+        ``stream`` is :py:data:`sys.stdout` or :py:data:`sys.stderr`. Waits for output with select
+        instead of polling the session.
+
+        Raises:
+            :py:class:`socket.timeout` if no output arrives for ``timeout`` seconds before the
+            command exits
+        """
+        deadline = time.time() + float(timeout) if timeout else None
+        while True:
+            received = False
+            while session.recv_ready():
+                received = True
+                yield sys.stdout, session.recv(RECV_BUFFER_SIZE)
+            while session.recv_stderr_ready():
+                received = True
+                yield sys.stderr, session.recv_stderr(RECV_BUFFER_SIZE)
+            if received and deadline is not None:
+                deadline = time.time() + float(timeout)
+            if session.exit_status_ready() and not session.recv_ready() \
+                    and not session.recv_stderr_ready():
+                break
+            if deadline is None:
+                wait = None
+            else:
+                wait = deadline - time.time()
+                if wait <= 0:
+                    raise socket.timeout('No output from the command in {} seconds'.format(
+                        timeout))
+            # The session's fileno becomes readable with new output, and when it gets closed
+            select.select([session], [], [], wait)
+
     def run_command(self, command, timeout=RUNCMD_TIMEOUT):
+        """Runs a command on the appliance
+
+        Args:
+            command: The command (or a dict for :py:func:`utils.version.pick`)
+            timeout: Idle timeout in seconds, the command fails with :py:class:`socket.timeout`
+                when it doesn't output anything for this long, however long it runs in total.
+                ``None`` or ``0`` waits forever.
+
+        Returns:
+            :py:class:`SSHResult`
+        """
         if isinstance(command, dict):
             command = version.pick(command)
         logger.info("Running command `{}`".format(command))
         template = '%s\n'
         command = template % command
 
-        output = ''
+        output = []
         try:
             session = self.get_transport().open_session()
             if timeout:
                 session.settimeout(float(timeout))
             session.exec_command(command)
-            stdout = session.makefile()
-            stderr = session.makefile_stderr()
-            while True:
-                if session.recv_ready:
-                    for line in stdout:
-                        output += line
-                        if self._streaming:
-                            sys.stdout.write(line)
-
-                if session.recv_stderr_ready:
-                    for line in stderr:
-                        output += line
-                        if self._streaming:
-                            sys.stderr.write(line)
-
-                if session.exit_status_ready():
-                    break
+            for stream, data in self._read_channel(session, timeout):
+                output.append(data)
+                if self._streaming:
+                    stream.write(data)
             exit_status = session.recv_exit_status()
-            return SSHResult(exit_status, output)
+            return SSHResult(exit_status, ''.join(output))
         except paramiko.SSHException as exc:
             logger.exception(exc)
         except socket.timeout as e:
             logger.error("Command `{}` timed out.".format(command))
             logger.exception(e)
-            logger.error("Output of the command before it failed was:\n{}".format(output))
+            logger.error("Output of the command before it failed was:\n{}".format(''.join(output)))
             raise
 
         # Returning two things so tuple unpacking the return works even if the ssh client fails
         return SSHResult(1, None)
 
+    def run_commands(self, commands, timeout=RUNCMD_TIMEOUT):
+        """Runs several commands one after another over a single channel
+
+        All the commands are sent at once to one remote shell, which saves opening a session and
+        waiting for a round trip per command. Each command runs in its own subshell with stdin
+        redirected from ``/dev/null``, so like with separate :py:meth:`run_command` calls, changes
+        like ``cd`` don't carry over to the next command, and a failing command doesn't stop the
+        rest. The stderr of the commands is merged into their output.
+
+        Args:
+            commands: List of commands (or dicts for :py:func:`utils.version.pick`)
+            timeout: Idle timeout in seconds, like for :py:meth:`run_command`. The end of each
+                command counts as output, so every command gets the whole timeout.
+
+        Returns:
+            List of :py:class:`SSHResult`, one per command
+        """
+        commands = [version.pick(command) if isinstance(command, dict) else command
+            for command in commands]
+        if not commands:
+            return []
+        # Printed with the exit status of each command, after its output
+        marker = '\n{}-'.format(uuid.uuid4().hex)
+        script = []
+        for command in commands:
+            logger.info("Running command `{}`".format(command))
+            script.append('(\n{}\n) </dev/null 2>&1; printf \'{}%d\\n\' $?\n'.format(
+                command, marker.replace('\n', '\\n')))
+
+        results = []
+        # Only holds the output of the command currently running
+        output = bytearray()
+        try:
+            session = self.get_transport().open_session()
+            if timeout:
+                session.settimeout(float(timeout))
+            session.exec_command('sh')
+            session.sendall(''.join(script))
+            session.shutdown_write()
+            search_from = 0
+            for stream, data in self._read_channel(session, timeout):
+                output.extend(data)
+                while True:
+                    marker_start = output.find(marker, search_from)
+                    if marker_start < 0:
+                        # The marker may be split between this and the next data
+                        search_from = max(0, len(output) - len(marker))
+                        break
+                    status_end = output.find('\n', marker_start + len(marker))
+                    if status_end < 0:
+                        search_from = marker_start
+                        break
+                    command_output = str(output[:marker_start])
+                    results.append(SSHResult(
+                        int(output[marker_start + len(marker):status_end]), command_output))
+                    del output[:status_end + 1]
+                    search_from = 0
+                    if self._streaming:
+                        sys.stdout.write(command_output)
+            session.recv_exit_status()
+        except paramiko.SSHException as exc:
+            logger.exception(exc)
+        except socket.timeout as e:
+            logger.error("Command `{}` timed out.".format(commands[len(results)]))
+            logger.exception(e)
+            logger.error("Output of the command before it failed was:\n{}".format(str(output)))
+            raise
+
+        # Commands that didn't finish, as the shell or the connection died
+        for command in commands[len(results):]:
+            logger.error("Command `{}` did not finish".format(command))
+            results.append(SSHResult(1, None))
+        return results
+
     def cpu_spike(self, seconds=60, cpus=2, **kwargs):
         """Creates a CPU spike of specific length and processes.
 
@@ -302,37 +418,144 @@ class SSHClient(paramiko.SSHClient):
 
 
 class SSHTail(SSHClient):
+    """Tails a remote file through one long-lived ``tail -F`` exec channel
+
+    Iterating over the tail yields the lines written to the file since the previous iteration
+    (or since :py:meth:`set_initial_file_end`), until no new line arrives for ``settle``
+    seconds. :py:meth:`read_lines` returns the lines in batches instead.
+
+    ``tail -F`` follows the file by name, so the tail carries on in the new file when the log is
+    rotated or truncated (counted in :py:attr:`rotations`). If the channel is lost, a new one is
+    opened where the previous one left off; with a ``line_filter`` the position in the file
+    isn't known, so the new channel starts at the end of the file.
+
+    Args:
+        remote_filename: Path of the file to tail
+        line_filter: Only tail the lines containing this string, filtered with ``grep -F`` on the
+            remote host
+        settle: Seconds to wait for more lines when iterating
+    """
 
-    def __init__(self, remote_filename, **connect_kwargs):
+    def __init__(self, remote_filename, line_filter=None, settle=TAIL_SETTLE_TIME,
+            **connect_kwargs):
         super(SSHTail, self).__init__(stream_output=False, **connect_kwargs)
         self._remote_filename = remote_filename
-        self._sftp_client = None
-        self._remote_file_size = None
+        self._line_filter = line_filter
+        self._settle = settle
+        self._channel = None
+        # Position of the tail in the file, only tracked without a line filter
+        self._offset = None
+        self._buffer = bytearray()
+        self.rotations = 0
 
     def __iter__(self):
-        with self as sshtail:
-            fstat = sshtail._sftp_client.stat(self._remote_filename)
-            if self._remote_file_size is not None:
-                if self._remote_file_size < fstat.st_size:
-                    remote_file = self._sftp_client.open(self._remote_filename, 'r')
-                    remote_file.seek(self._remote_file_size, 0)
-                    while (remote_file.tell() < fstat.st_size):
-                        line = remote_file.readline().rstrip()
-                        yield line
-            self._remote_file_size = fstat.st_size
+        if self._channel is None:
+            # Nothing to yield before the tail is positioned, like set_initial_file_end
+            self._open_channel()
+            return
+        while True:
+            lines = self.read_lines(TAIL_BATCH_LINES, timeout=self._settle)
+            if not lines:
+                break
+            for line in lines:
+                yield line
 
-    def __enter__(self):
-        self.connect(**self._connect_kwargs)
-        self._sftp_client = self.open_sftp()
-        return self
-
-    def __exit__(self, *args, **kwargs):
-        self._sftp_client.close()
+    def close(self):
+        self._close_channel()
+        super(SSHTail, self).close()
 
     def set_initial_file_end(self):
-        with self as sshtail:
-            fstat = sshtail._sftp_client.stat(self._remote_filename)
-            self._remote_file_size = fstat.st_size  # Seed initial size of file
+        """(Re)starts the tail at the current end of the file"""
+        self._close_channel()
+        self._offset = None
+        self._buffer = bytearray()
+        self._open_channel()
+
+    def read_lines(self, max_lines=None, timeout=0):
+        """Returns the lines tailed so far (without line endings), at most ``max_lines``
+
+        Waits up to ``timeout`` seconds for lines to arrive, returning as soon as there are any.
+        Only as much is read from the channel as is needed for ``max_lines`` lines, the rest is
+        held back by ssh flow control (and so by ``tail``) until the next call.
+        """
+        if self._channel is None:
+            self._open_channel()
+        deadline = time.time() + timeout
+        while max_lines is None or self._buffer.count('\n') < max_lines:
+            wait = deadline - time.time() if '\n' not in self._buffer else 0
+            if not self._receive(max(wait, 0)):
+                break
+        lines = []
+        while max_lines is None or len(lines) < max_lines:
+            line_end = self._buffer.find('\n')
+            if line_end < 0:
+                break
+            lines.append(str(self._buffer[:line_end]).rstrip())
+            del self._buffer[:line_end + 1]
+        return lines
+
+    def _tail_command(self):
+        filename = pipes.quote(self._remote_filename)
+        if self._offset is None:
+            # Start at the current end of the file
+            command = 'size=$(stat -c %s {0} 2>/dev/null || echo 0); echo $size; ' \
+                'tail -c +$((size + 1)) -F {0}'.format(filename)
+        else:
+            command = 'echo {0}; tail -c +{1} -F {2}'.format(self._offset, self._offset + 1,
+                filename)
+        if self._line_filter is not None:
+            command = '{} | grep --line-buffered -F -e {}'.format(command,
+                pipes.quote(self._line_filter))
+        return command
+
+    def _open_channel(self):
+        logger.info('Opening {} for tail'.format(self._remote_filename))
+        self._channel = self.get_transport().open_session()
+        self._channel.exec_command(self._tail_command())
+        # The first line is where in the file the tail starts
+        start = bytearray()
+        deadline = time.time() + RUNCMD_TIMEOUT
+        while not start.endswith('\n'):
+            if not self._channel.recv_ready():
+                if self._channel.exit_status_ready() or time.time() > deadline:
+                    raise Exception('Could not start tailing {}'.format(self._remote_filename))
+                select.select([self._channel], [], [], deadline - time.time())
+                continue
+            start.append(self._channel.recv(1))
+        if self._line_filter is None:
+            self._offset = int(str(start))
+
+    def _close_channel(self):
+        if self._channel is not None:
+            with diaper:
+                self._channel.close()
+            self._channel = None
+
+    def _receive(self, timeout):
+        """Receives whatever is available on the channel, waiting up to ``timeout`` for it
+
+        Returns: Whether any data (of the file) was received
+        """
+        if not (self._channel.recv_ready() or self._channel.recv_stderr_ready()):
+            if self._channel.exit_status_ready():
+                logger.warning('Tail of {} was lost, resuming it'.format(self._remote_filename))
+                self._close_channel()
+                self._open_channel()
+            select.select([self._channel], [], [], timeout)
+        while self._channel.recv_stderr_ready():
+            message = self._channel.recv_stderr(RECV_BUFFER_SIZE)
+            if 'following new file' in message or 'file truncated' in message:
+                logger.info('Tailed file {} was rotated'.format(self._remote_filename))
+                self.rotations += 1
+                if self._offset is not None:
+                    self._offset = 0
+        if not self._channel.recv_ready():
+            return False
+        data = self._channel.recv(RECV_BUFFER_SIZE)
+        if self._offset is not None:
+            self._offset += len(data)
+        self._buffer.extend(data)
+        return True
 
 
 def keygen():
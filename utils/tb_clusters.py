@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Clustering of similar tracebacks, for summaries of the failures of test runs
+
+Tracebacks of the same failure differ in memory addresses, ids, timestamps, line numbers and the
+like, so they are normalized first (see :py:func:`normalize`), and the ones that are the same
+after that are only compared once. The distinct ones are compared by the word shingles of their
+normalized text, estimating their similarity with MinHash signatures, and locality sensitive
+hashing of the signatures finds the clusters worth comparing to. Clustering takes time linear
+in the number of tracebacks.
+
+Usage:
+
+.. code-block:: python
+
+    clusters = TracebackClusters()
+    for test_name, traceback in failures:
+        clusters.add(traceback, test_name)
+    for cluster in clusters.top(10):
+        traceback, test_name = cluster[0]
+        print '{} tests like {}: {}'.format(len(cluster), test_name, traceback)
+
+"""
+import random
+import re
+
+# Replaced in this order, so the numbers are replaced only after everything containing them
+_NORMALIZE = [
+    (re.compile(r'0x[0-9a-fA-F]+'), 'ADDR'),
+    (re.compile(
+        r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'),
+        'UUID'),
+    (re.compile(
+        r'\d{4}-\d{2}-\d{2}[T ]\d{1,2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?'),
+        'TIMESTAMP'),
+    (re.compile(r'\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b'), 'TIME'),
+    (re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b'), 'IP'),
+    (re.compile(r'\b(?=[a-fA-F]*\d)[0-9a-fA-F]{12,}\b'), 'HEX'),
+    (re.compile(r'\d+'), 'N'),
+]
+_WHITESPACE = re.compile(r'\s+')
+_WORD = re.compile(r'\w+')
+# The hashes of the signatures are kept in ints
+_HASH_BITS = 62
+_HASH_MASK = (1 << _HASH_BITS) - 1
+
+
+def normalize(traceback):
+    """Returns the traceback without the parts that differ between occurrences of one failure
+
+    Addresses, uuids, timestamps, IP addresses, long hexadecimal ids and numbers are replaced by
+    placeholders and whitespace is collapsed.
+    """
+    for pattern, replacement in _NORMALIZE:
+        traceback = pattern.sub(replacement, traceback)
+    return _WHITESPACE.sub(' ', traceback).strip()
+
+
+def shingles(text, size=2):
+    """Returns the set of the runs of ``size`` consecutive words of a text
+
+    Texts shorter than that have the one shingle of all their words.
+    """
+    words = _WORD.findall(text)
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class TracebackClusters(object):
+    """Groups similar tracebacks, in time linear in their number
+
+    Every distinct normalized traceback gets a MinHash signature of its shingles. Its signature
+    is split into bands, and the clusters whose first traceback starts with the same word (the
+    exception type of short tracebacks) and shares a band with it are the candidates it's
+    compared to. It joins the most similar of them, if the estimated Jaccard similarity of their
+    shingles reaches ``threshold``, and starts a new cluster otherwise.
+
+    Args:
+        threshold: Minimal similarity of a traceback to the first one of its cluster
+        bands: Number of bands of the signatures
+        rows: Number of hashes in a band; more bands of less rows find more candidates
+        shingle_size: Number of words in a shingle
+        seed: Seed of the hash functions of the signatures
+    """
+    def __init__(self, threshold=0.5, bands=20, rows=3, shingle_size=2, seed=0):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._masks = [rng.getrandbits(_HASH_BITS) for _ in range(bands * rows)]
+        # {normalized traceback: cluster index}
+        self._buckets = {}
+        # Lists of the (traceback, item) entries, in the order the clusters were created
+        self._clusters = []
+        # Signature of the first traceback of every cluster
+        self._signatures = []
+        # {(first word, band, band hashes): [cluster index]}
+        self._band_index = {}
+
+    def signature(self, normalized):
+        """Returns the MinHash signature of a normalized traceback"""
+        # Non-negative, like the masks, or a negative hash would be the minimum for every mask
+        hashes = [
+            hash(shingle) & _HASH_MASK for shingle in shingles(normalized, self.shingle_size)]
+        return [min(h ^ mask for h in hashes) for mask in self._masks]
+
+    def similarity(self, signature, other):
+        """Returns the estimated Jaccard similarity of the shingles behind two signatures"""
+        return sum(a == b for a, b in zip(signature, other)) / float(len(signature))
+
+    def add(self, traceback, item=None):
+        """Adds a traceback to its cluster
+
+        Args:
+            traceback: The traceback
+            item: Anything to keep with the traceback, eg. the name of the failed test
+        """
+        normalized = normalize(traceback)
+        cluster = self._buckets.get(normalized, None)
+        if cluster is None:
+            cluster = self._buckets[normalized] = self._cluster_for(normalized)
+        self._clusters[cluster].append((traceback, item))
+
+    def _cluster_for(self, normalized):
+        signature = self.signature(normalized)
+        first_word = _WORD.search(normalized)
+        first_word = first_word.group(0) if first_word else None
+        keys = [
+            (first_word, band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)]
+        candidates = set()
+        for key in keys:
+            candidates.update(self._band_index.get(key, []))
+        best = None
+        for candidate in sorted(candidates):
+            similarity = self.similarity(signature, self._signatures[candidate])
+            if similarity >= self.threshold and (best is None or similarity > best[0]):
+                best = similarity, candidate
+        if best is not None:
+            return best[1]
+        cluster = len(self._clusters)
+        self._clusters.append([])
+        self._signatures.append(signature)
+        for key in keys:
+            self._band_index.setdefault(key, []).append(cluster)
+        return cluster
+
+    def clusters(self):
+        """Returns the clusters, lists of the added ``(traceback, item)`` entries, largest first
+
+        Clusters of the same size are in the order they were created in.
+        """
+        return sorted(self._clusters, key=len, reverse=True)
+
+    def top(self, count=10):
+        """Returns the ``count`` largest clusters, see :py:meth:`clusters`"""
+        return self.clusters()[:count]
+
+    def __len__(self):
+        return len(self._clusters)
+
+
+def cluster_tracebacks(entries, **kwargs):
+    """Clusters ``(traceback, item)`` entries, see :py:class:`TracebackClusters`
+
+    Returns: The clusters, lists of the entries, largest first
+    """
+    clusters = TracebackClusters(**kwargs)
+    for traceback, item in entries:
+        clusters.add(traceback, item)
+    return clusters.clusters()
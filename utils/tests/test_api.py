@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from utils import api
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium
+]
+
+ENTRY_POINT = "http://appliance/api"
+VMS = ENTRY_POINT + "/vms"
+
+
+class Response(object):
+    def __init__(self, data):
+        self._data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self._data
+
+
+class Session(object):
+    """Serves the vms collection of an API without a running appliance"""
+    def __init__(self, count=25, expand=True):
+        self.vms = {i: {"href": "{}/{}".format(VMS, i), "id": i, "name": "vm{}".format(i)}
+            for i in range(count)}
+        self.expand = expand
+        self.gets = []
+
+    def get(self, url, auth=None, params=None):
+        params = params or {}
+        self.gets.append((url, params))
+        if url == ENTRY_POINT:
+            return Response({
+                "collections": [{"href": VMS, "name": "vms", "description": "Virtual Machines"}],
+                "version": "2.0.0", "versions": []})
+        if url == VMS:
+            ids = sorted(self.vms)
+            if "filter[]" in params:
+                ids = [i for i in ids if "name='{}'".format(self.vms[i]["name"])
+                    in params["filter[]"]]
+            offset = params.get("offset", 0)
+            page = ids[offset:offset + params.get("limit", len(ids))]
+            if self.expand and params.get("expand") == "resources":
+                resources = [dict(self.vms[i]) for i in page]
+            else:
+                resources = [{"href": self.vms[i]["href"]} for i in page]
+            return Response({
+                "name": "vms", "count": len(self.vms), "subcount": len(ids),
+                "resources": resources})
+        return Response(dict(self.vms[int(url.rsplit("/", 1)[1])]))
+
+    def post(self, url, auth=None, data=None):
+        return Response({"success": True})
+
+    def delete(self, url, auth=None, data=None):
+        return Response({"success": True})
+
+    def entity_gets(self):
+        return [url for url, _ in self.gets if url not in {ENTRY_POINT, VMS}]
+
+
+def test_entity_cache_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(api, "time", lambda: now[0])
+    cache = api.EntityCache(30)
+    cache.put("href", {"id": 1, "name": "vm"})
+    cached = cache.get("href")
+    assert cached == {"id": 1, "name": "vm"}
+    # A copy, changing it doesn't change the cache
+    cached["name"] = "changed"
+    now[0] += 30
+    assert cache.get("href") == {"id": 1, "name": "vm"}
+    now[0] += 1
+    assert cache.get("href") is None
+    assert len(cache) == 0
+
+
+def test_entity_cache_disabled_by_default():
+    session = Session()
+    rest_api = api.API(ENTRY_POINT, ("admin", "smartvm"), session=session)
+    rest_api.collections.vms.prefetch()
+    assert len(rest_api.cache) == 0
+    assert rest_api.collections.vms[3].name == "vm3"
+    assert session.entity_gets() == [VMS + "/3"]
+
+
+@pytest.mark.parametrize("method", ["post", "delete"])
+def test_entity_cache_cleared(method):
+    rest_api = api.API(ENTRY_POINT, ("admin", "smartvm"), session=Session(), cache_ttl=60)
+    rest_api.collections.vms.prefetch()
+    assert len(rest_api.cache) == 25
+    getattr(rest_api, method)(VMS + "/1")
+    assert len(rest_api.cache) == 0
+
+
+def test_search_results_not_cached():
+    session = Session()
+    rest_api = api.API(ENTRY_POINT, ("admin", "smartvm"), session=session, cache_ttl=60)
+    rest_api.collections.vms.prefetch()
+    session.vms[4]["name"] = "renamed"
+    # Indexing the collection reuses the prefetched data, the search always loads it again
+    assert rest_api.collections.vms[4].name == "vm4"
+    assert rest_api.collections.vms.get(name="renamed").name == "renamed"
+    assert [vm.name for vm in rest_api.collections.vms.find_by(name="renamed")] == ["renamed"]
+    assert session.entity_gets() == [VMS + "/4", VMS + "/4"]
+
+
+@pytest.mark.parametrize("expand", [True, False], ids=["expand", "parallel"])
+def test_prefetch(expand):
+    session = Session(expand=expand)
+    rest_api = api.API(ENTRY_POINT, ("admin", "smartvm"), session=session, cache_ttl=60)
+    entities = rest_api.collections.vms.prefetch(page_size=10, workers=4)
+    assert [entity.name for entity in entities] == ["vm{}".format(i) for i in range(25)]
+    if expand:
+        assert session.entity_gets() == []
+        assert [params.get("offset") for url, params in session.gets if url == VMS] == [
+            0, 10, 20]
+    else:
+        assert sorted(session.entity_gets()) == sorted(
+            "{}/{}".format(VMS, i) for i in range(25))
+    # Loaded from the cache afterwards
+    entity_gets = len(session.entity_gets())
+    assert rest_api.collections.vms[7].name == "vm7"
+    assert len(session.entity_gets()) == entity_gets
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from artifactor.plugins.reporter import IncrementalReport, ReporterBase, overall_test_status
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium
+]
+
+
+def test_incremental_report_throttled(tmpdir):
+    """The statuses are updated in place between the builds of a throttled report"""
+    log_dir = tmpdir.strpath
+    reporter = ReporterBase()
+    report = IncrementalReport(reporter)
+    artifacts = {}
+    for i in range(3):
+        test_name = 'cfme/tests/test_module.py/test_{}'.format(i)
+        test = artifacts[test_name] = {'start_time': 1.0, 'statuses': {'setup': ('passed', False)}}
+        report.report_data(artifacts, log_dir, '5.5')
+        test['statuses']['call'] = ('failed', False)
+        test['statuses']['teardown'] = ('passed', False)
+        test['finish_time'] = 2.0
+        # The merge of the overall status by finish_test
+        test['statuses'].update({'overall': overall_test_status(test['statuses'])})
+    template_data = report.report_data(artifacts, log_dir, '5.5')
+    assert template_data['counts']['failed'] == 3
+    assert report.tree['_stats']['failed'] == 3
+    assert report.tree['_stats']['passed'] == 0
+
+    index = reporter.index_tests(artifacts, log_dir + '/', '5.5')
+    assert template_data['ndata'] == reporter.report_data(index, index['tests'])['ndata']
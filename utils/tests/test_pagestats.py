@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import re
+
+import pytest
+
+from utils.pagestats import (
+    PageStat, PageStatAggregate, _combine_filters, production_log_events, production_log_to_pages)
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium
+]
+
+
+def log_line(pid, level, message):
+    return '[----] {}, [2015-06-16T14:24:37.345812 #{}:a3f994] {} -- : {}\n'.format(
+        level, pid, {'I': ' INFO', 'D': 'DEBUG'}[level], message)
+
+
+PRODUCTION_LOG = [log_line(*line) for line in [
+    (2774, 'I', 'Started GET "/dashboard/show" for 127.0.0.1 at 2015-06-16 14:24:37 -0400'),
+    (2774, 'D', '  MiqServer Load (0.5ms)  SELECT "miq_servers".* FROM "miq_servers"'),
+    (2774, 'D', '  CACHE (0.0ms)  SELECT "miq_servers".* FROM "miq_servers"'),
+    (2911, 'D', '  Vm Load (900.1ms)  SELECT "vms".* FROM "vms"'),
+    (2774, 'D', '  User Load (250.3ms)  SELECT "users".* FROM "users"'),
+    (2774, 'I', 'Completed 200 OK in 1207ms (Views: 1016.9ms | ActiveRecord: 53.8ms)'),
+    (2911, 'I', 'Completed 200 OK in 999ms (Views: 1.0ms | ActiveRecord: 1.0ms)'),
+    (2774, 'I', 'Started POST "/dashboard/authenticate" for 127.0.0.1 at 2015-06-16 14:24:39'),
+    (2774, 'I', 'Completed 302 Found in 10ms (ActiveRecord: 2.5ms)'),
+    (2774, 'I', 'Started GET "/vm/show/1" for 127.0.0.1 at 2015-06-16 14:24:40 -0400'),
+    (2774, 'D', '  Vm Load (1.5ms)  SELECT "vms".* FROM "vms" WHERE "vms"."id" = 1'),
+    (2774, 'I', 'Completed 404 Not Found in 5ms (Views: 0.8ms | ActiveRecord: 1.5ms)'),
+    (2774, 'I', 'Started GET "/vm/explorer" for 127.0.0.1 at 2015-06-16 14:24:41 -0400'),
+    (2774, 'D', '  Vm Load (3.5ms)  SELECT "vms".* FROM "vms"'),
+    (2774, 'D', '  CACHE (0.0ms)  SELECT "vms".* FROM "vms"'),
+    (2774, 'I', 'Completed 500 Internal Server Error in 30ms'),
+    (2774, 'I', 'Started GET "/vm/tree" for 127.0.0.1 at 2015-06-16 14:24:42 -0400'),
+    (2774, 'D', '  Vm Load (2.0ms)  SELECT "vms".* FROM "vms"'),
+    (2774, 'I', 'Completed in 10ms')]]
+
+
+def test_production_log_to_pages():
+    pages = production_log_to_pages(production_log_events(PRODUCTION_LOG, '2774'), 100)
+    assert [dict(page) for page in pages] == [
+        {'request': 'GET "/dashboard/show" ', 'status': '200 OK', 'seleniumtime': 0,
+            'completedintime': 1207.0, 'viewstime': 1016.9, 'activerecordtime': 53.8,
+            'selectcount': 3, 'cachedcount': 1, 'uncachedcount': 2},
+        {'request': 'POST "/dashboard/authenticate" ', 'status': '302 Found', 'seleniumtime': 0,
+            'completedintime': 10.0, 'viewstime': 0, 'activerecordtime': 2.5, 'selectcount': 0,
+            'cachedcount': 0, 'uncachedcount': 0},
+        {'request': 'GET "/vm/show/1" ', 'status': '404 Not Found', 'seleniumtime': 0,
+            'completedintime': 5.0, 'viewstime': 0.8, 'activerecordtime': 1.5, 'selectcount': 1,
+            'cachedcount': 0, 'uncachedcount': 1},
+        {'request': 'GET "/vm/explorer" ', 'status': '500 Internal Server Error',
+            'seleniumtime': 0, 'completedintime': 30.0, 'viewstime': 0, 'activerecordtime': 0,
+            'selectcount': 2, 'cachedcount': 1, 'uncachedcount': 1},
+        # A completed line without a status still completes the page
+        {'request': 'GET "/vm/tree" ', 'status': '', 'seleniumtime': 0, 'completedintime': 0,
+            'viewstime': 0, 'activerecordtime': 0, 'selectcount': 1, 'cachedcount': 0,
+            'uncachedcount': 1}]
+    # Only the slow select of the worker
+    assert [len(page.slowselects) for page in pages] == [1, 0, 0, 0, 0]
+    assert 'User Load' in pages[0].slowselects[0]
+
+
+def test_production_log_all_workers():
+    pages = production_log_to_pages(production_log_events(PRODUCTION_LOG), 100)
+    assert [page.status for page in pages] == [
+        '200 OK', '200 OK', '302 Found', '404 Not Found', '500 Internal Server Error', '']
+    assert pages[0].selectcount == 4
+    assert pages[1].request == ''
+
+
+REQUESTS = [
+    'POST "/service/tree_select/?id=xx-12"',
+    'POST "/catalog/tree_select/?id=stc-1r"',
+    'POST "/vm_or_template/tree_select/?id=v-1"',
+    'GET "/vm_or_template/show/1"',
+    'GET "/dashboard/show"',
+    'GET "/dashboard/maximize"',
+    'POST "/dashboard/authenticate"',
+    'GET "/Dashboard/show"',
+    'GET "/report/explorer"']
+
+
+def sequential_first_match(filters, request):
+    for p_filter in filters:
+        if p_filter.search(request):
+            return p_filter.pattern
+    return None
+
+
+@pytest.mark.parametrize("filters", [
+    # Anchored, like the filters of the ui perf tests
+    [re.compile(r'^POST \"\/service\/tree_select\/\?id\=[A-Za-z0-9\-\_]*\"$'),
+        re.compile(r'^POST \"\/catalog\/tree_select\/\?id\=[A-Za-z0-9\-\_]*\"$'),
+        re.compile(r'^POST "/vm_or_template/tree_select/\?id=[\w-]*"$')],
+    # Overlapping, the first one in the list wins
+    [re.compile(r'/dashboard/'), re.compile(r'dashboard/show'), re.compile(r'show"$'),
+        re.compile(r'^GET')],
+    [re.compile(r'show"$'), re.compile(r'/dashboard/'), re.compile(r'tree_select|explorer')],
+    # Anchors inside of the pattern, and patterns only matching at the end
+    [re.compile(r'^GET "/v|^POST "/c'), re.compile(r'\d"$'), re.compile(r'w"')],
+    # Groups can't be combined
+    [re.compile(r'/(dashboard|report)/'), re.compile(r'show')],
+    [re.compile(r'(?P<action>show)"$'), re.compile(r'^POST')],
+    # Neither can different flags
+    [re.compile(r'/dashboard/show', re.IGNORECASE), re.compile(r'^GET')],
+    [re.compile(r'^GET'), re.compile(r'/dashboard/show', re.IGNORECASE)]],
+    ids=["anchored", "overlapping", "overlapping-reversed", "inner-anchors", "groups",
+        "named-groups", "flags", "mixed-flags"])
+def test_combine_filters(filters):
+    first_match = _combine_filters(filters)
+    for request in REQUESTS + ['', 'unmatched request']:
+        assert first_match(request) == sequential_first_match(filters, request), request
+
+
+def test_combine_no_filters():
+    assert _combine_filters([])('GET "/dashboard/show"') is None
+
+
+def make_pages(requests, offset=0):
+    return [
+        PageStat(request=request + ' ', status='200 OK', seleniumtime=(i * 7 + offset) % 3,
+            completedintime=10.5 * i + offset, viewstime=(i % 4) * 1.25,
+            activerecordtime=0.5 * i, selectcount=i % 5 + offset, cachedcount=i % 2,
+            uncachedcount=i % 5 + offset - i % 2)
+        for i, request in enumerate(requests)]
+
+
+def test_aggregate_patterns():
+    filters = [re.compile(r'/dashboard/'), re.compile(r'tree_select')]
+    aggregate = PageStatAggregate(filters)
+    aggregate.add_pages(make_pages(REQUESTS))
+    # Unmatched requests are aggregated under themselves
+    assert [pattern for pattern, _ in aggregate.statistics()] == [
+        'tree_select', 'GET "/vm_or_template/show/1" ', '/dashboard/', 'GET "/Dashboard/show" ',
+        'GET "/report/explorer" ']
+
+
+def test_aggregate_merge_dump_load(tmpdir):
+    filters = [re.compile(r'/dashboard/'), re.compile(r'tree_select')]
+    pages = make_pages(REQUESTS * 3) + make_pages(REQUESTS[::-1] * 2, offset=3)
+    whole = PageStatAggregate(filters)
+    whole.add_pages(pages)
+
+    first, second = PageStatAggregate(filters), PageStatAggregate(filters)
+    first.add_pages(pages[:20])
+    second.add_pages(pages[20:])
+    dump = tmpdir.join('aggregate.json').strpath
+    second.dump(dump)
+    first.merge(PageStatAggregate.load(dump, filters))
+    assert list(first.statistics()) == list(whole.statistics())
+    assert len(first) == len(whole)
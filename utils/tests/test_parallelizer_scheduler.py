@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from fixtures.parallelizer.scheduler import DurationStore, steal_tail
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium
+]
+
+
+@pytest.fixture
+def durations_path(tmpdir):
+    return tmpdir.join('log', 'test_durations.json')
+
+
+def test_duration_store_missing_file(durations_path):
+    durations = DurationStore(durations_path)
+    assert durations.stored == {}
+    assert durations.estimate('test_a') == 1.
+    durations.add('test_a', 2.)
+    durations.add('test_a', .5)
+    durations.save()
+    assert json.loads(durations_path.read()) == {'test_a': 2.5}
+    assert DurationStore(durations_path).estimate('test_a') == 2.5
+
+
+@pytest.mark.parametrize('contents', ['{"test_a": 2', '', '[1, 2]', 'null', '{"test_a": "x"}'],
+    ids=['truncated', 'empty', 'list', 'null', 'not-a-number'])
+def test_duration_store_corrupt_file(durations_path, contents):
+    durations_path.write(contents, ensure=True)
+    durations = DurationStore(durations_path)
+    assert durations.stored == {}
+    assert durations.estimate('test_a') == 1.
+    durations.add('test_b', 3.)
+    durations.save()
+    assert json.loads(durations_path.read()) == {'test_b': 3.}
+
+
+def test_longest_first(durations_path):
+    durations_path.write(json.dumps({'a1': 10., 'a2': 5., 'b1': 1., 'c1': 2., 'c2': 2.}),
+        ensure=True)
+    durations = DurationStore(durations_path)
+    # Unknown tests are estimated at the average, 4 seconds
+    assert durations.estimate('unknown') == 4.
+    groups = [['b1'], ['a1', 'a2'], ['unknown'], ['c1', 'c2'], ['unknown2', 'b1'], ['x', 'y']]
+    assert durations.longest_first(groups) == [
+        ['a1', 'a2'], ['x', 'y'], ['unknown2', 'b1'], ['unknown'], ['c1', 'c2'], ['b1']]
+
+
+def test_longest_first_no_durations(durations_path):
+    durations = DurationStore(durations_path)
+    groups = [['a'], ['b', 'c'], ['d'], ['e', 'f', 'g']]
+    # Longest by the number of tests, ties keep their order
+    assert durations.longest_first(groups) == [['e', 'f', 'g'], ['b', 'c'], ['a'], ['d']]
+
+
+def test_steal_tail_fraction():
+    tests = ['next', 't1', 't2', 't3', 't4', 't5']
+    estimate = dict(next=100., t1=1., t2=1., t3=1., t4=1., t5=2.).get
+    # Half of the 6 seconds after the next test
+    assert steal_tail(tests, estimate, lambda test: True) == ['t4', 't5']
+    assert steal_tail(tests, estimate, lambda test: True, fraction=.1) == ['t5']
+    assert steal_tail(tests, estimate, lambda test: True, fraction=.6) == ['t3', 't4', 't5']
+
+
+def test_steal_tail_never_takes_next_test():
+    tests = ['next', 't1', 't2']
+    assert steal_tail(tests, lambda test: 1., lambda test: True, fraction=1.) == ['t1', 't2']
+    assert steal_tail(['next'], lambda test: 1., lambda test: True, fraction=1.) == []
+    assert steal_tail([], lambda test: 1., lambda test: True) == []
+
+
+def test_steal_tail_provider_affinity():
+    tests = ['next', 'test_a[rhevm]', 'test_b[vsphere]', 'test_c[vsphere]', 'test_d[vsphere]']
+    # Stops at the first test the thief can't take
+    assert steal_tail(tests, lambda test: 1., lambda test: 'vsphere' in test, fraction=1.) == [
+        'test_b[vsphere]', 'test_c[vsphere]', 'test_d[vsphere]']
+    assert steal_tail(tests, lambda test: 1., lambda test: 'rhevm' in test, fraction=1.) == []
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import csv
+import gzip
+import io
+import random
+import re
+
+import pytest
+
+from utils.perf_message_stats import (
+    MiqMsgStat, evm_log_chunks, evm_to_stats, msg_times_to_total_time_lists)
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium
+]
+
+COMMANDS = ['Vm.perf_capture_realtime', 'MiqEventHandler.handle_event', 'Host.perf_rollup']
+
+
+def evm_log_lines(count, seed=0):
+    """Generates the lines of an evm.log with messages and workers, over a few hours"""
+    rng = random.Random(seed)
+    queued, dequeued, workers = [], [], []
+    msg_id = 1000
+    for i in range(count):
+        hour = 10 + i * 3 // count
+        prefix = '[----] I, [2015-03-01T{:02d}:{:02d}:{:02d}.{:06d} #{}:abc]  INFO -- : '.format(
+            hour, i % 60, i % 60, i, 1234 + i % 5)
+        r = rng.random()
+        if r < 0.4 or not (queued or dequeued):
+            msg_id += 1
+            queued.append(msg_id)
+            yield prefix + (
+                'MIQ(MiqQueue.put) Message id: [{}],  id: [], Zone: [default], Ident: [generic], '
+                'Command: [{}], Timeout: [600], Priority: [100], State: [ready], Args: {}\n'
+            ).format(msg_id, rng.choice(COMMANDS), rng.choice(['[["Storage", 12]]', '[]']))
+        elif r < 0.65 and queued:
+            dequeued.append(queued.pop(rng.randrange(len(queued))))
+            yield prefix + (
+                'MIQ(MiqQueue.get_via_drb) Message id: [{}], MiqWorker id: [1], Command: [x], '
+                'State: [dequeue], Args: [], Dequeued in: [{:.6f}] seconds\n').format(
+                dequeued[-1], rng.random() * 10)
+        elif r < 0.9 and dequeued:
+            yield prefix + (
+                'MIQ(MiqQueue.delivered) Message id: [{}], State: [ok], Delivered in [{:.6f}] '
+                'seconds\n').format(dequeued.pop(rng.randrange(len(dequeued))), rng.random() * 20)
+        elif r < 0.94:
+            workers.append(len(workers) + 1)
+            yield prefix + 'MIQ(PriorityWorker) ID [{}], PID [{}], GUID [x] started\n'.format(
+                workers[-1], 5000 + workers[-1])
+        elif r < 0.96 and workers:
+            yield prefix + (
+                'MIQ(MiqServer.validate_worker) Worker [x] with ID: [{}], PID: [1], GUID: [] '
+                'exceeded limit, requesting worker to exit  "evm_worker_memory_exceeded"\n'
+            ).format(rng.choice(workers))
+        elif r < 0.98 and workers:
+            yield prefix + 'MIQ(Foo) ID [{}] Worker exiting.\n'.format(rng.choice(workers))
+        else:
+            yield prefix + 'Interrupt signal received\n'
+
+
+def stats(evm_files, **kwargs):
+    rawdata = io.BytesIO()
+    writer = csv.DictWriter(rawdata, fieldnames=MiqMsgStat().headers)
+    parser = evm_to_stats(evm_files, {'-storage': re.compile(r'Storage')}, writer, **kwargs)
+    return {
+        'msg_cmds': msg_times_to_total_time_lists(parser.msg_times),
+        'hourly_buckets': {
+            cmd: {date: {hour: dict(vars(bucket)) for hour, bucket in hours.iteritems()}
+                for date, hours in dates.iteritems()}
+            for cmd, dates in parser.hourly_buckets().iteritems()},
+        'workers': {worker_id: dict(worker) for worker_id, worker in parser.workers.iteritems()},
+        'rawdata': rawdata.getvalue().splitlines(),
+        'counts': [
+            parser.line_count, parser.worker_line_count, parser.message_count,
+            parser.test_start, parser.test_end, parser.wkr_mem_exc, parser.wkr_ext,
+            parser.wkr_int]}
+
+
+def test_evm_to_stats_chunks(tmpdir):
+    lines = list(evm_log_lines(600))
+    evm_log = tmpdir.join('evm.log')
+    evm_log.write(''.join(lines))
+    # A rotated segment and the current log
+    rotated = tmpdir.join('evm.log-20150301.gz').strpath
+    gz = gzip.open(rotated, 'wb')
+    gz.write(''.join(lines[:250]))
+    gz.close()
+    current = tmpdir.join('evm.log-current')
+    current.write(''.join(lines[250:]))
+
+    whole = stats(evm_log.strpath)
+    assert whole['counts'][0] == 600
+    assert whole['counts'][2] == len(whole['rawdata'])
+    assert whole['workers'] and len(whole['msg_cmds']) > 1
+    # Small chunks split lines, and messages are put, taken and delivered in different chunks
+    chunk_size = 1000
+    assert len(evm_log_chunks([evm_log.strpath], chunk_size)) > 100
+    assert stats(evm_log.strpath, workers=2, chunk_size=chunk_size) == whole
+    assert stats(evm_log.strpath, chunk_size=chunk_size) == whole
+    assert stats([rotated, current.strpath], workers=2, chunk_size=chunk_size) == whole
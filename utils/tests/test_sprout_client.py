@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from utils.sprout import AuthException, SproutClient, SproutException
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium
+]
+
+
+class RecordingSproutClient(SproutClient):
+    """Answers every call of a batch successfully with its data, or as set in ``responses``"""
+    def __init__(self, responses=None):
+        super(RecordingSproutClient, self).__init__()
+        self.requests = []
+        self.responses = responses or {}
+
+    def _call_post(self, **data):
+        self.requests.append(data)
+        return {"status": "success", "result": [
+            self.responses.get(call["method"], {"status": "success", "result": call})
+            for call in data["args"][0]]}
+
+
+def test_batch_call_forms():
+    client = RecordingSproutClient()
+    results = client.batch([
+        ("list_appliances",), ("request_check", (1,)), ("set_pool_description", (1, "x"), {}),
+        ["list_appliances", [], {"used": True}]])
+    assert results == [
+        {"method": "list_appliances", "args": (), "kwargs": {}},
+        {"method": "request_check", "args": (1,), "kwargs": {}},
+        {"method": "set_pool_description", "args": (1, "x"), "kwargs": {}},
+        {"method": "list_appliances", "args": [], "kwargs": {"used": True}}]
+    assert len(client.requests) == 1
+    assert client.requests[0]["method"] == "batch"
+    assert client.batch([]) == []
+    assert len(client.requests) == 1
+    with pytest.raises(ValueError):
+        client.batch([("list_appliances", (), {}, None)])
+
+
+@pytest.mark.parametrize(("response", "exception"), [
+    ({"status": "exception", "result": {"class": "NameError", "message": "missing"}},
+        SproutException),
+    ({"status": "autherror", "result": {"message": "wrong password"}}, AuthException)],
+    ids=["exception", "autherror"])
+def test_batch_failed_call(response, exception):
+    client = RecordingSproutClient({"fail": response})
+    with pytest.raises(exception):
+        client.batch([("list_appliances",), ("fail",)])
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from utils.tb_clusters import cluster_tracebacks, normalize
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium
+]
+
+
+def test_normalize():
+    assert normalize(
+        "TimedOutError: vm 0x7f3a2b1c 4c2a1e2b-1d2c-4a3b-9c8d-0123456789ab (10.0.0.12)\n"
+        "  at 2016-01-02 10:11:12.345  after 600 seconds") == (
+        "TimedOutError: vm ADDR UUID (IP) at TIMESTAMP after N seconds")
+
+
+def test_cluster_tracebacks():
+    entries = [
+        ("NoSuchElementException\nUnable to locate element //div[@id='x{}'] at 0x{:x}".format(
+            i, i * 4099), "test_element_{}".format(i)) for i in range(5)]
+    entries += [
+        ("TimedOutError: Could not do provisioning of vm test_vm_{} in 600s".format(name),
+            "test_provision_{}".format(name)) for name in ["aBcDeF", "xYzQwE"]]
+    # Same message, different exception
+    entries.append(("AssertionError: Could not do provisioning of vm test_vm_a in 600s", "test"))
+    clusters = cluster_tracebacks(entries)
+    assert [[test for _, test in cluster] for cluster in clusters] == [
+        ["test_element_{}".format(i) for i in range(5)],
+        ["test_provision_aBcDeF", "test_provision_xYzQwE"],
+        ["test"]]
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import re
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
 from datetime import date, datetime
 
 import multimethods as mm
@@ -142,17 +142,53 @@ def dependent(default_function):
     return m
 
 
+# Most of the versioned dicts are literals, created again for every pick, so picks are cached
+# by the keys of the dict rather than by the dict itself
+PICK_CACHE_SIZE = 4096
+_pick_tables = {}
+_pick_choices = OrderedDict()
+
+
+def _pick_key(key):
+    # Versions don't hash by value, so they're cached by their version string
+    return key.vstring if isinstance(key, Version) else key
+
+
+def _pick_table(keys):
+    """Returns the keys of a versioned dict as ``(Version, key)``, highest version first"""
+    try:
+        return _pick_tables[keys]
+    except KeyError:
+        table = sorted(((get_version(key), key) for key in keys), key=lambda item: item[0],
+            reverse=True)
+        if len(_pick_tables) >= PICK_CACHE_SIZE:
+            _pick_tables.clear()
+        _pick_tables[keys] = table
+        return table
+
+
 def pick(v_dict):
     """
     Collapses an ambiguous series of objects bound to specific versions
     by interrogating the CFME Version and returning the correct item.
     """
-    # convert keys to Versions
-    v_dict = {get_version(k): v for (k, v) in v_dict.items()}
-    versions = v_dict.keys()
-    sorted_matching_versions = sorted(filter(lambda v: v <= current_version(), versions),
-                                      reverse=True)
-    return v_dict.get(sorted_matching_versions[0]) if sorted_matching_versions else None
+    keys = frozenset(_pick_key(key) for key in v_dict)
+    current = get_version(current_version())
+    cache_key = (keys, current.vstring)
+    try:
+        key = _pick_choices[cache_key]
+    except KeyError:
+        key = next((key for version, key in _pick_table(keys) if version <= current), None)
+        if len(_pick_choices) >= PICK_CACHE_SIZE:
+            _pick_choices.popitem(last=False)
+        _pick_choices[cache_key] = key
+    if key is None:
+        return None
+    try:
+        return v_dict[key]
+    except KeyError:
+        # the dict's key is a Version
+        return next(value for dict_key, value in v_dict.iteritems() if _pick_key(dict_key) == key)
 
 
 class Version(object):
@@ -198,21 +234,24 @@ class Version(object):
         return "Version ('%s')" % str(self)
 
     def __cmp__(self, other):
-        try:
-            other = Version(other)
-        except:
-            raise ValueError('Cannot compare Version to {}'.format(type(other).__name__))
+        if not isinstance(other, Version):
+            try:
+                other = Version(other)
+            except:
+                raise ValueError('Cannot compare Version to {}'.format(type(other).__name__))
 
-        if self == other:
+        if self.version == other.version:
             return 0
-        elif self == self.latest() or other == self.lowest():
+        elif self.version == LATEST.version or other.version == LOWEST.version:
             return 1
-        elif self == self.lowest() or other == self.latest():
+        elif self.version == LOWEST.version or other.version == LATEST.version:
             return -1
         else:
             return cmp(self.version, other.version)
 
     def __eq__(self, other):
+        if isinstance(other, Version):
+            return self.version == other.version
         try:
             return self.version == Version(other).version
         except: